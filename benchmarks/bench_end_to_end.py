@@ -0,0 +1,260 @@
+"""Offline end-to-end throughput benchmark: mailbox -> research -> LLM -> chart -> SMTP.
+
+Runs the real monitor loop (run_monitor) in a child process against local
+stand-ins from benchmarks.fakes: an IMAP server seeded from an mbox, a Graph
+server with the research folder, an SMTP sink and a stub OpenAI endpoint with
+configurable latency. For each scenario it reports
+alerts per minute, p50/p99 latency from mail arrival to SMTP delivery, and the
+bot's peak RSS, and writes everything to a JSON file for comparing versions.
+Latency includes up to one poll interval (--poll-interval) before the bot sees
+the burst.
+
+Usage (from the repository root): python -m benchmarks.bench_end_to_end [--scenario burst] [--llm-latency 0.5]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import mailbox
+import multiprocessing
+import os
+import platform
+import re
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.fakes import FakeGraphServer, FakeIMAPServer, FakeLLMServer, SMTPSink, self_signed_cert
+
+KEYWORD = "bert"
+DRIVE_ID = "bench-drive"
+FOLDER_PATH = "Research/Bert"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+@dataclass
+class Scenario:
+    name: str
+    emails: int
+    files: int
+    # Rows per research file; CSV score histories when > 0, short markdown notes otherwise.
+    csv_rows: int = 0
+
+
+SCENARIOS = {
+    "burst": Scenario("burst", emails=50, files=10),
+    "many_files": Scenario("many_files", emails=20, files=200),
+    "large_csv": Scenario("large_csv", emails=20, files=5, csv_rows=50_000),
+}
+
+
+def write_mbox(path: Path, count: int) -> None:
+    box = mailbox.mbox(str(path))
+    try:
+        for i in range(count):
+            message = EmailMessage()
+            message["From"] = f"analyst{i % 7}@example.com"
+            message["To"] = "alerts@example.com"
+            message["Subject"] = f"{KEYWORD.upper()} update #{i}"
+            message["Message-ID"] = f"<bench-{i}@example.com>"
+            message.set_content(
+                f"New note on {KEYWORD.upper()}: guidance revised, margin commentary #{i}.\n" * 20
+            )
+            box.add(message)
+    finally:
+        box.close()
+
+
+def research_files(scenario: Scenario) -> Dict[str, str]:
+    start = datetime(2000, 1, 1)
+    files: Dict[str, str] = {}
+    for n in range(scenario.files):
+        if scenario.csv_rows:
+            rows = "\n".join(
+                f"{(start + timedelta(days=d)).date()},{np.sin((d + n) / 90):.3f}" for d in range(scenario.csv_rows)
+            )
+            files[f"history_{n}.csv"] = f"date,score\n{rows}\n"
+        else:
+            day = (start + timedelta(days=30 * n)).date()
+            files[f"note_{n}.md"] = (
+                f"# {KEYWORD.upper()} note {n}\n{day} score: {np.cos(n / 5):.2f}\n"
+                + f"Thesis paragraph {n}: revenue mix, pricing power and competitive risks.\n" * 40
+            )
+    return files
+
+
+def write_config(path: Path, imap: FakeIMAPServer, smtp: SMTPSink, args: argparse.Namespace) -> None:
+    config = {
+        "investment_keyword": KEYWORD,
+        "poll_interval_seconds": args.poll_interval,
+        "state_dir": str(path.parent / "state"),
+        "imap": {
+            "host": "127.0.0.1",
+            "port": imap.port,
+            "username": "bench",
+            "password": "bench",
+            "folder": "INBOX",
+            "prefilter": "search",
+        },
+        "onedrive": {"access_token": "bench", "drive_id": DRIVE_ID, "folder_path": FOLDER_PATH},
+        "openai": {"api_key": "bench", "model": "bench-model"},
+        "smtp": {
+            "host": "127.0.0.1",
+            "port": smtp.port,
+            "username": "bench",
+            "password": "bench",
+            "from_email": "alerts@example.com",
+        },
+        "pipeline": {"workers": args.workers, "batch_max_emails": args.batch_max_emails},
+        # Keep the render cache inside the scenario's temp dir rather than ./artifacts.
+        "chart": {"cache_dir": str(path.parent / "artifacts")},
+        "metrics": {"log_interval_seconds": 0},
+        "recipients": [{"name": "Bench", "email": "bench@example.com"}],
+    }
+    # JSON is valid YAML, so load_config reads it as is.
+    path.write_text(json.dumps(config, indent=2))
+
+
+def _run_bot(config_path: str, graph_root: str, llm_url: str, stop, rss) -> None:
+    """Child process: point the clients at the fakes and run the monitor until ``stop`` is set."""
+    os.environ["OPENAI_BASE_URL"] = llm_url
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(message)s")
+
+    from emailer_bot import main, onedrive_client
+
+    # AsyncOneDriveClient builds every URL from this module constant.
+    onedrive_client.GRAPH_ROOT = graph_root
+    main.run_monitor(config_path, stop)
+    rss.put(_peak_rss_bytes())
+
+
+def _peak_rss_bytes() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def run_scenario(scenario: Scenario, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"bench-{scenario.name}-") as tmp:
+        tmp_path = Path(tmp)
+        cert, key = self_signed_cert(tmp_path)
+        imap = FakeIMAPServer(cert, key)
+        smtp = SMTPSink(cert, key)
+        graph = FakeGraphServer(DRIVE_ID, FOLDER_PATH, research_files(scenario))
+        llm = FakeLLMServer(latency=args.llm_latency)
+        mbox_path = tmp_path / "inbox.mbox"
+        write_mbox(mbox_path, scenario.emails)
+        imap.load_mbox(mbox_path)
+        config_path = tmp_path / "config.yaml"
+        write_config(config_path, imap, smtp, args)
+
+        context = multiprocessing.get_context("spawn")
+        stop, rss = context.Event(), context.Queue()
+        bot = context.Process(
+            target=_run_bot, args=(str(config_path), graph.root, llm.base_url, stop, rss)
+        )
+        bot.start()
+        try:
+            if not imap.selected.wait(args.timeout):
+                raise RuntimeError("The bot never connected to the IMAP server")
+            arrived = imap.release()
+            deadline = time.monotonic() + args.timeout
+            while smtp.count() < scenario.emails and time.monotonic() < deadline and bot.is_alive():
+                time.sleep(0.05)
+        finally:
+            stop.set()
+            bot.join(args.timeout)
+            peak_rss = rss.get(timeout=5) if bot.exitcode == 0 else None
+            if bot.is_alive():
+                bot.terminate()
+            for service in (imap, smtp, graph, llm):
+                service.close()
+
+    delivered = sorted(smtp.deliveries, key=lambda d: d.received)
+    latencies = np.array([d.received - arrived for d in delivered])
+    elapsed = float(latencies.max()) if len(latencies) else 0.0
+    return {
+        "scenario": asdict(scenario),
+        "llm_latency_seconds": args.llm_latency,
+        "alerts_expected": scenario.emails,
+        "alerts_delivered": len(delivered),
+        "complete": len(delivered) >= scenario.emails,
+        "elapsed_seconds": round(elapsed, 3),
+        "alerts_per_minute": round(len(delivered) / elapsed * 60, 2) if elapsed else 0.0,
+        "latency_p50_seconds": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+        "latency_p99_seconds": round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+        "peak_rss_mb": round(peak_rss / 2**20, 1) if peak_rss else None,
+        "llm_requests": llm.stats.requests,
+        "graph_requests": graph.requests,
+        "bytes_delivered": sum(d.size for d in delivered),
+        "subjects_ok": all(re.search(rf"{KEYWORD} update detected", d.subject) for d in delivered),
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="default: all")
+    parser.add_argument("--emails", type=int, help="override the number of emails in every scenario")
+    parser.add_argument("--files", type=int, help="override the number of research files in every scenario")
+    parser.add_argument("--csv-rows", type=int, help="override the rows per CSV history file")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub LLM delay before the first token")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-max-emails", type=int, default=1)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=600.0, help="per-scenario limit in seconds")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/<time>-<rev>.json)")
+    args = parser.parse_args()
+
+    results: List[dict] = []
+    for name in args.scenario or list(SCENARIOS):
+        overrides = {key: getattr(args, key) for key in ("emails", "files") if getattr(args, key) is not None}
+        if args.csv_rows is not None and SCENARIOS[name].csv_rows:
+            overrides["csv_rows"] = args.csv_rows
+        scenario = replace(SCENARIOS[name], **overrides)
+        result = run_scenario(scenario, args)
+        results.append(result)
+        print(
+            f"{name:>12}: {result['alerts_delivered']}/{result['alerts_expected']} alerts, "
+            f"{result['alerts_per_minute']:8.1f}/min, p50 {result['latency_p50_seconds']}s, "
+            f"p99 {result['latency_p99_seconds']}s, peak RSS {result['peak_rss_mb']} MB"
+        )
+
+    revision = _git_revision()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = args.output or RESULTS_DIR / f"{stamp}-{revision or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(
+        {
+            "timestamp": stamp,
+            "revision": revision,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        },
+        indent=2,
+    ))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compare trend-graph render time with and without LTTB downsampling.
+
+Usage (from the repository root): python -m benchmarks.bench_graph [--years 40] [--max-points 1000]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from emailer_bot.config import ChartConfig
+from emailer_bot.workflow import InvestmentWorkflow
+
+
+def synthetic_history(years: int, seed: int = 7) -> tuple[np.ndarray, np.ndarray]:
+    days = years * 365
+    dates = np.datetime64("1990-01-01", "us") + np.arange(days).astype("timedelta64[D]")
+    rng = np.random.default_rng(seed)
+    scores = np.cumsum(rng.normal(0, 0.02, days))
+    return dates, scores
+
+
+def time_render(workflow: InvestmentWorkflow, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        png = workflow._build_graph([], "bench")
+        best = min(best, time.perf_counter() - start)
+        assert png
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=40)
+    parser.add_argument("--max-points", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    series = synthetic_history(args.years)
+    print(f"{len(series[0])} daily points over {args.years} years")
+    for label, max_points in [("full", 0), (f"lttb {args.max_points}", args.max_points)]:
+        workflow = InvestmentWorkflow(onedrive=None, llm=None, chart=ChartConfig(max_points=max_points))
+        workflow._scored_points = lambda files, keyword: series
+        print(f"{label:>12}: {time_render(workflow, args.repeats) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
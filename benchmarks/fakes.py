@@ -0,0 +1,506 @@
+"""Local stand-ins for the services the bot talks to, for offline benchmarks.
+
+Each server binds an ephemeral port on 127.0.0.1 and runs in daemon threads:
+
+- FakeIMAPServer: IMAP4rev1 over TLS, just the commands EmailMonitor issues.
+- FakeGraphServer: the Microsoft Graph drive endpoints AsyncOneDriveClient reads.
+- SMTPSink: ESMTP with STARTTLS and AUTH PLAIN that records each delivery time.
+- FakeLLMServer: the OpenAI Responses API (streamed JSON output and plain text)
+  with a configurable delay before the first byte.
+"""
+from __future__ import annotations
+
+import email
+import json
+import mailbox
+import re
+import shlex
+import socketserver
+import ssl
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from email.message import Message
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+
+def self_signed_cert(directory: Path) -> Tuple[Path, Path]:
+    """Create a throwaway localhost certificate; the bot's IMAP/SMTP clients don't verify it."""
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=localhost", "-keyout", str(key), "-out", str(cert)],
+            check=True,
+            capture_output=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise SystemExit(f"The benchmark needs the openssl CLI for a local TLS certificate: {e}")
+    return cert, key
+
+
+def _server_context(cert: Path, key: Path) -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Service:
+    """Runs a socketserver/http.server on an ephemeral localhost port."""
+
+    def _serve(self, server: socketserver.BaseServer) -> None:
+        self._server = server
+        self.port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- IMAP -------------------------------------------------------------------
+
+
+@dataclass
+class _Mail:
+    uid: int
+    raw: bytes
+    text: str
+    seen: bool = False
+
+
+class FakeIMAPServer(_Service):
+    """Single-folder IMAP server; messages stay hidden until release() so arrival time is known."""
+
+    def __init__(self, cert: Path, key: Path):
+        self.context = _server_context(cert, key)
+        self._lock = threading.Lock()
+        self._held: List[bytes] = []
+        self._mails: List[_Mail] = []
+        self.selected = threading.Event()
+        self._serve(_TCPServer(("127.0.0.1", 0), self._handler()))
+
+    def load_mbox(self, path: Path) -> int:
+        self._held.extend(message.as_bytes() for message in mailbox.mbox(str(path)))
+        return len(self._held)
+
+    def release(self) -> float:
+        """Deliver every loaded message at once; returns the delivery time."""
+        with self._lock:
+            for raw in self._held:
+                message = email.message_from_bytes(raw)
+                text = f"{message.get('Subject', '')}\n{_plain_text(message)}".lower()
+                self._mails.append(_Mail(uid=len(self._mails) + 1, raw=raw, text=text))
+            self._held = []
+        return time.time()
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self) -> None:
+                self.request = server.context.wrap_socket(self.request, server_side=True)
+                super().setup()
+
+            def handle(self) -> None:
+                self.reply("* OK [CAPABILITY IMAP4rev1] benchmark IMAP ready")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+                    command, _, args = rest.partition(" ")
+                    if not server.dispatch(self, tag, command.upper(), args):
+                        return
+
+            def reply(self, line: str | bytes) -> None:
+                self.wfile.write((line if isinstance(line, bytes) else line.encode()) + b"\r\n")
+
+        return Handler
+
+    def dispatch(self, conn, tag: str, command: str, args: str) -> bool:
+        if command == "CAPABILITY":
+            conn.reply("* CAPABILITY IMAP4rev1 AUTH=PLAIN")
+        elif command in ("LOGIN", "NOOP", "CHECK"):
+            pass
+        elif command == "SELECT":
+            with self._lock:
+                count = len(self._mails)
+            conn.reply(f"* {count} EXISTS")
+            conn.reply("* 0 RECENT")
+            conn.reply("* OK [UIDVALIDITY 1] UIDs valid")
+            conn.reply(f"* OK [UIDNEXT {count + 1}] Predicted next UID")
+            conn.reply(f"{tag} OK [READ-WRITE] SELECT completed")
+            self.selected.set()
+            return True
+        elif command == "STATUS":
+            with self._lock:
+                count = len(self._mails)
+            conn.reply(f"* STATUS INBOX (UIDNEXT {count + 1} UIDVALIDITY 1)")
+        elif command == "UID":
+            sub, _, rest = args.partition(" ")
+            if not self._uid(conn, tag, sub.upper(), rest):
+                conn.reply(f"{tag} BAD unsupported UID {sub}")
+            return True
+        elif command == "LOGOUT":
+            conn.reply("* BYE logging out")
+            conn.reply(f"{tag} OK LOGOUT completed")
+            return False
+        else:
+            conn.reply(f"{tag} BAD unsupported command {command}")
+            return True
+        conn.reply(f"{tag} OK {command} completed")
+        return True
+
+    def _uid(self, conn, tag: str, sub: str, args: str) -> bool:
+        with self._lock:
+            mails = list(self._mails)
+        if sub == "SEARCH":
+            tokens = shlex.split(args)
+            if tokens[:2] == ["CHARSET", "UTF-8"]:
+                tokens = tokens[2:]
+            hits = [mail.uid for mail in mails if _matches(mail, list(tokens))]
+            conn.reply("* SEARCH" + "".join(f" {uid}" for uid in hits))
+        elif sub == "FETCH":
+            uid_set, _, items = args.partition(" ")
+            if "BODY.PEEK[]" not in items.upper() and "RFC822" not in items.upper():
+                return False
+            for mail in mails:
+                if _in_uid_set(mail.uid, uid_set):
+                    conn.reply(f"* {mail.uid} FETCH (UID {mail.uid} BODY[] {{{len(mail.raw)}}}".encode() + b"\r\n"
+                               + mail.raw + b")")
+        elif sub == "STORE":
+            uid_set, _, flags = args.partition(" ")
+            for mail in mails:
+                if _in_uid_set(mail.uid, uid_set) and "\\SEEN" in flags.upper():
+                    mail.seen = True
+                    conn.reply(f"* {mail.uid} FETCH (UID {mail.uid} FLAGS (\\Seen))")
+        else:
+            return False
+        conn.reply(f"{tag} OK UID {sub} completed")
+        return True
+
+
+def _matches(mail: _Mail, tokens: List[str]) -> bool:
+    """Evaluate the SEARCH keys EmailMonitor sends: ALL, UNSEEN, UID <set>, TEXT <s>, OR <a> <b>."""
+    while tokens:
+        if not _match_key(mail, tokens):
+            return False
+    return True
+
+
+def _match_key(mail: _Mail, tokens: List[str]) -> bool:
+    key = tokens.pop(0).upper()
+    if key == "ALL":
+        return True
+    if key == "UNSEEN":
+        return not mail.seen
+    if key == "SEEN":
+        return mail.seen
+    if key == "UID":
+        return _in_uid_set(mail.uid, tokens.pop(0))
+    if key == "TEXT":
+        return tokens.pop(0).lower() in mail.text
+    if key == "OR":
+        left = _match_key(mail, tokens)
+        right = _match_key(mail, tokens)
+        return left or right
+    raise ValueError(f"Unsupported SEARCH key {key}")
+
+
+def _in_uid_set(uid: int, uid_set: str) -> bool:
+    for part in uid_set.split(","):
+        low, _, high = part.partition(":")
+        top = 2**32 if high == "*" else int(high or low)
+        if int(low) <= uid <= top:
+            return True
+    return False
+
+
+def _plain_text(message: Message) -> str:
+    parts = message.walk() if message.is_multipart() else [message]
+    return "\n".join(
+        part.get_payload(decode=True).decode(part.get_content_charset() or "utf-8", "replace")
+        for part in parts
+        if part.get_content_type() == "text/plain"
+    )
+
+
+# --- SMTP -------------------------------------------------------------------
+
+
+@dataclass
+class Delivery:
+    received: float
+    subject: str
+    recipients: List[str]
+    size: int
+
+
+class SMTPSink(_Service):
+    """Accepts every message after STARTTLS + AUTH and records when it arrived."""
+
+    def __init__(self, cert: Path, key: Path):
+        self.context = _server_context(cert, key)
+        self.deliveries: List[Delivery] = []
+        self._lock = threading.Lock()
+        self._serve(_TCPServer(("127.0.0.1", 0), self._handler()))
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self.deliveries)
+
+    def _handler(self) -> type:
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                self.reply("220 benchmark ESMTP ready")
+                tls = False
+                recipients: List[str] = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    verb = line.decode().strip().split(" ", 1)[0].upper()
+                    if verb in ("EHLO", "HELO"):
+                        lines = ["benchmark", "AUTH PLAIN LOGIN", "SIZE 52428800"] if tls else ["benchmark", "STARTTLS"]
+                        self.reply("\r\n".join(f"250-{text}" for text in lines[:-1]) + f"\r\n250 {lines[-1]}")
+                    elif verb == "STARTTLS":
+                        self.reply("220 ready to start TLS")
+                        self.request = sink.context.wrap_socket(self.request, server_side=True)
+                        self.rfile = self.request.makefile("rb")
+                        self.wfile = self.request.makefile("wb", buffering=0)
+                        tls = True
+                    elif verb == "AUTH":
+                        self.reply("235 authenticated")
+                    elif verb == "MAIL":
+                        recipients = []
+                        self.reply("250 OK")
+                    elif verb == "RCPT":
+                        recipients.append(line.decode().split(":", 1)[1].strip().strip("<>"))
+                        self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 end with <CRLF>.<CRLF>")
+                        data = self.read_data()
+                        message = email.message_from_bytes(data)
+                        with sink._lock:
+                            sink.deliveries.append(
+                                Delivery(time.time(), str(message.get("Subject", "")), recipients, len(data))
+                            )
+                        self.reply("250 OK queued")
+                    elif verb == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    else:  # NOOP, RSET
+                        self.reply("250 OK")
+
+            def read_data(self) -> bytes:
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line == b".\r\n":
+                        return b"".join(lines)
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+
+            def reply(self, text: str) -> None:
+                self.wfile.write(text.encode() + b"\r\n")
+
+        return Handler
+
+
+# --- Microsoft Graph (OneDrive) ----------------------------------------------
+
+
+class FakeGraphServer(_Service):
+    """Serves one research folder through the drive root:/path, delta, children and content endpoints."""
+
+    def __init__(self, drive_id: str, folder_path: str, files: Dict[str, str]):
+        self.drive_id = drive_id
+        self.folder_path = folder_path.strip("/")
+        self.folder_id = "folder-1"
+        self.modified = "2025-01-01T00:00:00Z"
+        self.files = {f"item-{i}": (name, content.encode()) for i, (name, content) in enumerate(files.items())}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._serve(ThreadingHTTPServer(("127.0.0.1", 0), self._handler()))
+        self.root = f"http://127.0.0.1:{self.port}/v1.0"
+
+    def _item(self, item_id: str) -> dict:
+        name, content = self.files[item_id]
+        return {
+            "id": item_id,
+            "name": name,
+            "size": len(content),
+            "file": {"mimeType": "text/plain"},
+            "parentReference": {"id": self.folder_id},
+            "lastModifiedDateTime": self.modified,
+            "cTag": f"c-{item_id}",
+            "eTag": f"e-{item_id}",
+            "@microsoft.graph.downloadUrl": f"{self.root}/drives/{self.drive_id}/items/{item_id}/content",
+        }
+
+    def route(self, path: str, query: str) -> Tuple[int, bytes, str]:
+        drive = f"/v1.0/drives/{self.drive_id}"
+        folder = f"{drive}/root:/{self.folder_path}"
+        delta = f"{drive}/items/{self.folder_id}/delta"
+        if path == f"{folder}:/children":
+            return _json({"value": [self._item(item_id) for item_id in self.files]})
+        if path == folder:
+            return _json({"id": self.folder_id, "name": self.folder_path.rsplit("/", 1)[-1], "folder": {}})
+        if path == delta:
+            # The first call lists everything; the delta link it returns reports no further changes.
+            items = [] if "token=latest" in query else [self._item(item_id) for item_id in self.files]
+            return _json({"value": items, "@odata.deltaLink": f"http://127.0.0.1:{self.port}{delta}?token=latest"})
+        match = re.fullmatch(rf"{re.escape(drive)}/items/([^/]+)/content", path)
+        if match and match.group(1) in self.files:
+            return 200, self.files[match.group(1)][1], "text/plain"
+        return 404, b'{"error": {"code": "itemNotFound"}}', "application/json"
+
+    def _handler(self) -> type:
+        graph = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                with graph._lock:
+                    graph.requests += 1
+                url = urlsplit(self.path)
+                status, body, content_type = graph.route(url.path, url.query)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+
+def _json(value: dict) -> Tuple[int, bytes, str]:
+    return 200, json.dumps(value).encode(), "application/json"
+
+
+# --- OpenAI Responses API -----------------------------------------------------
+
+
+@dataclass
+class LLMStats:
+    requests: int = 0
+    streamed: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+
+class FakeLLMServer(_Service):
+    """Answers POST /v1/responses after ``latency`` seconds, streaming schema-shaped JSON in small deltas."""
+
+    def __init__(self, latency: float = 0.0, delta_chars: int = 40):
+        self.latency = latency
+        self.delta_chars = delta_chars
+        self.stats = LLMStats()
+        self._lock = threading.Lock()
+        self._serve(ThreadingHTTPServer(("127.0.0.1", 0), self._handler()))
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+
+    def _handler(self) -> type:
+        llm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with llm._lock:
+                    llm.stats.requests += 1
+                    llm.stats.streamed += bool(request.get("stream"))
+                time.sleep(llm.latency)
+                prompt = request.get("input", "")
+                text_format = (request.get("text") or {}).get("format") or {}
+                usage = {
+                    "input_tokens": len(prompt) // 4,
+                    "input_tokens_details": {"cached_tokens": 0},
+                    "output_tokens": 200,
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                    "total_tokens": len(prompt) // 4 + 200,
+                }
+                if text_format.get("type") == "json_schema":
+                    text = json.dumps(_sample(text_format["schema"], prompt.count("--- UPDATE ")))
+                else:
+                    text = "Benchmark digest: thesis steady, scores mixed, no new risks."
+                if request.get("stream"):
+                    self.stream(text, usage)
+                else:
+                    self.respond(_response(text, usage))
+
+            def stream(self, text: str, usage: dict) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for start in range(0, len(text), llm.delta_chars):
+                    self.event({"type": "response.output_text.delta", "delta": text[start : start + llm.delta_chars],
+                                "item_id": "msg_1", "output_index": 0, "content_index": 0})
+                self.event({"type": "response.completed", "response": _response(text, usage)})
+
+            def event(self, payload: dict) -> None:
+                self.wfile.write(f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+
+            def respond(self, payload: dict) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+
+def _response(text: str, usage: dict) -> dict:
+    return {
+        "id": "resp_bench",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": "benchmark",
+        "status": "completed",
+        "output": [{
+            "id": "msg_1",
+            "type": "message",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "usage": usage,
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+
+
+def _sample(schema: dict, updates: int) -> object:
+    """A value that satisfies ``schema``; arrays hold one element per update in batch prompts."""
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: _sample(sub, updates) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        items = schema.get("items", {})
+        count = max(1, updates) if items.get("type") == "object" else 3
+        return [_sample(items, updates) for _ in range(count)]
+    if kind in ("number", "integer"):
+        return 1
+    if kind == "boolean":
+        return True
+    return "Benchmark synthesis text. " * 8
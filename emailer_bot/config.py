@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import List
 
@@ -14,6 +14,14 @@ class IMAPConfig:
     password: str
     folder: str = "INBOX"
     auth_method: str = "password"
+    keepalive_seconds: int = 60
+    timeout_seconds: int = 60
+    idle: bool = False
+    idle_timeout_seconds: int = 25 * 60
+    prefilter: str = "none"
+    prefilter_bytes: int = 2048
+    track_uids: bool = False
+    mark_seen: bool = True
 
 
 @dataclass(frozen=True)
@@ -23,12 +31,22 @@ class OneDriveConfig:
     folder_path: str
     max_files: int = 25
     auth_method: str = "password"
+    cache_max_mb: int = 200
+    download_concurrency: int = 8
+    download_timeout_seconds: int = 30
+    max_file_bytes: int = 20 * 1024 * 1024
 
 
 @dataclass(frozen=True)
 class OpenAIConfig:
     api_key: str
     model: str
+    # Reuse results for identical (model, keyword, trigger, context) inputs; false always calls the API.
+    cache: bool = True
+    cache_ttl_hours: float = 24
+    cache_max_entries: int = 500
+    # Extra attempts when streamed output breaks the JSON schema.
+    max_retries: int = 2
 
 
 @dataclass(frozen=True)
@@ -40,6 +58,72 @@ class SMTPConfig:
     from_email: str
     subject_prefix: str = "[Investment Alert]"
     auth_method: str = "password"
+    keepalive_seconds: int = 60
+    timeout_seconds: int = 30
+    # Recipients per envelope (RCPT TO batch); larger lists go out as several messages.
+    max_recipients_per_message: int = 50
+    # Pace outgoing messages; 0 sends as fast as the server accepts them.
+    max_messages_per_minute: int = 0
+    # Address alerts To the sender and deliver to recipients as Bcc.
+    hide_recipients: bool = False
+
+
+@dataclass(frozen=True)
+class ChartConfig:
+    # Only plot points from the last N days; None keeps the full history.
+    lookback_days: int | None = None
+    # Keep extracted scores in a SQLite index under state_dir instead of re-parsing every file.
+    score_index: bool = True
+    # Longer series are LTTB-downsampled to this many points before plotting; 0 plots everything.
+    max_points: int = 1000
+    # Rendered PNGs are cached here by content hash; 0 disables the cache.
+    cache_dir: str = "artifacts"
+    cache_max_files: int = 200
+
+
+@dataclass(frozen=True)
+class ContextConfig:
+    # Send the research chunks most relevant to the update (BM25) instead of each file's first chars.
+    retrieval: bool = True
+    # Approximate prompt tokens spent on research context.
+    token_budget: int = 3000
+    chunk_tokens: int = 200
+    # Keep a per-keyword digest of the research folder, re-summarized only when files change.
+    history_digest: bool = True
+    # Characters of each new or changed file given to the model when revising the digest.
+    digest_source_chars: int = 8000
+    # Retrieved-chunk budget sent next to the digest; 0 sends the digest alone.
+    digest_token_budget: int = 800
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    # Alerts fetching research and synthesizing at once (asyncio tasks); graphs render on one shared thread.
+    workers: int = 4
+    # Alerts in flight per mailbox, waiting or running; when full the poll loop waits before starting more.
+    queue_size: int = 16
+    # Matches for one keyword are grouped up to this many emails per fetch + LLM call; 1 disables batching.
+    batch_max_emails: int = 1
+    # After a poll finds matches, wait this long and poll again so close-together emails share a batch.
+    batch_window_seconds: float = 0
+    # Send one consolidated alert per batch instead of one alert per email.
+    batch_consolidate: bool = False
+    # Failed alerts are retried from the durable queue after retry_backoff_seconds, doubling up to
+    # retry_max_backoff_seconds, and given up after retry_max_attempts.
+    retry_max_attempts: int = 5
+    retry_backoff_seconds: float = 30
+    retry_max_backoff_seconds: float = 1800
+    # Sent alerts are kept this long so a re-delivered email is recognized as already alerted.
+    queue_retention_days: float = 30
+
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    # Serve Prometheus text on http://host:port/metrics; 0 disables the endpoint.
+    port: int = 0
+    host: str = "127.0.0.1"
+    # Log a JSON summary of the stage timings this often; 0 disables it.
+    log_interval_seconds: float = 300
 
 
 @dataclass(frozen=True)
@@ -48,6 +132,13 @@ class Recipient:
     email: str
 
 
+@dataclass(frozen=True)
+class KeywordConfig:
+    keyword: str
+    folder_path: str
+    recipients: List[Recipient]
+
+
 @dataclass(frozen=True)
 class AppConfig:
     investment_keyword: str
@@ -57,8 +148,18 @@ class AppConfig:
     openai: OpenAIConfig
     smtp: SMTPConfig
     recipients: List[Recipient]
+    chart: ChartConfig = ChartConfig()
+    context: ContextConfig = ContextConfig()
+    pipeline: PipelineConfig = PipelineConfig()
+    metrics: MetricsConfig = MetricsConfig()
     client_id: str | None = None
     refresh_token: str | None = None
+    # Refresh the access token this long before it expires.
+    token_refresh_margin_seconds: int = 300
+    state_dir: str = "state"
+    mail_transport: str = "imap"
+    # Every monitored keyword with its own research folder and recipients.
+    keywords: List[KeywordConfig] = field(default_factory=list)
 
 
 def load_config(path: str | Path) -> AppConfig:
@@ -67,15 +168,37 @@ def load_config(path: str | Path) -> AppConfig:
     with open(path, "r", encoding="utf-8") as f:
         raw = yaml.safe_load(f)
 
-    recipients = [Recipient(**r) for r in raw["recipients"]]
+    recipients = [Recipient(**r) for r in raw.get("recipients") or []]
+    onedrive = OneDriveConfig(**raw["onedrive"])
+    keywords = [
+        KeywordConfig(
+            keyword=k["keyword"],
+            folder_path=k.get("folder_path", onedrive.folder_path),
+            recipients=[Recipient(**r) for r in k["recipients"]] if "recipients" in k else recipients,
+        )
+        for k in raw.get("keywords") or []
+    ]
+    if raw.get("investment_keyword") and raw["investment_keyword"] not in [k.keyword for k in keywords]:
+        keywords.insert(0, KeywordConfig(raw["investment_keyword"], onedrive.folder_path, recipients))
+    if not keywords:
+        raise ValueError("Config must set investment_keyword or a keywords list")
+
     return AppConfig(
-        investment_keyword=raw["investment_keyword"],
+        investment_keyword=keywords[0].keyword,
         poll_interval_seconds=raw.get("poll_interval_seconds", 30),
         imap=IMAPConfig(**raw["imap"]),
-        onedrive=OneDriveConfig(**raw["onedrive"]),
+        onedrive=onedrive,
         openai=OpenAIConfig(**raw["openai"]),
         smtp=SMTPConfig(**raw["smtp"]),
         recipients=recipients,
+        chart=ChartConfig(**(raw.get("chart") or {})),
+        context=ContextConfig(**(raw.get("context") or {})),
+        pipeline=PipelineConfig(**(raw.get("pipeline") or {})),
+        metrics=MetricsConfig(**(raw.get("metrics") or {})),
         client_id=raw.get("client_id"),
         refresh_token=raw.get("refresh_token"),
+        token_refresh_margin_seconds=raw.get("token_refresh_margin_seconds", 300),
+        state_dir=raw.get("state_dir", "state"),
+        mail_transport=raw.get("mail_transport", "imap"),
+        keywords=keywords,
     )
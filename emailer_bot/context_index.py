@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .onedrive_client import ResearchFile
+from .score_index import _file_key
+
+# Rough English average; good enough to size chunks and budgets without a tokenizer dependency.
+CHARS_PER_TOKEN = 4
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    keyword TEXT NOT NULL,
+    file_key TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (keyword, file_key)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    keyword TEXT NOT NULL,
+    file_key TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    terms TEXT NOT NULL,
+    PRIMARY KEY (keyword, file_key, ord)
+);
+"""
+
+
+@dataclass
+class _Corpus:
+    """Chunks of one keyword's research files with BM25 postings."""
+
+    file_keys: List[str]
+    ords: np.ndarray
+    texts: List[str]
+    lengths: np.ndarray
+    # Approximate prompt tokens per chunk.
+    costs: np.ndarray
+    # term -> (chunk indices, term frequencies)
+    postings: Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+    @classmethod
+    def build(cls, rows: List[Tuple[str, int, str, str]]) -> "_Corpus":
+        doc_ids: Dict[str, List[int]] = {}
+        freqs: Dict[str, List[int]] = {}
+        lengths = np.zeros(len(rows), dtype=np.float64)
+        for i, (_, _, _, terms) in enumerate(rows):
+            counts = Counter(terms.split())
+            lengths[i] = sum(counts.values())
+            for term, count in counts.items():
+                doc_ids.setdefault(term, []).append(i)
+                freqs.setdefault(term, []).append(count)
+        return cls(
+            file_keys=[r[0] for r in rows],
+            ords=np.array([r[1] for r in rows], dtype=np.int64),
+            texts=[r[2] for r in rows],
+            lengths=lengths,
+            costs=np.array([estimate_tokens(r[2]) for r in rows], dtype=np.int64),
+            postings={
+                term: (np.array(ids, dtype=np.int64), np.array(freqs[term], dtype=np.float64))
+                for term, ids in doc_ids.items()
+            },
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.texts), dtype=np.float64)
+        if not self.texts:
+            return scores
+        n = len(self.texts)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.lengths.mean(), 1.0))
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids, tf = posting
+            idf = np.log1p((n - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tf * (BM25_K1 + 1) / (tf + norm[ids])
+        return scores
+
+
+class ContextIndex:
+    """BM25 index over chunks of each keyword's research files, persisted in SQLite.
+
+    Like ScoreIndex, files are keyed by item id (or name) and content hash, so
+    only new or changed files are re-chunked; the in-memory postings for a
+    keyword are rebuilt only when its files changed.
+    """
+
+    def __init__(self, path: str | Path, chunk_tokens: int = 200):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.chunk_tokens = chunk_tokens
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._corpora: Dict[str, _Corpus] = {}
+
+    def update(self, keyword: str, files: List[ResearchFile]) -> int:
+        """Sync the index with ``files``; returns how many files were re-chunked."""
+        current = {_file_key(f): f for f in files}
+        with self._lock, self._conn:
+            stored = dict(
+                self._conn.execute("SELECT file_key, sha256 FROM files WHERE keyword = ?", (keyword,))
+            )
+            removed = stored.keys() - current.keys()
+            for file_key in removed:
+                self._drop(keyword, file_key)
+
+            changed = 0
+            for file_key, file in current.items():
+                digest = hashlib.sha256(file.content.encode("utf-8")).hexdigest()
+                if stored.get(file_key) == digest:
+                    continue
+                self._drop(keyword, file_key)
+                self._conn.executemany(
+                    "INSERT INTO chunks (keyword, file_key, ord, text, terms) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (keyword, file_key, i, text, " ".join(tokenize(text)))
+                        for i, text in enumerate(chunk_text(file.content, self.chunk_tokens))
+                    ),
+                )
+                self._conn.execute(
+                    "INSERT INTO files (keyword, file_key, sha256) VALUES (?, ?, ?)",
+                    (keyword, file_key, digest),
+                )
+                changed += 1
+            if changed or removed:
+                self._corpora.pop(keyword, None)
+        return changed
+
+    def select(self, keyword: str, files: List[ResearchFile], query: str, token_budget: int) -> str:
+        """Return the chunks of ``files`` most relevant to ``query`` that fit ``token_budget``.
+
+        Chunks are grouped under their file headers in file order, so the prompt
+        reads like the original files with irrelevant passages left out.
+        """
+        self.update(keyword, files)
+        corpus = self._corpus(keyword)
+        scores = corpus.scores(query)
+        costs = corpus.costs
+
+        # Highest score first; ties (including no term overlap) keep file order, i.e. newest files first.
+        position = {_file_key(f): i for i, f in enumerate(files)}
+        file_rank = np.array([position.get(k, len(files)) for k in corpus.file_keys], dtype=np.int64)
+        order = np.lexsort((corpus.ords, file_rank, -scores))
+
+        chosen: list[int] = []
+        remaining = token_budget
+        for i in order:
+            if file_rank[i] == len(files) or costs[i] > remaining:
+                continue
+            chosen.append(int(i))
+            remaining -= int(costs[i])
+            if remaining <= 0:
+                break
+
+        names = {_file_key(f): f.name for f in files}
+        sections: Dict[str, list[int]] = {}
+        for i in sorted(chosen, key=lambda i: (file_rank[i], corpus.ords[i])):
+            sections.setdefault(corpus.file_keys[i], []).append(i)
+        return "\n\n".join(
+            f"### File: {names[file_key]}\n" + "\n[...]\n".join(corpus.texts[i] for i in ids)
+            for file_key, ids in sections.items()
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _corpus(self, keyword: str) -> _Corpus:
+        with self._lock:
+            corpus = self._corpora.get(keyword)
+            if corpus is None:
+                rows = self._conn.execute(
+                    "SELECT file_key, ord, text, terms FROM chunks WHERE keyword = ? ORDER BY file_key, ord",
+                    (keyword,),
+                ).fetchall()
+                corpus = self._corpora[keyword] = _Corpus.build(rows)
+            return corpus
+
+    def _drop(self, keyword: str, file_key: str) -> None:
+        self._conn.execute("DELETE FROM chunks WHERE keyword = ? AND file_key = ?", (keyword, file_key))
+        self._conn.execute("DELETE FROM files WHERE keyword = ? AND file_key = ?", (keyword, file_key))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def chunk_text(content: str, chunk_tokens: int) -> List[str]:
+    """Split on line boundaries into chunks of about ``chunk_tokens``; overlong lines are cut."""
+    limit = max(1, chunk_tokens) * CHARS_PER_TOKEN
+    chunks: list[str] = []
+    lines: list[str] = []
+    size = 0
+    for line in content.splitlines():
+        if size + len(line) > limit and lines:
+            chunks.append("\n".join(lines))
+            lines, size = [], 0
+        while len(line) > limit:
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if line.strip() or lines:
+            lines.append(line)
+            size += len(line) + 1
+    if any(line.strip() for line in lines):
+        chunks.append("\n".join(lines).rstrip())
+    return [c for c in chunks if c.strip()]
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of at most ``threshold`` points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between contributes
+    the point forming the largest triangle with the previously kept point and the
+    average of the next bucket, which preserves peaks and the overall shape.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    # Bucket b covers [edges[b], edges[b + 1]); the final edge closes the last bucket before the end point.
+    edges = (np.arange(threshold - 1) * every).astype(np.intp) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for b in range(threshold - 2):
+        start, end = edges[b], edges[b + 1]
+        if b + 2 < len(edges):
+            next_start, next_end = edges[b + 1], edges[b + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def downsample_series(dates: np.ndarray, scores: np.ndarray, max_points: int) -> tuple[np.ndarray, np.ndarray]:
+    """LTTB-downsample a date/score series to ``max_points``; 0 disables downsampling."""
+    if max_points <= 0 or len(dates) <= max_points:
+        return dates, scores
+    keep = lttb_indices(dates.astype("int64"), scores, max_points)
+    return dates[keep], scores[keep]
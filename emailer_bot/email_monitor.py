@@ -1,14 +1,33 @@
 from __future__ import annotations
 
+import asyncio
 import email
 import imaplib
+import logging
+import quopri
 import re
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from email.errors import HeaderParseError
+from email.header import decode_header, make_header
 from email.message import Message
+from functools import lru_cache
 from typing import Iterable, List
 
 from .auth import generate_oauth2_string
 from .config import IMAPConfig
+from .sync_state import FolderState, SyncStateStore
+
+logger = logging.getLogger(__name__)
+
+# RFC 2177 servers may drop an IDLE after 30 minutes; stay safely below that.
+MAX_IDLE_SECONDS = 29 * 60
+# A message whose body cannot be fetched this many times in a row is skipped.
+MAX_FETCH_ATTEMPTS = 5
+_IDLE_CHANGE = re.compile(rb"^\* \d+ (EXISTS|RECENT)\b", re.IGNORECASE)
 
 
 @dataclass
@@ -17,62 +36,239 @@ class IncomingEmail:
     subject: str
     from_email: str
     body: str
+    message_id: str = ""
 
 
 class EmailMonitor:
-    def __init__(self, config: IMAPConfig):
+    def __init__(self, config: IMAPConfig, sync_state: SyncStateStore | None = None):
         self.config = config
+        self.sync_state = sync_state
+        self._scan: FolderState | None = None
         self.access_token = config.password if getattr(config, "auth_method", "password") == "oauth" else None
+        self._client: imaplib.IMAP4_SSL | None = None
+        self._last_activity = 0.0
+        self._reauthenticate = False
+        # Failed fetch counts for UNSEEN mode; with a sync state they live in FolderState.
+        self._fetch_failures: dict[str, int] = {}
 
     def update_token(self, token: str) -> None:
+        # May be called from the token refresh thread while a command is running,
+        # so only flag the session; the next call logs in again with the new token
+        # (XOAUTH2 cannot be re-run on an authenticated session).
+        if token != self.access_token:
+            self._reauthenticate = True
         self.access_token = token
 
-    def fetch_unseen(self) -> List[IncomingEmail]:
-        mails: list[IncomingEmail] = []
-        with imaplib.IMAP4_SSL(self.config.host, self.config.port) as client:
-            if getattr(self.config, "auth_method", "password") == "oauth":
-                # Use current access_token
-                token = self.access_token or self.config.password
-                auth_str = generate_oauth2_string(self.config.username, token)
-                client.authenticate("XOAUTH2", lambda x: auth_str)
-            else:
-                client.login(self.config.username, self.config.password)
-            client.select(self.config.folder)
+    def close(self) -> None:
+        client, self._client = self._client, None
+        if client is None:
+            return
+        try:
+            client.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
+
+    def fetch_unseen(self, keywords: Iterable[str] = ()) -> List[IncomingEmail]:
+        """Fetch new messages, downloading full bodies only for keyword candidates.
+
+        Without a sync state store "new" means UNSEEN. With one, it means every UID
+        above the stored watermark, regardless of \\Seen, plus UIDs left pending by
+        the previous poll; a missing or changed UIDVALIDITY triggers a resync from
+        the UNSEEN set. Call complete() once the returned messages are handled.
+
+        When ``keywords`` is given and ``imap.prefilter`` is enabled, messages that
+        cannot contain any keyword are skipped without downloading them. The
+        prefilter is deliberately permissive; callers still confirm with has_keyword.
+        """
+        keywords = [k for k in keywords if k]
+        return self._with_session(lambda client: self._fetch_unseen(client, keywords))
+
+    def complete(self, uids: Iterable[str]) -> None:
+        """Record ``uids`` as processed: advance the watermark and flag them \\Seen."""
+        uid_list = list(uids)
+        # Without a watermark \Seen is the only record of progress, so always set it.
+        if self.config.mark_seen or self.sync_state is None:
+            self.mark_as_read(uid_list)
+
+        scan, self._scan = self._scan, None
+        if self.sync_state is None or scan is None:
+            return
+        done = set(uid_list)
+        scan.pending = [uid for uid in scan.pending if uid not in done]
+        scan.failures = {uid: n for uid, n in scan.failures.items() if uid in scan.pending}
+        self.sync_state.put(self.config.folder, scan)
+
+    def mark_as_read(self, uids: str | Iterable[str]) -> None:
+        uid_list = [uids] if isinstance(uids, str) else [u for u in uids]
+        if not uid_list:
+            return
+        uid_set = ",".join(uid_list)
+        self._with_session(lambda client: client.uid("store", uid_set, "+FLAGS", "\\Seen"))
+
+    def supports_idle(self) -> bool:
+        return self._with_session(lambda client: "IDLE" in client.capabilities)
+
+    def wait_for_changes(self, timeout: float, stop_event: threading.Event | None = None) -> bool:
+        """Hold an IDLE on the folder until mail arrives, ``timeout`` passes or ``stop_event`` is set.
+
+        Returns True when the server reported EXISTS/RECENT.
+        """
+        timeout = min(timeout, MAX_IDLE_SECONDS)
+        return self._with_session(lambda client: _idle(client, timeout, stop_event))
 
-            status, data = client.uid("search", None, "UNSEEN")
-            if status != "OK":
-                return mails
+    def has_keyword(self, email_item: IncomingEmail, keyword: str) -> bool:
+        return bool(_keyword_pattern([keyword]).search(f"{email_item.subject}\n{email_item.body}"))
+
+    def _fetch_unseen(self, client: imaplib.IMAP4_SSL, keywords: List[str]) -> List[IncomingEmail]:
+        if self.sync_state is None:
+            uids = self._candidate_uids(client, keywords, ["UNSEEN"])
+            uids = [uid for uid in uids if self._fetch_failures.get(uid, 0) < MAX_FETCH_ATTEMPTS]
+        else:
+            uids = self._watermark_uids(client, keywords)
 
-            for uid in data[0].decode().split():
-                f_status, raw = client.uid("fetch", uid, "(BODY.PEEK[])")
-                if f_status != "OK" or not raw or not raw[0]:
-                    continue
-                msg = email.message_from_bytes(raw[0][1])
-                mails.append(self._parse_message(uid, msg))
+        mails: list[IncomingEmail] = []
+        failed: list[str] = []
+        for uid in uids:
+            f_status, raw = client.uid("fetch", uid, "(BODY.PEEK[])")
+            if f_status != "OK" or not raw or not isinstance(raw[0], tuple):
+                failed.append(uid)
+                continue
+            msg = email.message_from_bytes(raw[0][1])
+            mails.append(self._parse_message(uid, msg))
 
+        self._record_fetch_failures(failed, [m.uid for m in mails])
         return mails
 
-    def mark_as_read(self, uid: str) -> None:
-        with imaplib.IMAP4_SSL(self.config.host, self.config.port) as client:
+    def _record_fetch_failures(self, failed: List[str], fetched: List[str]) -> None:
+        counts = self._scan.failures if self._scan is not None else self._fetch_failures
+        for uid in fetched:
+            counts.pop(uid, None)
+        for uid in failed:
+            counts[uid] = counts.get(uid, 0) + 1
+            if counts[uid] < MAX_FETCH_ATTEMPTS:
+                continue
+            logger.warning("Giving up on UID %s in %s after %d failed fetches", uid, self.config.folder, counts[uid])
+            if self._scan is not None:
+                # Below the watermark, so dropping it from pending means it is never fetched again.
+                self._scan.pending.remove(uid)
+                del counts[uid]
+
+    def _watermark_uids(self, client: imaplib.IMAP4_SSL, keywords: List[str]) -> List[str]:
+        uidvalidity, uidnext = _folder_status(client, self.config.folder)
+        stored = self.sync_state.get(self.config.folder)
+        top = uidnext - 1
+
+        if stored is None or stored.uidvalidity != uidvalidity:
+            logger.info("No valid UID watermark for %s, resyncing from UNSEEN", self.config.folder)
+            last_uid, pending, failures = 0, [], {}
+            criteria = ["UNSEEN", "UID", f"1:{top}"]
+        else:
+            last_uid, pending = stored.last_uid, _existing_uids(client, stored.pending)
+            failures = {uid: n for uid, n in stored.failures.items() if uid in pending}
+            criteria = ["UID", f"{last_uid + 1}:{top}"]
+
+        found: list[str] = []
+        if top > last_uid:
+            # UID ranges always match at least the highest UID, so filter explicitly.
+            found = [
+                uid for uid in self._candidate_uids(client, keywords, criteria)
+                if last_uid < int(uid) <= top and uid not in pending
+            ]
+        uids = pending + found
+
+        self._scan = FolderState(uidvalidity=uidvalidity, last_uid=max(top, last_uid), pending=uids, failures=failures)
+        return uids
+
+    def _candidate_uids(self, client: imaplib.IMAP4_SSL, keywords: List[str], criteria: List[str]) -> List[str]:
+        mode = self.config.prefilter if keywords else "none"
+
+        if mode == "search" and all(k.isascii() for k in keywords):
+            try:
+                status, data = client.uid("search", None, *criteria, *_text_criteria(keywords))
+            except imaplib.IMAP4.abort:
+                raise
+            except imaplib.IMAP4.error:
+                status, data = "NO", []
+            if status == "OK":
+                return data[0].decode().split()
+            logger.info("Server-side TEXT search failed, prefiltering on partial bodies")
+            mode = "partial"
+        elif mode == "search":
+            mode = "partial"
+
+        status, data = client.uid("search", None, *criteria)
+        if status != "OK":
+            return []
+        uids = data[0].decode().split()
+        if mode != "partial" or not uids:
+            return uids
+
+        previews = _fetch_previews(client, uids, self.config.prefilter_bytes)
+        pattern = _keyword_pattern(keywords)
+        # Messages the preview fetch did not return are kept rather than dropped.
+        return [uid for uid in uids if uid not in previews or _preview_matches(previews[uid], pattern)]
+
+    def _with_session(self, operation):
+        """Run ``operation`` on the shared session, reconnecting once if it was lost."""
+        client = self._session()
+        try:
+            result = operation(client)
+        except (imaplib.IMAP4.abort, OSError):
+            logger.info("IMAP session lost, reconnecting")
+            self.close()
+            result = operation(self._session())
+        self._last_activity = time.monotonic()
+        return result
+
+    def _session(self) -> imaplib.IMAP4_SSL:
+        if self._reauthenticate:
+            self._reauthenticate = False
+            self.close()
+        if self._client is not None:
+            idle_for = time.monotonic() - self._last_activity
+            if idle_for < self.config.keepalive_seconds:
+                return self._client
+            try:
+                status, _ = self._client.noop()
+                if status == "OK":
+                    self._last_activity = time.monotonic()
+                    return self._client
+            except (imaplib.IMAP4.error, OSError):
+                pass
+            logger.info("IMAP keepalive failed, reconnecting")
+            self.close()
+
+        self._client = self._connect()
+        self._last_activity = time.monotonic()
+        return self._client
+
+    def _connect(self) -> imaplib.IMAP4_SSL:
+        client = imaplib.IMAP4_SSL(self.config.host, self.config.port, timeout=self.config.timeout_seconds)
+        try:
             if getattr(self.config, "auth_method", "password") == "oauth":
+                # Use current access_token
                 token = self.access_token or self.config.password
                 auth_str = generate_oauth2_string(self.config.username, token)
                 client.authenticate("XOAUTH2", lambda x: auth_str)
             else:
                 client.login(self.config.username, self.config.password)
             client.select(self.config.folder)
-            client.uid("store", uid, "+FLAGS", "\\Seen")
-
-    def has_keyword(self, email_item: IncomingEmail, keyword: str) -> bool:
-        pattern = rf"\b{re.escape(keyword)}\b"
-        return bool(re.search(pattern, f"{email_item.subject}\n{email_item.body}", re.IGNORECASE))
+        except Exception:
+            try:
+                client.shutdown()
+            except OSError:
+                pass
+            raise
+        return client
 
     @staticmethod
     def _parse_message(uid: str, msg: Message) -> IncomingEmail:
         subject = msg.get("Subject", "")
         from_email = msg.get("From", "")
         body = "\n".join(_extract_text_parts(msg))
-        return IncomingEmail(uid=uid, subject=subject, from_email=from_email, body=body)
+        return IncomingEmail(
+            uid=uid, subject=subject, from_email=from_email, body=body, message_id=str(msg.get("Message-ID", "")).strip()
+        )
 
 
 def _extract_text_parts(msg: Message) -> Iterable[str]:
@@ -85,3 +281,231 @@ def _extract_text_parts(msg: Message) -> Iterable[str]:
     else:
         payload = msg.get_payload(decode=True) or b""
         yield payload.decode(errors="ignore")
+
+
+def _existing_uids(client: imaplib.IMAP4_SSL, uids: List[str]) -> List[str]:
+    """Drop UIDs that were expunged since they were left pending."""
+    if not uids:
+        return []
+    status, data = client.uid("search", None, "UID", ",".join(uids))
+    if status != "OK" or not data:
+        return list(uids)
+    found = set(data[0].decode().split()) if data[0] else set()
+    gone = [uid for uid in uids if uid not in found]
+    if gone:
+        logger.info("Dropping %d expunged pending UID(s)", len(gone))
+    return [uid for uid in uids if uid in found]
+
+
+def _folder_status(client: imaplib.IMAP4_SSL, folder: str) -> tuple[int, int]:
+    status, data = client.status(folder, "(UIDVALIDITY UIDNEXT)")
+    if status != "OK" or not data or not data[0]:
+        raise imaplib.IMAP4.error(f"STATUS failed for {folder}")
+    text = data[0].decode(errors="ignore")
+    uidvalidity = re.search(r"UIDVALIDITY (\d+)", text)
+    uidnext = re.search(r"UIDNEXT (\d+)", text)
+    if not uidvalidity or not uidnext:
+        raise imaplib.IMAP4.error(f"Unexpected STATUS response: {text}")
+    return int(uidvalidity.group(1)), int(uidnext.group(1))
+
+
+class AsyncEmailMonitor:
+    """asyncio facade over EmailMonitor or GraphEmailMonitor.
+
+    imaplib has no asyncio support, so calls run on the monitor's own single
+    thread: the shared session sees one command at a time, and a long IDLE wait
+    never holds a thread of the loop's default executor.
+    """
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="imap")
+
+    def update_token(self, token: str) -> None:
+        self.monitor.update_token(token)
+
+    async def fetch_unseen(self, keywords: Iterable[str] = ()) -> List[IncomingEmail]:
+        return await self._run(self.monitor.fetch_unseen, list(keywords))
+
+    async def complete(self, uids: Iterable[str]) -> None:
+        await self._run(self.monitor.complete, list(uids))
+
+    async def supports_idle(self) -> bool:
+        return await self._run(self.monitor.supports_idle)
+
+    async def wait_for_changes(self, timeout: float, stop_event: threading.Event | None = None) -> bool:
+        return await self._run(self.monitor.wait_for_changes, timeout, stop_event)
+
+    async def close(self) -> None:
+        try:
+            await self._run(self.monitor.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+
+class KeywordMatcher:
+    """Finds every configured keyword in an email with one precompiled pattern.
+
+    The alternation sits inside a lookahead so the scan tests each position once
+    and reports keywords that overlap; a keyword that is a whole-word prefix of a
+    longer one matched at the same position is reported too.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(k for k in keywords if k))
+        ordered = sorted(self.keywords, key=len, reverse=True)
+        alternation = "|".join(re.escape(k) for k in ordered)
+        self._pattern = re.compile(rf"(?=\b({alternation})\b)", re.IGNORECASE)
+        self._implied = {
+            k.lower(): {
+                other.lower() for other in self.keywords
+                if other != k and _keyword_pattern([other]).match(k)
+            }
+            for k in self.keywords
+        }
+
+    def matches(self, email_item: IncomingEmail) -> List[str]:
+        if not self.keywords:
+            return []
+        found: set[str] = set()
+        for match in self._pattern.finditer(f"{email_item.subject}\n{email_item.body}"):
+            hit = match.group(1).lower()
+            found.add(hit)
+            found.update(self._implied.get(hit, ()))
+        return [k for k in self.keywords if k.lower() in found]
+
+
+def _keyword_pattern(keywords: Iterable[str]) -> re.Pattern:
+    return _compile_keywords(tuple(keywords))
+
+
+@lru_cache(maxsize=256)
+def _compile_keywords(keywords: tuple[str, ...]) -> re.Pattern:
+    alternation = "|".join(re.escape(k) for k in keywords)
+    return re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+
+
+def _text_criteria(keywords: List[str]) -> List[str]:
+    """Build ``OR TEXT a OR TEXT b TEXT c`` for an IMAP SEARCH."""
+    quoted = ['"' + k.replace("\\", "\\\\").replace('"', '\\"') + '"' for k in keywords]
+    criteria = ["TEXT", quoted[-1]]
+    for q in reversed(quoted[:-1]):
+        criteria = ["OR", "TEXT", q, *criteria]
+    return criteria
+
+
+def _fetch_previews(client: imaplib.IMAP4_SSL, uids: List[str], max_bytes: int) -> dict[str, tuple[bytes, bytes]]:
+    """Fetch headers and the first ``max_bytes`` of each body in one round trip."""
+    status, raw = client.uid(
+        "fetch",
+        ",".join(uids),
+        f"(UID BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.{max_bytes}>)",
+    )
+    previews: dict[str, tuple[bytes, bytes]] = {}
+    if status != "OK":
+        return previews
+
+    uid = None
+    for item in raw:
+        if not isinstance(item, tuple):
+            continue
+        descriptor, payload = item
+        match = re.search(rb"UID (\d+)", descriptor)
+        if match:
+            uid = match.group(1).decode()
+        if uid is None:
+            continue
+        headers, text = previews.get(uid, (b"", b""))
+        if b"HEADER" in descriptor.upper():
+            headers = payload
+        else:
+            text = payload
+        previews[uid] = (headers, text)
+    return previews
+
+
+def _preview_matches(preview: tuple[bytes, bytes], pattern: re.Pattern) -> bool:
+    headers, text = preview
+    # Base64 bodies can't be matched from a truncated prefix; download them.
+    if b"base64" in headers.lower() or b"base64" in text.lower():
+        return True
+    msg = email.message_from_bytes(headers)
+    try:
+        subject = str(make_header(decode_header(msg.get("Subject", ""))))
+    except (LookupError, UnicodeError, HeaderParseError):
+        # Unknown charset or malformed encoded word: let the full fetch decide.
+        return True
+    # A quoted-printable soft line break can split a keyword; match the decoded text too.
+    body = text.decode(errors="ignore")
+    decoded = quopri.decodestring(text).decode(errors="ignore")
+    return bool(pattern.search(f"{subject}\n{body}") or pattern.search(decoded))
+
+
+def _idle(client: imaplib.IMAP4, timeout: float, stop_event: threading.Event | None) -> bool:
+    tag = client._new_tag()
+    client.send(tag + b" IDLE\r\n")
+    reader = _IdleReader(client.sock)
+
+    changed = False
+    while True:
+        line = reader.readline(30)
+        if line is None:
+            raise imaplib.IMAP4.abort("no response to IDLE")
+        if line.startswith(b"+"):
+            break
+        if line.startswith(tag):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode(errors='ignore')}")
+        changed = changed or bool(_IDLE_CHANGE.match(line))
+
+    deadline = time.monotonic() + timeout
+    try:
+        while not changed:
+            if stop_event and stop_event.is_set():
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Wake at least once a second so a GUI stop request is honoured promptly.
+            line = reader.readline(min(1.0, remaining))
+            if line is not None and _IDLE_CHANGE.match(line):
+                changed = True
+    finally:
+        client.send(b"DONE\r\n")
+        while True:
+            line = reader.readline(30)
+            if line is None:
+                raise imaplib.IMAP4.abort("no response to IDLE DONE")
+            if line.startswith(tag):
+                break
+
+    return changed
+
+
+class _IdleReader:
+    """Line reader over the raw socket, used while imaplib is parked in IDLE.
+
+    imaplib's buffered file object becomes unusable after a read timeout, so IDLE
+    responses are read directly with select() and a short wake-up interval.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b""
+
+    def readline(self, timeout: float) -> bytes | None:
+        deadline = time.monotonic() + timeout
+        while b"\r\n" not in self.buffer:
+            remaining = deadline - time.monotonic()
+            pending = getattr(self.sock, "pending", lambda: 0)()
+            if not pending:
+                if remaining <= 0 or not select.select([self.sock], [], [], remaining)[0]:
+                    return None
+            data = self.sock.recv(4096)
+            if not data:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\r\n", 1)
+        return line
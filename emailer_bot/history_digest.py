@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from .onedrive_client import ResearchFile
+from .score_index import _file_key
+from .sync_state import SyncStateStore
+
+
+@dataclass
+class DigestState:
+    digest: str
+    # file key -> sha256 of the content the digest reflects
+    files: Dict[str, str] = field(default_factory=dict)
+    # file key -> file name, to tell the model which files went away
+    names: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class DigestPlan:
+    """What a keyword's digest needs before the next alert."""
+
+    # Current digest text; None until the first one is written.
+    previous: str | None
+    # Excerpts of new or changed files plus removed file names; empty when the digest is current.
+    changes: str
+    files: Dict[str, str]
+    names: Dict[str, str]
+
+    @property
+    def up_to_date(self) -> bool:
+        return not self.changes
+
+
+class HistoryDigest:
+    """Per-keyword rolling summary of the research folder, persisted as JSON.
+
+    The digest is written once from the whole folder and afterwards patched
+    from only the files whose content hash changed, so most alerts reuse it
+    without another model call.
+    """
+
+    def __init__(self, store: SyncStateStore[DigestState], source_chars: int = 8000):
+        self.store = store
+        self.source_chars = source_chars
+
+    def plan(self, keyword: str, files: List[ResearchFile]) -> DigestPlan:
+        current = {_file_key(f): hashlib.sha256(f.content.encode("utf-8")).hexdigest() for f in files}
+        state = self.store.get(keyword)
+        known = state.files if state else {}
+
+        sections = [
+            f"### File: {f.name}\n{f.content[: self.source_chars]}"
+            for f in files
+            if known.get(_file_key(f)) != current[_file_key(f)]
+        ]
+        removed = sorted(known.keys() - current.keys())
+        if removed and state is not None:
+            sections.append("### Removed files\n" + "\n".join(state.names.get(k, k) for k in removed))
+        return DigestPlan(
+            previous=state.digest if state else None,
+            changes="\n\n".join(sections),
+            files=current,
+            names={_file_key(f): f.name for f in files},
+        )
+
+    def save(self, keyword: str, plan: DigestPlan, digest: str) -> None:
+        self.store.put(keyword, DigestState(digest=digest, files=plan.files, names=plan.names))
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from .llm_client import LLMResult
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_use ON responses (last_used);
+"""
+
+# "Re:", "Fwd:", "FW:" ... prefixes, possibly repeated, at the start of a subject.
+_REPLY_PREFIX = re.compile(r"^(subject:)?(?:\s*(?:re|fwd?|aw|wg)\s*(?:\[\d+\])?\s*:)+", re.IGNORECASE | re.MULTILINE)
+_QUOTE_MARKERS = re.compile(r"^[ \t>]+", re.MULTILINE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+class LLMCache:
+    """Synthesized results persisted in SQLite, keyed by a hash of the prompt inputs.
+
+    Entries expire ``ttl_seconds`` after they were stored; beyond ``max_entries``
+    the least recently used ones are evicted. ``hits`` and ``misses`` count
+    lookups since the process started.
+    """
+
+    def __init__(self, path: str | Path, ttl_seconds: float, max_entries: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def key(model: str, keyword: str, trigger_email: str, history_context: str, history_digest: str = "") -> str:
+        digest = hashlib.sha256()
+        for part in (model, keyword.casefold(), normalize_trigger(trigger_email), history_context, history_digest):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> LLMResult | None:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT result FROM responses WHERE key = ? AND created > ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return LLMResult(**json.loads(row[0]))
+
+    def put(self, key: str, result: LLMResult) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, result, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(asdict(result)), now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def normalize_trigger(text: str) -> str:
+    """Collapse what differs between re-sends of one update: reply/forward prefixes, quoting, spacing, case."""
+    text = _REPLY_PREFIX.sub(r"\1", text)
+    text = _QUOTE_MARKERS.sub("", text)
+    return _WHITESPACE.sub(" ", text).strip().casefold()
@@ -1,11 +1,23 @@
 from __future__ import annotations
 
-import json
-from dataclasses import dataclass
-from typing import List
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, List, TypeVar
 
 
 from .config import OpenAIConfig
+from .structured_output import MalformedOutput, StreamingJSONObject
+from .sync_runner import run_sync
+
+if TYPE_CHECKING:
+    from .llm_cache import LLMCache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 
 @dataclass
@@ -15,41 +27,413 @@ class LLMResult:
     key_points: List[str]
 
 
-class LLMClient:
-    def __init__(self, config: OpenAIConfig):
-        from openai import OpenAI
+@dataclass
+class LLMCallStats:
+    purpose: str
+    keyword: str
+    latency_seconds: float = 0.0
+    # Time until the first complete field (e.g. summary) was parsed from the stream.
+    first_field_seconds: float | None = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    attempts: int = 1
+
+
+@dataclass
+class LLMUsage:
+    """Running totals over every model call made by one client."""
+
+    calls: int = 0
+    retries: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    latency_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, stats: LLMCallStats) -> None:
+        with self._lock:
+            self.calls += 1
+            self.retries += stats.attempts - 1
+            self.input_tokens += stats.input_tokens
+            self.output_tokens += stats.output_tokens
+            self.cached_tokens += stats.cached_tokens
+            self.latency_seconds += stats.latency_seconds
+        logger.info(
+            "LLM %s for '%s': %.2fs (first field %s), %d in / %d out tokens (%d cached), %d attempt(s)",
+            stats.purpose,
+            stats.keyword,
+            stats.latency_seconds,
+            "n/a" if stats.first_field_seconds is None else f"{stats.first_field_seconds:.2f}s",
+            stats.input_tokens,
+            stats.output_tokens,
+            stats.cached_tokens,
+            stats.attempts,
+        )
+
+
+# Receives each completed top-level field (each element, for arrays) while the response streams.
+PartialCallback = Callable[[str, object], None]
 
-        self.client = OpenAI(api_key=config.api_key)
+
+class AsyncLLMClient:
+    """Schema-constrained syntheses and history digests over AsyncOpenAI's Responses API."""
+
+    def __init__(self, config: OpenAIConfig, cache: LLMCache | None = None):
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(api_key=config.api_key)
         self.model = config.model
+        self.cache = cache
+        self.max_retries = config.max_retries
+        self.usage = LLMUsage()
+
+    async def synthesize(
+        self,
+        keyword: str,
+        trigger_email: str,
+        history_context: str,
+        history_digest: str = "",
+        on_partial: PartialCallback | None = None,
+    ) -> LLMResult:
+        """Stream a schema-constrained synthesis; ``on_partial`` receives summary and each key point as parsed."""
+        cache_key = _lookup_key(self.cache, self.model, keyword, trigger_email, history_context, history_digest)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                _log_hit(self.cache, keyword)
+                _replay(cached, on_partial)
+                return cached
+
+        result = await self._stream_json(
+            "synthesis",
+            keyword,
+            build_prompt(keyword, trigger_email, history_context, history_digest),
+            SYNTHESIS_SCHEMA,
+            _to_result,
+            on_partial,
+        )
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, result)
+        return result
+
+    async def synthesize_batch(
+        self,
+        keyword: str,
+        trigger_emails: List[str],
+        history_context: str,
+        history_digest: str = "",
+        consolidate: bool = False,
+        on_partial: PartialCallback | None = None,
+    ) -> List[LLMResult]:
+        """One call for several updates: a result per update, or a single one when ``consolidate``.
+
+        ``on_partial`` receives each update's result ("results") as it completes,
+        or the consolidated result's fields.
+        """
+        return await self._stream_json(
+            "batch synthesis",
+            keyword,
+            build_batch_prompt(keyword, trigger_emails, history_context, history_digest, consolidate),
+            SYNTHESIS_SCHEMA if consolidate else _BATCH_SCHEMA,
+            lambda value: _to_batch_results(value, len(trigger_emails), consolidate),
+            on_partial,
+        )
+
+    async def digest_history(self, keyword: str, previous_digest: str | None, changes: str) -> str:
+        stats = LLMCallStats("digest", keyword)
+        started = time.monotonic()
+        response = await self.client.responses.create(
+            model=self.model,
+            input=build_digest_prompt(keyword, previous_digest, changes),
+            text={"format": {"type": "text"}},
+        )
+        _finish(stats, started, response.usage)
+        self.usage.record(stats)
+        return response.output_text.strip()
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+    async def _stream_json(
+        self,
+        purpose: str,
+        keyword: str,
+        prompt: str,
+        schema: dict,
+        convert: Callable[[dict], T],
+        on_partial: PartialCallback | None,
+    ) -> T:
+        """Stream one structured response and ``convert`` it; malformed or rejected output is retried.
+
+        Fields reach ``on_partial`` as they stream, so an attempt that is later
+        discarded may already have reported some.
+        """
+        for attempt in range(1, self.max_retries + 2):
+            stats = LLMCallStats(purpose, keyword, attempts=attempt)
+            started = time.monotonic()
+            parser = StreamingJSONObject(schema, on_partial=_timed(stats, started, on_partial))
+            stream = await self.client.responses.create(**_stream_request(self.model, prompt, keyword, schema))
+            try:
+                usage = None
+                async for event in stream:
+                    usage = _handle_event(event, parser) or usage
+                # convert() raises MalformedOutput for a well-formed but unusable answer, retried like the rest.
+                value = convert(parser.close())
+            except MalformedOutput as e:
+                logger.warning("Discarding malformed %s for '%s' (attempt %d): %s", purpose, keyword, attempt, e)
+                continue
+            finally:
+                await stream.close()
+            _finish(stats, started, usage)
+            self.usage.record(stats)
+            return value
+        raise MalformedOutput(f"No valid {purpose} from the model after {self.max_retries + 1} attempt(s)")
+
+
+class LLMClient:
+    """Blocking wrapper over AsyncLLMClient for synchronous callers."""
+
+    def __init__(self, config: OpenAIConfig, cache: LLMCache | None = None):
+        self.client = AsyncLLMClient(config, cache=cache)
+
+    @property
+    def usage(self) -> LLMUsage:
+        return self.client.usage
+
+    def synthesize(
+        self,
+        keyword: str,
+        trigger_email: str,
+        history_context: str,
+        history_digest: str = "",
+        on_partial: PartialCallback | None = None,
+    ) -> LLMResult:
+        """``on_partial`` is called from the private loop's thread."""
+        return run_sync(self.client.synthesize(keyword, trigger_email, history_context, history_digest, on_partial))
+
+    def synthesize_batch(
+        self,
+        keyword: str,
+        trigger_emails: List[str],
+        history_context: str,
+        history_digest: str = "",
+        consolidate: bool = False,
+        on_partial: PartialCallback | None = None,
+    ) -> List[LLMResult]:
+        return run_sync(
+            self.client.synthesize_batch(
+                keyword, trigger_emails, history_context, history_digest, consolidate, on_partial
+            )
+        )
+
+    def digest_history(self, keyword: str, previous_digest: str | None, changes: str) -> str:
+        return run_sync(self.client.digest_history(keyword, previous_digest, changes))
+
+    def close(self) -> None:
+        run_sync(self.client.aclose())
+
+
+_RESULT_SCHEMA = {
+    "type": "object",
+    # Property order is generation order: summary and key points stream in before the long email.
+    "properties": {
+        "summary": {"type": "string"},
+        "key_points": {"type": "array", "items": {"type": "string"}},
+        "formatted_email": {"type": "string"},
+    },
+    "required": ["summary", "key_points", "formatted_email"],
+    "additionalProperties": False,
+}
+SYNTHESIS_SCHEMA = _RESULT_SCHEMA
+
+
+# Array length isn't reliably enforceable in strict mode; _to_batch_results checks it.
+_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {"results": {"type": "array", "items": _RESULT_SCHEMA}},
+    "required": ["results"],
+    "additionalProperties": False,
+}
+
+
+def _stream_request(model: str, prompt: str, keyword: str, schema: dict) -> dict:
+    return {
+        "model": model,
+        "input": prompt,
+        "text": {"format": {"type": "json_schema", "name": "alert_synthesis", "schema": schema, "strict": True}},
+        "prompt_cache_key": _prompt_cache_key(keyword),
+        "stream": True,
+    }
+
+
+def _handle_event(event: object, parser: StreamingJSONObject) -> object | None:
+    """Feed one stream event to ``parser``; returns the usage block once the response completes."""
+    kind = getattr(event, "type", "")
+    if kind == "response.output_text.delta":
+        parser.feed(event.delta)
+    elif kind == "response.refusal.delta":
+        raise MalformedOutput("The model refused to answer")
+    elif kind == "response.completed":
+        return event.response.usage
+    elif kind in ("response.failed", "response.incomplete", "error"):
+        raise MalformedOutput(f"Stream ended with {kind}")
+    return None
+
+
+def _timed(stats: LLMCallStats, started: float, on_partial: PartialCallback | None) -> PartialCallback:
+    def report(name: str, value: object) -> None:
+        if stats.first_field_seconds is None:
+            stats.first_field_seconds = time.monotonic() - started
+        if on_partial is not None:
+            on_partial(name, value)
 
-    def synthesize(self, keyword: str, trigger_email: str, history_context: str) -> LLMResult:
-        prompt = f"""
-You are an investment intelligence assistant.
+    return report
+
+
+def _replay(result: LLMResult, on_partial: PartialCallback | None) -> None:
+    """Report a cached result's fields the way a streamed one would arrive."""
+    if on_partial is None:
+        return
+    on_partial("summary", result.summary)
+    for point in result.key_points:
+        on_partial("key_points", point)
+    on_partial("formatted_email", result.formatted_email)
+
+
+def _finish(stats: LLMCallStats, started: float, usage: object | None) -> None:
+    stats.latency_seconds = time.monotonic() - started
+    if usage is not None:
+        stats.input_tokens = getattr(usage, "input_tokens", 0) or 0
+        stats.output_tokens = getattr(usage, "output_tokens", 0) or 0
+        details = getattr(usage, "input_tokens_details", None)
+        stats.cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+
+def _to_result(value: dict) -> LLMResult:
+    return LLMResult(
+        summary=value["summary"],
+        formatted_email=value["formatted_email"],
+        key_points=value["key_points"],
+    )
+
+
+def _to_batch_results(value: dict, expected: int, consolidate: bool) -> List[LLMResult]:
+    if consolidate:
+        return [_to_result(value)]
+    if len(value["results"]) != expected:
+        raise MalformedOutput(f"Expected {expected} results, model returned {len(value['results'])}")
+    return [_to_result(item) for item in value["results"]]
+
+
+def _lookup_key(
+    cache: LLMCache | None, model: str, keyword: str, trigger_email: str, history_context: str, history_digest: str
+) -> str | None:
+    if cache is None:
+        return None
+    return cache.key(model, keyword, trigger_email, history_context, history_digest)
+
+
+def _prompt_cache_key(keyword: str) -> str:
+    # Routes a keyword's requests together so the provider can reuse the cached prompt prefix.
+    return f"emailer-synthesis:{keyword}"
+
+
+def _log_hit(cache: LLMCache, keyword: str) -> None:
+    logger.info("LLM cache hit for '%s' (%d hits, %d misses)", keyword, cache.hits, cache.misses)
+
+
+# Identical for every alert, so it opens the prompt and forms a cacheable prefix.
+SYNTHESIS_INSTRUCTIONS = """You are an investment intelligence assistant.
 
 Task:
-1) Read NEW UPDATE and CONTEXT.
-2) Produce a concise synthesis for investment {keyword}.
+1) Read the HISTORY DIGEST, CONTEXT and NEW UPDATE below.
+2) Produce a concise synthesis of the NEW UPDATE for the named investment.
 3) Return JSON with keys:
    - summary (string)
    - key_points (array of strings)
    - formatted_email (string, business style; sections: Overview, Context, Action Items)
+"""
+
+
+def build_prompt(keyword: str, trigger_email: str, history_context: str, history_digest: str = "") -> str:
+    # Ordered from most to least stable: instructions, then per-keyword digest, then per-alert parts.
+    return f"""{SYNTHESIS_INSTRUCTIONS}
+INVESTMENT: {keyword}
+
+HISTORY DIGEST:
+{history_digest or "(none)"}
+
+CONTEXT:
+{history_context}
 
 NEW UPDATE:
 {trigger_email}
+"""
+
+
+BATCH_INSTRUCTIONS = """You are an investment intelligence assistant.
+
+Task:
+1) Read the HISTORY DIGEST, CONTEXT and the numbered NEW UPDATES below.
+2) {task}
+3) {output}
+   - summary (string)
+   - key_points (array of strings)
+   - formatted_email (string, business style; sections: Overview, Context, Action Items)
+"""
+
+
+def build_batch_prompt(
+    keyword: str,
+    trigger_emails: List[str],
+    history_context: str,
+    history_digest: str = "",
+    consolidate: bool = False,
+) -> str:
+    if consolidate:
+        instructions = BATCH_INSTRUCTIONS.format(
+            task="Produce one consolidated synthesis covering all NEW UPDATES for the named investment.",
+            output="Return JSON with keys:",
+        )
+    else:
+        instructions = BATCH_INSTRUCTIONS.format(
+            task="Produce a separate concise synthesis of each NEW UPDATE for the named investment.",
+            output='Return JSON {"results": [...]} with one object per update, in update order, each with keys:',
+        )
+    updates = "\n\n".join(f"--- UPDATE {i} ---\n{trigger}" for i, trigger in enumerate(trigger_emails, 1))
+    return f"""{instructions}
+INVESTMENT: {keyword}
+
+HISTORY DIGEST:
+{history_digest or "(none)"}
 
 CONTEXT:
 {history_context}
+
+NEW UPDATES:
+{updates}
 """
-        response = self.client.responses.create(
-            model=self.model,
-            input=prompt,
-            text={"format": {"type": "text"}},
-        )
 
-        content = response.output_text
-        parsed = json.loads(content)
-        return LLMResult(
-            summary=parsed["summary"],
-            formatted_email=parsed["formatted_email"],
-            key_points=parsed["key_points"],
-        )
+
+def build_digest_prompt(keyword: str, previous_digest: str | None, changes: str) -> str:
+    if previous_digest is None:
+        return f"""You maintain a research digest for investment {keyword}.
+Summarize the RESEARCH FILES below into a compact digest of at most 300 words: thesis, score
+trend, key risks and open questions. Return only the digest text.
+
+RESEARCH FILES:
+{changes}
+"""
+    return f"""You maintain a research digest for investment {keyword}.
+Revise the CURRENT DIGEST to reflect the CHANGED FILES below (new or edited files, and files that
+were removed). Keep it at most 300 words: thesis, score trend, key risks and open questions.
+Return only the revised digest text.
+
+CURRENT DIGEST:
+{previous_digest}
+
+CHANGED FILES:
+{changes}
+"""
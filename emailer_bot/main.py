@@ -1,123 +1,377 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import hashlib
 import logging
 import threading
 import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Iterable, Sequence
 
 from .auth import MicrosoftAuth
-from .config import load_config
-from .email_monitor import EmailMonitor
-from .llm_client import LLMClient
-from .notifier import Notifier
-from .onedrive_client import OneDriveClient
-from .workflow import InvestmentWorkflow
+from .config import AppConfig, load_config
+from .context_index import ContextIndex
+from .email_monitor import AsyncEmailMonitor, EmailMonitor, IncomingEmail, KeywordMatcher
+from .graph_monitor import GraphEmailMonitor, GraphMailState
+from .history_digest import DigestState, HistoryDigest
+from .llm_cache import LLMCache
+from .llm_client import AsyncLLMClient
+from .metrics import Metrics, MetricsExporter
+from .notifier import AsyncNotifier, Notifier
+from .onedrive_client import AsyncOneDriveClient
+from .render_cache import RenderCache
+from .research_cache import ResearchCache
+from .score_index import ScoreIndex
+from .sync_state import SyncStateStore
+from .token_manager import TokenManager, load_token_cache
+from .pipeline import AlertPipeline, group_matches
+from .work_queue import WorkQueue
+from .workflow import InvestmentWorkflow, WorkflowOutput
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Investment-triggered email workflow")
-    parser.add_argument("--config", required=True, help="Path to YAML config")
+    parser.add_argument(
+        "--config",
+        required=True,
+        action="append",
+        help="Path to YAML config; repeat to monitor several mailboxes",
+    )
+    parser.add_argument(
+        "--clear-research-cache",
+        action="store_true",
+        help="Drop the local OneDrive research cache before starting",
+    )
     return parser.parse_args()
 
 
+def build_research_cache(config: AppConfig, folder_path: str) -> ResearchCache | None:
+    if config.onedrive.cache_max_mb <= 0:
+        return None
+    folder_key = hashlib.sha1(folder_path.encode("utf-8")).hexdigest()[:16]
+    return ResearchCache(
+        Path(config.state_dir) / "research_cache" / folder_key,
+        max_bytes=config.onedrive.cache_max_mb * 1024 * 1024,
+    )
+
+
+def build_monitor(config: AppConfig) -> EmailMonitor | GraphEmailMonitor:
+    if config.mail_transport == "graph":
+        return GraphEmailMonitor(
+            config.imap,
+            sync_state=SyncStateStore(Path(config.state_dir) / "graph_mail_sync.json", GraphMailState),
+        )
+    sync_state = None
+    if config.imap.track_uids:
+        sync_state = SyncStateStore(Path(config.state_dir) / "imap_sync.json")
+    return EmailMonitor(config.imap, sync_state=sync_state)
+
+
+def build_chart_stores(config: AppConfig) -> tuple[ScoreIndex | None, RenderCache | None]:
+    score_index = ScoreIndex(Path(config.state_dir) / "scores.sqlite3") if config.chart.score_index else None
+    render_cache = None
+    if config.chart.cache_max_files > 0:
+        render_cache = RenderCache(config.chart.cache_dir, config.chart.cache_max_files)
+    return score_index, render_cache
+
+
+def build_context_index(config: AppConfig) -> ContextIndex | None:
+    if not config.context.retrieval:
+        return None
+    return ContextIndex(Path(config.state_dir) / "context.sqlite3", chunk_tokens=config.context.chunk_tokens)
+
+
+def build_history_digest(config: AppConfig) -> HistoryDigest | None:
+    if not config.context.history_digest:
+        return None
+    store = SyncStateStore(Path(config.state_dir) / "history_digest.json", DigestState)
+    return HistoryDigest(store, source_chars=config.context.digest_source_chars)
+
+
+def start_token_manager(
+    config: AppConfig, monitor, notifier, onedrive_clients: Iterable[AsyncOneDriveClient]
+) -> TokenManager | None:
+    """Start background token refresh for the OAuth-authenticated clients, or return None without OAuth."""
+    if "oauth" not in (config.imap.auth_method, config.onedrive.auth_method, config.smtp.auth_method):
+        return None
+    cache_path = Path(config.state_dir) / "msal_token_cache.json"
+    try:
+        cache = load_token_cache(cache_path)
+        auth = MicrosoftAuth(client_id=config.client_id, token_cache=cache)
+    except Exception as e:
+        logging.error(f"Failed to init auth client: {e}")
+        return None
+
+    tokens = TokenManager(
+        auth,
+        cache,
+        cache_path,
+        refresh_token=config.refresh_token,
+        margin_seconds=config.token_refresh_margin_seconds,
+    )
+    for consumer in (monitor, notifier, *onedrive_clients):
+        tokens.add_consumer(consumer)
+    for onedrive_client in onedrive_clients:
+        onedrive_client.on_unauthorized = tokens.refresh_now
+    tokens.start()
+    return tokens
+
+
+async def _acall(operation):
+    return await operation()
+
+
+def start_metrics(config: AppConfig) -> tuple[Metrics, MetricsExporter]:
+    metrics = Metrics()
+    exporter = MetricsExporter(
+        metrics,
+        host=config.metrics.host,
+        port=config.metrics.port,
+        log_interval_seconds=config.metrics.log_interval_seconds,
+    )
+    exporter.start()
+    return metrics, exporter
+
+
+def build_work_queue(config: AppConfig) -> WorkQueue:
+    return WorkQueue(
+        Path(config.state_dir) / "work_queue.sqlite3",
+        max_attempts=config.pipeline.retry_max_attempts,
+        backoff_seconds=config.pipeline.retry_backoff_seconds,
+        max_backoff_seconds=config.pipeline.retry_max_backoff_seconds,
+        retention_days=config.pipeline.queue_retention_days,
+    )
+
+
+def build_llm_cache(config: AppConfig) -> LLMCache | None:
+    if not config.openai.cache or config.openai.cache_max_entries <= 0:
+        return None
+    return LLMCache(
+        Path(config.state_dir) / "llm_cache.sqlite3",
+        ttl_seconds=config.openai.cache_ttl_hours * 3600,
+        max_entries=config.openai.cache_max_entries,
+    )
+
+
 def run_monitor(config_path: str, stop_event: threading.Event | None = None) -> None:
+    """Blocking entry point: runs run_monitor_async for one config until ``stop_event`` is set."""
+    asyncio.run(run_monitor_async([config_path], stop_event))
+
+
+async def run_monitor_async(
+    config_paths: str | Sequence[str], stop_event: threading.Event | None = None
+) -> None:
+    """Run one monitor per config (mailbox) concurrently on the running event loop.
+
+    Mailboxes run as tasks in a task group, and every poll waits for the alerts
+    it started, so a poll only completes once all of them have finished.
+    """
     if not logging.getLogger().hasHandlers():
         logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 
-    config = load_config(config_path)
+    paths = [config_paths] if isinstance(config_paths, str) else list(config_paths)
+    stop_event = stop_event or threading.Event()
+    async with asyncio.TaskGroup() as group:
+        for path in paths:
+            group.create_task(_monitor_mailbox(load_config(path), stop_event))
 
-    monitor = EmailMonitor(config.imap)
-    onedrive_client = OneDriveClient(config.onedrive)
-    workflow = InvestmentWorkflow(
-        onedrive=onedrive_client,
-        llm=LLMClient(config.openai),
+
+async def _monitor_mailbox(config: AppConfig, stop_event: threading.Event) -> None:
+    monitor = AsyncEmailMonitor(build_monitor(config))
+    notifier = AsyncNotifier(Notifier(config.smtp))
+    llm = AsyncLLMClient(config.openai, cache=build_llm_cache(config))
+    score_index, render_cache = build_chart_stores(config)
+    context_index = build_context_index(config)
+    digests = build_history_digest(config)
+    metrics, exporter = start_metrics(config)
+    work_queue = build_work_queue(config)
+
+    # One OneDrive client per research folder; keywords sharing a folder share its client.
+    onedrive_clients: dict[str, AsyncOneDriveClient] = {}
+    workflows: dict[str, InvestmentWorkflow] = {}
+    for kw in config.keywords:
+        if kw.folder_path not in onedrive_clients:
+            onedrive_clients[kw.folder_path] = AsyncOneDriveClient(
+                replace(config.onedrive, folder_path=kw.folder_path),
+                cache=build_research_cache(config, kw.folder_path),
+            )
+        workflows[kw.keyword] = InvestmentWorkflow(
+            onedrive=onedrive_clients[kw.folder_path],
+            llm=llm,
+            score_index=score_index,
+            chart=config.chart,
+            render_cache=render_cache,
+            context_index=context_index,
+            context=config.context,
+            digests=digests,
+            consolidate_batches=config.pipeline.batch_consolidate,
+            metrics=metrics,
+        )
+    routes = {kw.keyword: kw for kw in config.keywords}
+    matcher = KeywordMatcher(routes)
+
+    tokens = await asyncio.to_thread(
+        start_token_manager, config, monitor, notifier, onedrive_clients.values()
     )
-    notifier = Notifier(config.smtp)
+    guarded = tokens.acall if tokens is not None else _acall
 
-    # Auth setup
-    auth_client = None
-    current_refresh_token = config.refresh_token
-    last_refresh_time = 0
+    async def send_alert(keyword: str, output: WorkflowOutput) -> None:
+        with metrics.timed("send", keyword) as m:
+            await guarded(
+                lambda: notifier.send(
+                    recipients=routes[keyword].recipients,
+                    subject=output.subject,
+                    body=output.body,
+                    graph_png=output.graph_png,
+                    graph_filename=output.graph_filename,
+                )
+            )
+            m.bytes = _output_bytes(output)
 
-    if getattr(config.imap, "auth_method", "password") == "oauth" or getattr(config.onedrive, "auth_method", "password") == "oauth":
-        try:
-            auth_client = MicrosoftAuth(client_id=config.client_id)
-        except Exception as e:
-            logging.error(f"Failed to init auth client: {e}")
-
-    logging.info("Starting monitor for keyword '%s'", config.investment_keyword)
-
-    while True:
-        # Token Refresh Logic
-        if auth_client and current_refresh_token:
-            # Refresh if > 45 mins since last refresh (token usually valid for 60m)
-            # or if it's the first iteration (last_refresh_time=0) to ensure freshness
-            if time.time() - last_refresh_time > 2700:
+    async def fetch_unseen() -> list[IncomingEmail]:
+        with metrics.timed("fetch_unseen") as m:
+            unseen = await monitor.fetch_unseen(matcher.keywords)
+            m.bytes = _email_bytes(unseen)
+        return unseen
+
+    pipeline = AlertPipeline(
+        workflows,
+        send_alert,
+        workers=config.pipeline.workers,
+        queue_size=config.pipeline.queue_size,
+        stop_event=stop_event,
+        work_queue=work_queue,
+    )
+
+    use_idle = config.imap.idle
+    logging.info("Starting monitor for keyword(s): %s", ", ".join(matcher.keywords))
+    try:
+        while not stop_event.is_set():
+            try:
+                unseen = await guarded(fetch_unseen)
+                logging.info("Fetched %d unseen email(s)", len(unseen))
+            except Exception:
+                logging.exception("Error fetching emails")
+                await _sleep_unless_stopped(config.poll_interval_seconds, stop_event)
+                continue
+
+            matches = _find_matches(unseen, matcher)
+            if matches and _batch_window(config) and not stop_event.is_set():
+                # Give a burst of related emails time to land so they share one batch.
+                await _sleep_unless_stopped(config.pipeline.batch_window_seconds, stop_event)
                 try:
-                    logging.info("Refreshing access token...")
-                    result = auth_client.refresh_access_token(current_refresh_token)
-                    new_token = result.get("access_token")
-                    new_refresh = result.get("refresh_token")
-
-                    if new_token:
-                        monitor.update_token(new_token)
-                        notifier.update_token(new_token)
-                        onedrive_client.update_token(new_token)
-                        last_refresh_time = time.time()
-                        logging.info("Token refreshed successfully.")
-
-                    if new_refresh:
-                        current_refresh_token = new_refresh
-                except Exception as e:
-                    logging.error(f"Token refresh failed: {e}")
-
-        if stop_event and stop_event.is_set():
-            logging.info("Stopping monitor...")
-            break
+                    unseen = await guarded(fetch_unseen)
+                    matches = _find_matches(unseen, matcher)
+                except Exception:
+                    logging.exception("Error re-fetching emails after the batch window")
+
+            processed = await asyncio.to_thread(
+                _enqueue_matches, work_queue, unseen, matches, config.pipeline.batch_max_emails
+            )
+            try:
+                await guarded(lambda: monitor.complete(processed))
+            except Exception:
+                logging.exception("Error completing %d email(s)", len(processed))
+
+            jobs = []
+            for alert in await asyncio.to_thread(work_queue.due):
+                if stop_event.is_set():
+                    break
+                jobs.append(await pipeline.resume(alert))
+            await pipeline.wait(jobs)
 
+            if use_idle:
+                try:
+                    if await monitor.supports_idle():
+                        if await monitor.wait_for_changes(config.imap.idle_timeout_seconds, stop_event):
+                            logging.info("IDLE reported new mail")
+                        continue
+                    logging.warning("IMAP server lacks IDLE capability, falling back to polling")
+                    use_idle = False
+                except Exception:
+                    logging.exception("IDLE failed, polling for this cycle")
+            await _sleep_unless_stopped(config.poll_interval_seconds, stop_event)
+    finally:
+        await pipeline.shutdown()
+        if tokens is not None:
+            await asyncio.to_thread(tokens.stop)
+        await monitor.close()
+        await notifier.close()
+        await llm.aclose()
+        for onedrive_client in onedrive_clients.values():
+            await onedrive_client.aclose()
+        work_queue.close()
+        await asyncio.to_thread(exporter.stop)
+    logging.info("Monitor stopped")
+
+
+def _find_matches(unseen: list[IncomingEmail], matcher: KeywordMatcher) -> list[tuple[str, IncomingEmail]]:
+    matches = []
+    for incoming in unseen:
+        for keyword in matcher.matches(incoming):
+            logging.info("Keyword '%s' detected in UID %s", keyword, incoming.uid)
+            matches.append((keyword, incoming))
+    return matches
+
+
+def _email_bytes(emails: list[IncomingEmail]) -> int:
+    return sum(len(incoming.body.encode("utf-8")) for incoming in emails)
+
+
+def _output_bytes(output: WorkflowOutput) -> int:
+    return len(output.body.encode("utf-8")) + len(output.graph_png or b"")
+
+
+def _batch_window(config: AppConfig) -> bool:
+    return config.pipeline.batch_max_emails > 1 and config.pipeline.batch_window_seconds > 0
+
+
+def _enqueue_matches(
+    work_queue: WorkQueue,
+    unseen: list[IncomingEmail],
+    matches: list[tuple[str, IncomingEmail]],
+    batch_max_emails: int,
+) -> list[str]:
+    """Record the matches in the work queue; returns the UIDs whose every match is now queued.
+
+    From then on the queue owns those alerts, retrying them across restarts,
+    so the emails can be completed in the mailbox.
+    """
+    missing = {incoming.uid: 0 for incoming in unseen}
+    for _, incoming in matches:
+        missing[incoming.uid] += 1
+    for keyword, batch in group_matches(matches, batch_max_emails):
         try:
-            unseen = monitor.fetch_unseen()
-            logging.info("Fetched %d unseen email(s)", len(unseen))
+            work_queue.enqueue(keyword, batch)
         except Exception:
-            logging.exception("Error fetching emails")
-            if stop_event:
-                if stop_event.wait(config.poll_interval_seconds):
-                    break
-            else:
-                time.sleep(config.poll_interval_seconds)
+            logging.exception("Error queueing '%s' for UID %s", keyword, ",".join(e.uid for e in batch))
             continue
+        for incoming in batch:
+            missing[incoming.uid] -= 1
+    return [uid for uid, count in missing.items() if count == 0]
 
-        for incoming in unseen:
-            if stop_event and stop_event.is_set():
-                break
-
-            try:
-                if monitor.has_keyword(incoming, config.investment_keyword):
-                    logging.info("Keyword '%s' detected in UID %s", config.investment_keyword, incoming.uid)
-                    output = workflow.run(config.investment_keyword, incoming)
-                    notifier.send(
-                        recipients=config.recipients,
-                        subject=output.subject,
-                        body=output.body,
-                        graph_path=output.graph_path,
-                    )
-                    logging.info("Notification sent for UID %s", incoming.uid)
-
-                monitor.mark_as_read(incoming.uid)
-            except Exception:
-                logging.exception("Error processing email UID %s", incoming.uid)
 
-        if stop_event:
-            if stop_event.wait(config.poll_interval_seconds):
-                logging.info("Stopping monitor during sleep...")
-                break
-        else:
-            time.sleep(config.poll_interval_seconds)
+async def _sleep_unless_stopped(seconds: float, stop_event: threading.Event) -> None:
+    deadline = time.monotonic() + seconds
+    while not stop_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(0.5, remaining))
 
 
 def main() -> None:
     args = parse_args()
-    run_monitor(args.config)
+    if args.clear_research_cache:
+        for config_path in args.config:
+            config = load_config(config_path)
+            for folder_path in {kw.folder_path for kw in config.keywords}:
+                cache = build_research_cache(config, folder_path)
+                if cache is not None:
+                    cache.invalidate()
+    asyncio.run(run_monitor_async(args.config))
 
 
 if __name__ == "__main__":
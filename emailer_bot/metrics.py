@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; spans a cached lookup up to a slow LLM call.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@dataclass
+class _Series:
+    # One count per bucket plus a final +Inf bucket, not cumulative.
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    bytes: int = 0
+    errors: int = 0
+
+    def copy(self) -> "_Series":
+        return _Series(list(self.buckets), self.count, self.seconds, self.max_seconds, self.bytes, self.errors)
+
+
+class Measurement:
+    """Handed out by Metrics.timed(); set ``bytes`` to what the stage read or produced."""
+
+    def __init__(self):
+        self.bytes = 0
+
+
+class Metrics:
+    """Per-stage, per-keyword latency histograms with byte and error counters.
+
+    Thread-safe; stages record with ``with metrics.timed("synthesize", keyword) as m``
+    and the totals are read as Prometheus text or as a summary of the
+    activity since a previous snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+
+    @contextmanager
+    def timed(self, stage: str, keyword: str = "") -> Iterator[Measurement]:
+        measurement = Measurement()
+        start = time.perf_counter()
+        try:
+            yield measurement
+        except BaseException:
+            self.observe(stage, keyword, time.perf_counter() - start, measurement.bytes, error=True)
+            raise
+        self.observe(stage, keyword, time.perf_counter() - start, measurement.bytes)
+
+    def observe(self, stage: str, keyword: str, seconds: float, nbytes: int = 0, error: bool = False) -> None:
+        with self._lock:
+            series = self._series.setdefault((stage, keyword), _Series())
+            series.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            series.count += 1
+            series.seconds += seconds
+            series.max_seconds = max(series.max_seconds, seconds)
+            series.bytes += nbytes
+            series.errors += int(error)
+
+    def snapshot(self) -> Dict[Tuple[str, str], _Series]:
+        with self._lock:
+            return {key: series.copy() for key, series in self._series.items()}
+
+    def summary(
+        self,
+        since: Dict[Tuple[str, str], _Series] | None = None,
+        current: Dict[Tuple[str, str], _Series] | None = None,
+    ) -> Dict[str, Dict[str, dict]]:
+        """Activity per stage and keyword between the ``since`` snapshot (or process start) and ``current`` (or now).
+
+        Percentiles are the upper bound of the bucket they fall in.
+        """
+        since = since or {}
+        current = self.snapshot() if current is None else current
+        summary: Dict[str, Dict[str, dict]] = {}
+        for (stage, keyword), series in sorted(current.items()):
+            before = since.get((stage, keyword), _Series())
+            count = series.count - before.count
+            if count <= 0:
+                continue
+            buckets = [now - then for now, then in zip(series.buckets, before.buckets)]
+            summary.setdefault(stage, {})[keyword or "-"] = {
+                "count": count,
+                "errors": series.errors - before.errors,
+                "bytes": series.bytes - before.bytes,
+                "mean_s": round((series.seconds - before.seconds) / count, 4),
+                "p50_s": _percentile(buckets, count, 0.50, series.max_seconds),
+                "p99_s": _percentile(buckets, count, 0.99, series.max_seconds),
+            }
+        return summary
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP emailer_stage_seconds Time spent in each alert stage.",
+            "# TYPE emailer_stage_seconds histogram",
+        ]
+        snapshot = sorted(self.snapshot().items())
+        for (stage, keyword), series in snapshot:
+            labels = f'stage="{_escape(stage)}",keyword="{_escape(keyword)}"'
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, "+Inf"), series.buckets):
+                cumulative += count
+                lines.append(f'emailer_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"emailer_stage_seconds_sum{{{labels}}} {series.seconds:.6f}")
+            lines.append(f"emailer_stage_seconds_count{{{labels}}} {series.count}")
+        for name, attribute, help_text in (
+            ("emailer_stage_bytes_total", "bytes", "Bytes read or produced by each alert stage."),
+            ("emailer_stage_errors_total", "errors", "Failed runs of each alert stage."),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (stage, keyword), series in snapshot:
+                labels = f'stage="{_escape(stage)}",keyword="{_escape(keyword)}"'
+                lines.append(f"{name}{{{labels}}} {getattr(series, attribute)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Serves ``metrics`` as Prometheus text on ``host:port`` and logs a JSON summary every ``log_interval_seconds``.
+
+    Either side is off when its setting is 0.
+    """
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 0, log_interval_seconds: float = 0):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.log_interval_seconds = log_interval_seconds
+        self._server: ThreadingHTTPServer | None = None
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._last = metrics.snapshot()
+
+    def start(self) -> None:
+        if self.port:
+            self._server = ThreadingHTTPServer((self.host, self.port), _handler(self.metrics))
+            self.port = self._server.server_address[1]
+            self._threads.append(
+                threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+            )
+            logger.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+        if self.log_interval_seconds > 0:
+            self._threads.append(threading.Thread(target=self._log_loop, name="metrics-log", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        if self.log_interval_seconds > 0:
+            self.log_summary()
+
+    def log_summary(self) -> None:
+        snapshot = self.metrics.snapshot()
+        summary = self.metrics.summary(self._last, snapshot)
+        self._last = snapshot
+        if summary:
+            logger.info("Stage metrics: %s", json.dumps(summary, sort_keys=True))
+
+    def _log_loop(self) -> None:
+        while not self._stop.wait(self.log_interval_seconds):
+            self.log_summary()
+
+
+def _handler(metrics: Metrics) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            # Scrapes would otherwise print an access log line to stderr every few seconds.
+            pass
+
+    return Handler
+
+
+def _percentile(buckets: List[int], count: int, quantile: float, max_seconds: float) -> float:
+    rank = quantile * count
+    seen = 0
+    for bound, n in zip(BUCKETS, buckets):
+        seen += n
+        if seen >= rank:
+            return bound
+    return round(max_seconds, 4)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,46 +1,198 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import smtplib
+import threading
+import time
+from dataclasses import dataclass, field
 from email.message import EmailMessage
-from pathlib import Path
-from typing import Iterable
+from typing import Dict, Iterable, List
 
 from .auth import generate_oauth2_string
 from .config import Recipient, SMTPConfig
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SendReport:
+    delivered: List[str] = field(default_factory=list)
+    # address -> server reply (or error) for recipients that were not accepted
+    refused: Dict[str, str] = field(default_factory=dict)
+
+
+class DeliveryError(Exception):
+    """No recipient accepted the alert."""
+
+    def __init__(self, report: SendReport):
+        super().__init__(f"Alert refused for all {len(report.refused)} recipient(s)")
+        self.report = report
+
 
 class Notifier:
+    """Sends alerts over one long-lived, authenticated SMTP session.
+
+    The session is health-checked with NOOP after ``keepalive_seconds`` of
+    inactivity and re-opened once if the server dropped it. Recipient lists are
+    split into envelopes of at most ``max_recipients_per_message``, paced by
+    ``max_messages_per_minute``; recipients the server refuses are reported in
+    the returned SendReport while the rest still receive the alert. A rejected
+    login or a session that cannot be re-opened fails the send while no
+    envelope has been accepted; after that, the remaining recipients are
+    reported as refused.
+    """
+
     def __init__(self, config: SMTPConfig):
         self.config = config
         self.access_token = config.password if getattr(config, "auth_method", "password") == "oauth" else None
+        self._client: smtplib.SMTP | None = None
+        self._last_activity = 0.0
+        self._last_message = 0.0
+        self._reauthenticate = False
+        self._lock = threading.RLock()
 
     def update_token(self, token: str) -> None:
+        # Like EmailMonitor, only flag the session: AUTH cannot be repeated on it,
+        # so the next send reconnects with the new token.
+        if token != self.access_token:
+            self._reauthenticate = True
         self.access_token = token
 
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+            if client is None:
+                return
+            try:
+                client.quit()
+            except (smtplib.SMTPException, OSError):
+                client.close()
+
     def send(
         self,
         recipients: Iterable[Recipient],
         subject: str,
         body: str,
-        graph_path: Path | None = None,
-    ) -> None:
+        graph_png: bytes | None = None,
+        graph_filename: str = "trend.png",
+    ) -> SendReport:
+        addresses = list(dict.fromkeys(r.email for r in recipients))
+        size = max(1, self.config.max_recipients_per_message)
+        report = SendReport()
+        with self._lock:
+            if self._reauthenticate:
+                # Reconnect with the new token once per alert, never between its envelopes.
+                self._reauthenticate = False
+                self.close()
+            for start in range(0, len(addresses), size):
+                chunk = addresses[start : start + size]
+                msg = self._build_message(chunk, subject, body, graph_png, graph_filename)
+                self._pace()
+                lost: OSError | None = None
+                try:
+                    refused = self._with_session(lambda client: client.send_message(msg, to_addrs=chunk))
+                except smtplib.SMTPRecipientsRefused as e:
+                    refused = e.recipients
+                except (smtplib.SMTPAuthenticationError, smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected) as e:
+                    lost = e
+                except smtplib.SMTPResponseException as e:
+                    # Sender or message rejected: this envelope fails, later ones may still go through.
+                    refused = {address: (e.smtp_code, e.smtp_error) for address in chunk}
+                except smtplib.SMTPException as e:
+                    refused = {address: f"{type(e).__name__}: {e}" for address in chunk}
+                except OSError as e:
+                    lost = e
+                if lost is not None:
+                    if not report.delivered:
+                        # Nothing went out yet, so the caller can refresh the token and retry the whole alert.
+                        raise lost
+                    # A retry would resend the accepted envelopes; report the rest as refused instead.
+                    for address in addresses[start:]:
+                        report.refused[address] = f"not sent, {type(lost).__name__}: {lost}"
+                    break
+                for address in chunk:
+                    if address in refused:
+                        report.refused[address] = _reply_text(refused[address])
+                    else:
+                        report.delivered.append(address)
+
+        if report.refused:
+            logger.warning(
+                "Alert '%s' not accepted for %d of %d recipient(s): %s",
+                subject,
+                len(report.refused),
+                len(addresses),
+                "; ".join(f"{address} ({reply})" for address, reply in report.refused.items()),
+            )
+            if not report.delivered:
+                raise DeliveryError(report)
+        return report
+
+    def _build_message(
+        self, chunk: List[str], subject: str, body: str, graph_png: bytes | None, graph_filename: str
+    ) -> EmailMessage:
         msg = EmailMessage()
         msg["From"] = self.config.from_email
-        msg["To"] = ", ".join([r.email for r in recipients])
+        # Envelope recipients come from the chunk; hidden recipients only see the sender in To.
+        msg["To"] = self.config.from_email if self.config.hide_recipients else ", ".join(chunk)
         msg["Subject"] = f"{self.config.subject_prefix} {subject}".strip()
         msg.set_content(body)
 
-        if graph_path and graph_path.exists():
-            with open(graph_path, "rb") as f:
-                data = f.read()
+        if graph_png:
             msg.add_attachment(
-                data,
+                graph_png,
                 maintype="image",
                 subtype="png",
-                filename=graph_path.name,
+                filename=graph_filename,
             )
+        return msg
+
+    def _pace(self) -> None:
+        if self.config.max_messages_per_minute <= 0:
+            return
+        interval = 60.0 / self.config.max_messages_per_minute
+        wait = self._last_message + interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_message = time.monotonic()
 
-        with smtplib.SMTP(self.config.host, self.config.port) as server:
+    def _with_session(self, operation):
+        """Run ``operation`` on the shared session, reconnecting once if it was lost."""
+        client = self._session()
+        try:
+            result = operation(client)
+        except OSError as e:
+            # SMTPException subclasses OSError; only a dropped connection is worth a reconnect.
+            if isinstance(e, smtplib.SMTPException) and not isinstance(e, smtplib.SMTPServerDisconnected):
+                raise
+            logger.info("SMTP session lost, reconnecting")
+            self.close()
+            result = operation(self._session())
+        self._last_activity = time.monotonic()
+        return result
+
+    def _session(self) -> smtplib.SMTP:
+        if self._client is not None:
+            if time.monotonic() - self._last_activity < self.config.keepalive_seconds:
+                return self._client
+            try:
+                code, _ = self._client.noop()
+                if code == 250:
+                    self._last_activity = time.monotonic()
+                    return self._client
+            except (smtplib.SMTPException, OSError):
+                pass
+            logger.info("SMTP keepalive failed, reconnecting")
+            self.close()
+
+        self._client = self._connect()
+        self._last_activity = time.monotonic()
+        return self._client
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.config.host, self.config.port, timeout=self.config.timeout_seconds)
+        try:
             server.starttls()
             if getattr(self.config, "auth_method", "password") == "oauth":
                 token = self.access_token or self.config.password
@@ -48,4 +200,35 @@ class Notifier:
                 server.auth("XOAUTH2", lambda x: auth_str)
             else:
                 server.login(self.config.username, self.config.password)
-            server.send_message(msg)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+
+def _reply_text(reply: object) -> str:
+    if isinstance(reply, tuple) and len(reply) == 2:
+        code, message = reply
+        if isinstance(message, bytes):
+            message = message.decode("utf-8", "replace")
+        return f"{code} {message}"
+    return str(reply)
+
+
+class AsyncNotifier:
+    """asyncio facade over Notifier; smtplib is blocking, so sends run in a worker thread."""
+
+    def __init__(self, notifier: Notifier):
+        self.notifier = notifier
+        self._lock = asyncio.Lock()
+
+    def update_token(self, token: str) -> None:
+        self.notifier.update_token(token)
+
+    async def send(self, **kwargs) -> SendReport:
+        async with self._lock:
+            return await asyncio.to_thread(self.notifier.send, **kwargs)
+
+    async def close(self) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self.notifier.close)
@@ -1,51 +1,281 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 from dataclasses import dataclass
-from typing import List
-
+from typing import Callable, Dict, List, Tuple
 
 from .config import OneDriveConfig
+from .research_cache import ResearchCache
+from .sync_runner import run_sync
 
 GRAPH_ROOT = "https://graph.microsoft.com/v1.0"
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".json", ".csv")
+ITEM_SELECT = "id,name,file,size,lastModifiedDateTime,cTag,eTag,@microsoft.graph.downloadUrl"
+DELTA_SELECT = "id,name,file,folder,deleted,parentReference,lastModifiedDateTime,cTag,eTag"
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
 class ResearchFile:
     name: str
     content: str
+    item_id: str | None = None
 
 
-class OneDriveClient:
-    def __init__(self, config: OneDriveConfig):
+class AsyncOneDriveClient:
+    """Reads the research folder over one pooled httpx.AsyncClient.
+
+    With a ResearchCache the folder listing is kept current through the drive
+    delta endpoint and only new or changed files are downloaded; cache reads
+    and writes run in a worker thread to keep disk I/O off the event loop.
+    Concurrent fetches share one in-flight sync and download of the folder.
+    """
+
+    def __init__(self, config: OneDriveConfig, cache: ResearchCache | None = None):
+        import httpx
+
         self.config = config
         self.access_token = config.access_token
+        self.cache = cache
+        concurrency = max(1, config.download_concurrency)
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=config.download_timeout_seconds,
+            follow_redirects=True,
+        )
+        self._downloads = asyncio.Semaphore(concurrency)
+        self._inflight: asyncio.Task | None = None
+        self.on_unauthorized: Callable[[], bool] | None = None
 
     def update_token(self, token: str) -> None:
         self.access_token = token
 
-    def fetch_research_files(self) -> List[ResearchFile]:
-        import requests
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def fetch_research_files(self) -> List[ResearchFile]:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch_with_refresh())
+            self._inflight.add_done_callback(self._clear_inflight)
+        # Shielded so one cancelled caller doesn't cancel the fetch the others are waiting on.
+        return list(await asyncio.shield(self._inflight))
+
+    def _clear_inflight(self, task: asyncio.Task) -> None:
+        if self._inflight is task:
+            self._inflight = None
+
+    async def _fetch_with_refresh(self) -> List[ResearchFile]:
+        try:
+            return await self._fetch_research_files()
+        except Exception as e:
+            if not _unauthorized(e) or self.on_unauthorized is None:
+                raise
+            # Waiting for the token refresh blocks, so keep it off the event loop.
+            if not await asyncio.to_thread(self.on_unauthorized):
+                raise
+            return await self._fetch_research_files()
 
+    async def _fetch_research_files(self) -> List[ResearchFile]:
         headers = {"Authorization": f"Bearer {self.access_token}"}
-        folder_url = (
-            f"{GRAPH_ROOT}/drives/{self.config.drive_id}/root:/{self.config.folder_path}:/children"
+        if self.cache is None:
+            selected = [
+                item for item in await self._list_children(headers)
+                if item.get("@microsoft.graph.downloadUrl")
+            ][: self.config.max_files]
+            contents = await self._download_all([(item["@microsoft.graph.downloadUrl"], None) for item in selected])
+            return [
+                ResearchFile(name=item["name"], content=content, item_id=item.get("id"))
+                for item, content in zip(selected, contents)
+                if content is not None
+            ]
+
+        selected = _select_cached(await self._sync_folder(headers), self.config.max_files)
+        contents = await asyncio.to_thread(
+            lambda: [self.cache.get(item_id, item["tag"]) for item_id, item in selected]
         )
-        response = requests.get(folder_url, headers=headers, timeout=30)
-        response.raise_for_status()
+        missing = [i for i, content in enumerate(contents) if content is None]
+        downloaded = await self._download_all([
+            (f"{GRAPH_ROOT}/drives/{self.config.drive_id}/items/{selected[i][0]}/content", headers)
+            for i in missing
+        ])
+        fresh = [(i, content) for i, content in zip(missing, downloaded) if content is not None]
+        for i, content in fresh:
+            contents[i] = content
+        await asyncio.to_thread(self._store, [(*selected[i], content) for i, content in fresh])
+        logger.info("Research files: %d from cache, %d downloaded", len(selected) - len(missing), len(missing))
+        return [
+            ResearchFile(name=item["name"], content=content, item_id=item_id)
+            for (item_id, item), content in zip(selected, contents)
+            if content is not None
+        ]
 
-        items = response.json().get("value", [])
-        files: list[ResearchFile] = []
-        for item in items[: self.config.max_files]:
-            if "file" not in item:
-                continue
-            name = item.get("name", "unknown")
-            if not any(name.lower().endswith(ext) for ext in [".txt", ".md", ".json", ".csv"]):
-                continue
+    def _store(self, downloads: List[Tuple[str, dict, str]]) -> None:
+        for item_id, item, content in downloads:
+            self.cache.put(item_id, item["tag"], content)
+        self.cache.save()
+
+    async def _download_all(self, jobs: List[Tuple[str, dict | None]]) -> List[str | None]:
+        async def download(url: str, headers: dict | None) -> str | None:
+            try:
+                async with self._downloads:
+                    async with self._client.stream("GET", url, headers=headers) as response:
+                        response.raise_for_status()
+                        chunks: list[bytes] = []
+                        total = 0
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                            chunks.append(chunk)
+                            total += len(chunk)
+                            if total > self.config.max_file_bytes:
+                                logger.warning(
+                                    "Research file %s exceeds %d bytes, truncating",
+                                    url.split("?")[0],
+                                    self.config.max_file_bytes,
+                                )
+                                break
+                        data = b"".join(chunks)[: self.config.max_file_bytes]
+                        return data.decode(response.encoding or "utf-8", errors="replace")
+            except Exception as e:
+                logger.warning("Failed to download research file %s: %s", url.split("?")[0], e)
+                return None
+
+        return list(await asyncio.gather(*(download(url, headers) for url, headers in jobs)))
+
+    async def _sync_folder(self, headers: dict) -> dict:
+        """Bring the cached folder listing up to date via the drive delta endpoint."""
+        cache = self.cache
+        if cache.folder_id is None:
+            folder_url = f"{GRAPH_ROOT}/drives/{self.config.drive_id}/root:/{self.config.folder_path}"
+            response = await self._client.get(folder_url, headers=headers)
+            response.raise_for_status()
+            await asyncio.to_thread(cache.start_listing, response.json()["id"])
 
-            download_url = item.get("@microsoft.graph.downloadUrl")
-            if not download_url:
+        folder_id = cache.folder_id
+        initial_url = f"{GRAPH_ROOT}/drives/{self.config.drive_id}/items/{folder_id}/delta"
+        url = cache.delta_link or initial_url
+        params = None if cache.delta_link else {"$select": DELTA_SELECT}
+        # A full enumeration replaces the listing; a delta page patches it.
+        reset = cache.delta_link is None
+        delta_link = None
+        changes: list[dict] = []
+        while url:
+            response = await self._client.get(url, params=params, headers=headers)
+            params = None
+            if response.status_code == 410:
+                # Delta cursor expired: start over from a full enumeration.
+                reset = True
+                changes = []
+                url, params = initial_url, {"$select": DELTA_SELECT}
                 continue
-            content = requests.get(download_url, timeout=30).text
-            files.append(ResearchFile(name=name, content=content))
+            if response.status_code in (400, 501):
+                # Delta on a non-root folder isn't available on every drive type.
+                logger.info("Drive delta unavailable (HTTP %s), listing folder instead", response.status_code)
+                items = {item["id"]: _item_metadata(item) for item in await self._list_children(headers)}
+                return await asyncio.to_thread(cache.apply_changes, items, (), None, True)
+            response.raise_for_status()
+            data = response.json()
+            changes.extend(data.get("value", []))
+            url = data.get("@odata.nextLink")
+            delta_link = data.get("@odata.deltaLink", delta_link)
+
+        upserts, removed = _split_delta(changes, folder_id)
+        # The cursor is only advanced together with the changes it covers.
+        return await asyncio.to_thread(cache.apply_changes, upserts, removed, delta_link, reset)
+
+    async def _list_children(self, headers: dict) -> List[dict]:
+        """All supported files in the folder, newest first, following every result page."""
+        url = f"{GRAPH_ROOT}/drives/{self.config.drive_id}/root:/{self.config.folder_path}:/children"
+        params = {"$select": ITEM_SELECT, "$orderby": "lastModifiedDateTime desc"}
+        items: list[dict] = []
+        while url:
+            response = await self._client.get(url, params=params, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+            items.extend(item for item in data.get("value", []) if _is_supported_file(item))
+            url = data.get("@odata.nextLink")
+            params = None
+        return _newest_first(items)
+
+
+class OneDriveClient:
+    """Blocking wrapper over AsyncOneDriveClient for synchronous callers."""
+
+    def __init__(self, config: OneDriveConfig, cache: ResearchCache | None = None):
+        self.client = AsyncOneDriveClient(config, cache=cache)
+
+    @property
+    def config(self) -> OneDriveConfig:
+        return self.client.config
+
+    @property
+    def cache(self) -> ResearchCache | None:
+        return self.client.cache
+
+    @property
+    def on_unauthorized(self) -> Callable[[], bool] | None:
+        return self.client.on_unauthorized
+
+    @on_unauthorized.setter
+    def on_unauthorized(self, callback: Callable[[], bool] | None) -> None:
+        self.client.on_unauthorized = callback
+
+    def update_token(self, token: str) -> None:
+        self.client.update_token(token)
+
+    def invalidate_cache(self) -> None:
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def fetch_research_files(self) -> List[ResearchFile]:
+        return run_sync(self.client.fetch_research_files())
+
+    def close(self) -> None:
+        run_sync(self.client.aclose())
+
+
+def _unauthorized(exc: Exception) -> bool:
+    return getattr(getattr(exc, "response", None), "status_code", None) == 401
+
+
+def _is_supported_file(item: dict) -> bool:
+    return "file" in item and item.get("name", "").lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def _newest_first(items: List[dict]) -> List[dict]:
+    # Not every drive honours $orderby, so sort here as well.
+    return sorted(items, key=lambda item: item.get("lastModifiedDateTime") or "", reverse=True)
+
+
+def _select_cached(items: dict, max_files: int) -> List[Tuple[str, dict]]:
+    """Newest supported files from the cached folder listing, capped at ``max_files``."""
+    candidates = [
+        (item_id, item) for item_id, item in items.items()
+        if item["name"].lower().endswith(SUPPORTED_EXTENSIONS)
+    ]
+    candidates.sort(key=lambda kv: kv[1].get("last_modified") or "", reverse=True)
+    return candidates[:max_files]
+
+
+def _split_delta(changes: List[dict], folder_id: str) -> Tuple[Dict[str, dict], List[str]]:
+    """Delta items as (listing upserts, removed item ids) for files directly in ``folder_id``."""
+    upserts: Dict[str, dict] = {}
+    removed: List[str] = []
+    for item in changes:
+        item_id = item["id"]
+        parent_id = item.get("parentReference", {}).get("id")
+        if "deleted" in item or "file" not in item or parent_id != folder_id:
+            upserts.pop(item_id, None)
+            removed.append(item_id)
+            continue
+        upserts[item_id] = _item_metadata(item)
+    return upserts, removed
+
 
-        return files
+def _item_metadata(item: dict) -> dict:
+    return {
+        "name": item.get("name", "unknown"),
+        "tag": item.get("cTag") or item.get("eTag") or "",
+        "last_modified": item.get("lastModifiedDateTime"),
+    }
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Sequence, Set, Tuple
+
+from .email_monitor import IncomingEmail
+from .llm_client import LLMResult
+from .onedrive_client import ResearchFile
+from .work_queue import QueuedAlert, WorkQueue
+from .workflow import InvestmentWorkflow, WorkflowOutput, render_executor
+
+logger = logging.getLogger(__name__)
+
+class Cancelled(Exception):
+    """The pipeline was stopped before the job reached this stage."""
+
+
+@dataclass
+class AlertJob:
+    """One alert for ``keyword``, covering a single email or a batch of them."""
+
+    keyword: str
+    emails: List[IncomingEmail]
+    seq: int
+    results: List[LLMResult] | None = None
+    graph_png: bytes | None = None
+    rendered: bool = False
+    # Outputs already sent, when resuming a queued alert.
+    delivered: int = 0
+    alert_id: int | None = None
+    error: BaseException | None = None
+    task: asyncio.Task | None = None
+
+    @property
+    def email(self) -> IncomingEmail:
+        return self.emails[0]
+
+    @property
+    def uids(self) -> str:
+        return ",".join(email.uid for email in self.emails)
+
+    @property
+    def ok(self) -> bool:
+        return self.task is not None and self.task.done() and self.error is None
+
+
+def group_matches(
+    matches: Iterable[Tuple[str, IncomingEmail]], max_emails: int
+) -> List[Tuple[str, List[IncomingEmail]]]:
+    """Group (keyword, email) matches per keyword into batches of at most ``max_emails``, keeping order."""
+    by_keyword: Dict[str, List[IncomingEmail]] = {}
+    for keyword, email in matches:
+        by_keyword.setdefault(keyword, []).append(email)
+    size = max(1, max_emails)
+    return [
+        (keyword, emails[start : start + size])
+        for keyword, emails in by_keyword.items()
+        for start in range(0, len(emails), size)
+    ]
+
+
+class AlertPipeline:
+    """Concurrent alert processing on the event loop: fetch -> synthesize + render -> send.
+
+    Up to ``workers`` alerts fetch and synthesize at once, and each alert's graph
+    renders on the shared render thread while its LLM call is in flight.
+    submit() waits while ``queue_size`` alerts are in flight. Alerts for a
+    keyword are sent strictly in submission order. Once ``stop_event`` is set,
+    jobs that have not started are cancelled instead of run.
+
+    With a ``work_queue``, jobs submitted through resume() skip the stages
+    their queued alert already completed and record each stage, delivery and
+    failure back to the queue.
+    """
+
+    def __init__(
+        self,
+        workflows: Dict[str, InvestmentWorkflow],
+        send: Callable[[str, WorkflowOutput], Awaitable[None]],
+        workers: int = 4,
+        queue_size: int = 16,
+        stop_event: threading.Event | None = None,
+        work_queue: WorkQueue | None = None,
+    ):
+        self.workflows = workflows
+        self.send = send
+        self.work_queue = work_queue
+        self.stop_event = stop_event or threading.Event()
+        self._workers = asyncio.Semaphore(max(1, workers))
+        self._slots = asyncio.Semaphore(max(1, queue_size))
+        self._seq: Dict[str, int] = {}
+        # Completion of the last job per keyword; each job sends only after its predecessor finished.
+        self._previous: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, keyword: str, emails: IncomingEmail | Sequence[IncomingEmail]) -> AlertJob:
+        """Start an alert for one email or a batch; waits while the pipeline is full."""
+        batch = [emails] if isinstance(emails, IncomingEmail) else list(emails)
+        return await self._start(AlertJob(keyword=keyword, emails=batch, seq=self._next_seq(keyword)))
+
+    async def resume(self, alert: QueuedAlert) -> AlertJob:
+        """Start a stored alert, continuing after its last completed stage."""
+        job = AlertJob(
+            keyword=alert.keyword,
+            emails=alert.emails,
+            seq=self._next_seq(alert.keyword),
+            results=alert.results,
+            graph_png=alert.graph_png,
+            rendered=alert.rendered,
+            delivered=alert.delivered,
+            alert_id=alert.id,
+        )
+        return await self._start(job)
+
+    async def wait(self, jobs: List[AlertJob]) -> None:
+        await asyncio.gather(*(job.task for job in jobs))
+
+    async def shutdown(self) -> None:
+        await asyncio.gather(*self._tasks)
+
+    def _next_seq(self, keyword: str) -> int:
+        seq = self._seq.get(keyword, 0)
+        self._seq[keyword] = seq + 1
+        return seq
+
+    async def _start(self, job: AlertJob) -> AlertJob:
+        await self._slots.acquire()
+        done = asyncio.get_running_loop().create_future()
+        after, self._previous[job.keyword] = self._previous.get(job.keyword), done
+        job.task = asyncio.create_task(self._run(job, after, done), name=f"alert-{job.keyword}-{job.seq}")
+        self._tasks.add(job.task)
+        job.task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: AlertJob, after: asyncio.Future | None, done: asyncio.Future) -> None:
+        try:
+            try:
+                async with self._workers:
+                    if self.stop_event.is_set():
+                        raise Cancelled()
+                    await self._prepare(job)
+            finally:
+                # Even a failed job finishes after its predecessor, so later alerts keep their order.
+                if after is not None:
+                    await asyncio.shield(after)
+            await self._deliver(job)
+            logger.info("Notification sent for '%s' UID %s", job.keyword, job.uids)
+        except Cancelled as e:
+            job.error = e
+        except Exception as e:
+            logger.exception("Error processing '%s' for email UID %s", job.keyword, job.uids)
+            job.error = e
+            if self._queued(job):
+                await self._retry_later(job)
+        finally:
+            # Drop intermediate results; only the outcome is needed from here on.
+            job.results = None
+            done.set_result(None)
+            self._slots.release()
+
+    async def _prepare(self, job: AlertJob) -> None:
+        if job.results is not None and job.rendered:
+            return
+        workflow = self.workflows[job.keyword]
+        files = await workflow.fetch(job.keyword)
+        loop = asyncio.get_running_loop()
+        synthesized, graph = await asyncio.gather(
+            _done(job.results) if job.results is not None else self._synthesize(workflow, job, files),
+            _done(job.graph_png)
+            if job.rendered
+            else loop.run_in_executor(render_executor, workflow.render, job.keyword, files),
+            return_exceptions=True,
+        )
+        # Stages are recorded in order, so a rendered graph is only kept once the results are.
+        if job.results is None and not isinstance(synthesized, BaseException):
+            job.results = synthesized
+            if self._queued(job):
+                await asyncio.to_thread(self.work_queue.record_synthesized, job.alert_id, job.results)
+        if job.results is not None and not job.rendered and not isinstance(graph, BaseException):
+            job.graph_png, job.rendered = graph, True
+            if self._queued(job):
+                await asyncio.to_thread(self.work_queue.record_rendered, job.alert_id, job.graph_png)
+        for outcome in (synthesized, graph):
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+    @staticmethod
+    async def _synthesize(workflow: InvestmentWorkflow, job: AlertJob, files: List[ResearchFile]) -> List[LLMResult]:
+        if len(job.emails) == 1:
+            return [await workflow.synthesize(job.keyword, job.email, files)]
+        return await workflow.synthesize_batch(job.keyword, job.emails, files)
+
+    async def _deliver(self, job: AlertJob) -> None:
+        workflow = self.workflows[job.keyword]
+        if len(job.emails) == 1:
+            outputs = [workflow.compose(job.keyword, job.email, job.results[0], job.graph_png)]
+        else:
+            outputs = workflow.compose_batch(job.keyword, job.emails, job.results, job.graph_png)
+        for output in outputs[job.delivered :]:
+            await self.send(job.keyword, output)
+            job.delivered += 1
+            if self._queued(job):
+                await asyncio.to_thread(self.work_queue.record_delivered, job.alert_id, job.delivered)
+        if self._queued(job):
+            await asyncio.to_thread(self.work_queue.mark_sent, job.alert_id)
+
+    def _queued(self, job: AlertJob) -> bool:
+        return self.work_queue is not None and job.alert_id is not None
+
+    async def _retry_later(self, job: AlertJob) -> None:
+        try:
+            delay = await asyncio.to_thread(self.work_queue.fail, job.alert_id, job.error)
+        except Exception:
+            logger.exception("Could not record the failure of '%s' UID %s", job.keyword, job.uids)
+            return
+        if delay is None:
+            logger.error("Giving up on '%s' for UID %s after repeated failures", job.keyword, job.uids)
+        else:
+            logger.info("Retrying '%s' for UID %s in %.0fs", job.keyword, job.uids, delay)
+
+
+async def _done(value):
+    return value
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+class RenderCache:
+    """PNG renders stored under ``root`` by content hash, evicted least recently used."""
+
+    def __init__(self, root: str | Path, max_files: int):
+        self.root = Path(root)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(dates: np.ndarray, scores: np.ndarray, *style: object) -> str:
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(dates).tobytes())
+        digest.update(np.ascontiguousarray(scores).tobytes())
+        digest.update(repr(style).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, key: str, png: bytes) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(png)
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            renders = sorted(self.root.glob("*.png"), key=lambda p: p.stat().st_mtime)
+            for path in renders[: max(0, len(renders) - self.max_files)]:
+                path.unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.png"
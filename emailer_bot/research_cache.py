@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable
+
+
+class ResearchCache:
+    """Content-addressed on-disk cache of OneDrive research files.
+
+    Entries are keyed by drive item id and validated against the item's cTag
+    (falling back to eTag); file bodies live under ``blobs/<sha256>`` so
+    identical files are stored once. Least recently used entries are evicted
+    once the blobs exceed ``max_bytes``.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index_path = self.root / "index.json"
+        self._entries: Dict[str, dict] = {}
+        # Folder listing maintained from delta responses: item id -> name/tag/lastModifiedDateTime.
+        self.items: Dict[str, dict] = {}
+        self.delta_link: str | None = None
+        self.folder_id: str | None = None
+        if self._index_path.exists():
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self._entries = raw.get("entries", {})
+            self.items = raw.get("items", {})
+            self.delta_link = raw.get("delta_link")
+            self.folder_id = raw.get("folder_id")
+
+    def get(self, item_id: str, tag: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if not entry or entry["tag"] != tag:
+                return None
+            blob = self._blob_path(entry["sha256"])
+            if not blob.exists():
+                del self._entries[item_id]
+                return None
+            entry["last_used"] = time.time()
+            return blob.read_bytes().decode("utf-8")
+
+    def put(self, item_id: str, tag: str, content: str) -> None:
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            blob = self._blob_path(digest)
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp = blob.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, blob)
+            self._entries[item_id] = {
+                "tag": tag,
+                "sha256": digest,
+                "size": len(data),
+                "last_used": time.time(),
+            }
+            self._evict()
+
+    def forget(self, item_id: str) -> None:
+        with self._lock:
+            self._entries.pop(item_id, None)
+            self._remove_orphans()
+
+    def listing(self) -> Dict[str, dict]:
+        """A copy of the cached folder listing."""
+        with self._lock:
+            return dict(self.items)
+
+    def start_listing(self, folder_id: str) -> None:
+        """Track ``folder_id`` from an empty listing with no delta cursor."""
+        with self._lock:
+            self.folder_id = folder_id
+            self.items = {}
+            self.delta_link = None
+
+    def apply_changes(
+        self,
+        upserts: Dict[str, dict],
+        removed: Iterable[str],
+        delta_link: str | None,
+        reset: bool = False,
+    ) -> Dict[str, dict]:
+        """Apply one listing sync atomically and return a copy of the new listing.
+
+        ``reset`` replaces the listing instead of patching it. Files of removed
+        items are dropped from the cache.
+        """
+        with self._lock:
+            if reset:
+                self.items = {}
+            dropped = [item_id for item_id in removed if self.items.pop(item_id, None) is not None]
+            self.items.update(upserts)
+            self.delta_link = delta_link
+            for item_id in dropped:
+                self._entries.pop(item_id, None)
+            if dropped:
+                self._remove_orphans()
+            return dict(self.items)
+
+    def invalidate(self) -> None:
+        """Drop every cached file and the delta cursor."""
+        with self._lock:
+            self._entries = {}
+            self.items = {}
+            self.delta_link = None
+            self.folder_id = None
+            shutil.rmtree(self.root / "blobs", ignore_errors=True)
+            self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _evict(self) -> None:
+        sizes = {e["sha256"]: e["size"] for e in self._entries.values()}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        for item_id, entry in sorted(self._entries.items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            del self._entries[item_id]
+            if not any(e["sha256"] == entry["sha256"] for e in self._entries.values()):
+                total -= entry["size"]
+        self._remove_orphans()
+
+    def _remove_orphans(self) -> None:
+        live = {e["sha256"] for e in self._entries.values()}
+        blobs = self.root / "blobs"
+        if not blobs.exists():
+            return
+        for blob in blobs.iterdir():
+            if blob.name not in live:
+                blob.unlink(missing_ok=True)
+
+    def _save(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self._index_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "entries": self._entries,
+                    "items": self.items,
+                    "delta_link": self.delta_link,
+                    "folder_id": self.folder_id,
+                },
+                f,
+            )
+        os.replace(tmp, self._index_path)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from itertools import repeat
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from .onedrive_client import ResearchFile
+from .scores import DATE_DTYPE, ScoreArrays, extract_score_arrays
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    keyword TEXT NOT NULL,
+    file_key TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (keyword, file_key)
+);
+CREATE TABLE IF NOT EXISTS points (
+    keyword TEXT NOT NULL,
+    file_key TEXT NOT NULL,
+    date TEXT NOT NULL,
+    score REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS points_by_date ON points (keyword, date);
+CREATE INDEX IF NOT EXISTS points_by_file ON points (keyword, file_key);
+"""
+
+
+class ScoreIndex:
+    """Per-keyword score time series extracted from research files, persisted in SQLite.
+
+    Files are keyed by OneDrive item id (or name) and content hash, so only new
+    or changed files are re-extracted on each alert.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def update(self, keyword: str, files: List[ResearchFile]) -> int:
+        """Sync the index with ``files``; returns how many files were re-extracted."""
+        current = {_file_key(f): f for f in files}
+        with self._lock, self._conn:
+            stored = dict(
+                self._conn.execute("SELECT file_key, sha256 FROM files WHERE keyword = ?", (keyword,))
+            )
+            for file_key in stored.keys() - current.keys():
+                self._drop(keyword, file_key)
+
+            changed = 0
+            for file_key, file in current.items():
+                digest = hashlib.sha256(file.content.encode("utf-8")).hexdigest()
+                if stored.get(file_key) == digest:
+                    continue
+                self._drop(keyword, file_key)
+                dates, scores = extract_score_arrays([file])
+                self._conn.executemany(
+                    "INSERT INTO points (keyword, file_key, date, score) VALUES (?, ?, ?, ?)",
+                    zip(repeat(keyword), repeat(file_key), np.datetime_as_string(dates).tolist(), scores.tolist()),
+                )
+                self._conn.execute(
+                    "INSERT INTO files (keyword, file_key, sha256) VALUES (?, ?, ?)",
+                    (keyword, file_key, digest),
+                )
+                changed += 1
+        return changed
+
+    def series(
+        self, keyword: str, start: datetime | None = None, end: datetime | None = None
+    ) -> List[Tuple[datetime, float]]:
+        dates, scores = self.series_arrays(keyword, start=start, end=end)
+        return list(zip(dates.tolist(), scores.tolist()))
+
+    def series_arrays(
+        self, keyword: str, start: datetime | None = None, end: datetime | None = None
+    ) -> ScoreArrays:
+        query = "SELECT date, score FROM points WHERE keyword = ?"
+        params: list = [keyword]
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(_date_key(start))
+        if end is not None:
+            query += " AND date <= ?"
+            params.append(_date_key(end))
+        query += " ORDER BY date, rowid"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        if not rows:
+            return np.array([], dtype=DATE_DTYPE), np.array([], dtype=np.float64)
+        dates, scores = zip(*rows)
+        return np.array(dates, dtype=DATE_DTYPE), np.array(scores, dtype=np.float64)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _drop(self, keyword: str, file_key: str) -> None:
+        self._conn.execute("DELETE FROM points WHERE keyword = ? AND file_key = ?", (keyword, file_key))
+        self._conn.execute("DELETE FROM files WHERE keyword = ? AND file_key = ?", (keyword, file_key))
+
+
+def _date_key(value: datetime) -> str:
+    # Same fixed-width format the points are stored in, so string comparison orders correctly.
+    return str(np.datetime_as_string(np.datetime64(value, "us")))
+
+
+def _file_key(file: ResearchFile) -> str:
+    return file.item_id or file.name
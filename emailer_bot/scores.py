@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import re
+import warnings
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from .onedrive_client import ResearchFile
+
+# Rows/items converted to arrays at a time; bounds the transient Python objects per file.
+CHUNK_ROWS = 65536
+DATE_DTYPE = "datetime64[us]"
+
+# Matches lines like: 2025-01-08 score: 0.42
+_TEXT_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2}).{0,20}?score[:=]\s*(-?\d+(?:\.\d+)?)", re.IGNORECASE)
+# Dates NumPy and datetime.fromisoformat read identically. NumPy also takes "2025", "2025-02",
+# "NaT" and "today", and misreads "20250102"; chunks with anything else take the fallback.
+_BULK_DATE = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}(?::\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?)?")
+
+ScoreArrays = Tuple[np.ndarray, np.ndarray]
+
+
+def _extract_scored_points(files: List[ResearchFile]) -> List[Tuple[datetime, float]]:
+    dates, scores = extract_score_arrays(files)
+    return list(zip(dates.tolist(), scores.tolist()))
+
+
+def extract_score_arrays(files: Iterable[ResearchFile]) -> ScoreArrays:
+    """Extract every file's (date, score) series as sorted datetime64/float64 arrays.
+
+    Timezone-aware dates are converted to naive UTC so all points share one axis.
+    """
+    parts = [_extract_file(file) for file in files]
+    return _merge(parts)
+
+
+def _extract_file(file: ResearchFile) -> ScoreArrays:
+    name_lower = file.name.lower()
+    if name_lower.endswith(".json"):
+        return _extract_from_json(file.content)
+    if name_lower.endswith(".csv"):
+        return _extract_from_csv(file.content)
+    return _extract_from_text(file.content)
+
+
+def _extract_from_json(content: str) -> ScoreArrays:
+    try:
+        parts = [_to_arrays(dates, scores) for dates, scores in _chunked(_iter_json_pairs(content))]
+    except json.JSONDecodeError:
+        return _empty()
+    return _concat(parts)
+
+
+def _extract_from_csv(content: str) -> ScoreArrays:
+    reader = csv.reader(io.StringIO(content))
+    header = next(reader, None)
+    if not header or "date" not in header or "score" not in header:
+        return _empty()
+    # Like csv.DictReader, a duplicated column name resolves to its last occurrence.
+    date_col = len(header) - 1 - header[::-1].index("date")
+    score_col = len(header) - 1 - header[::-1].index("score")
+    width = max(date_col, score_col)
+
+    pairs = ((row[date_col], row[score_col]) for row in reader if len(row) > width)
+    return _concat([_to_arrays(dates, scores) for dates, scores in _chunked(pairs)])
+
+
+def _extract_from_text(content: str) -> ScoreArrays:
+    pairs = (m.groups() for m in _TEXT_PATTERN.finditer(content))
+    return _concat([_to_arrays(dates, scores) for dates, scores in _chunked(pairs)])
+
+
+def _iter_json_pairs(content: str) -> Iterator[Tuple[object, object]]:
+    """Yield (date, score) from a JSON object or array, decoding array items one at a time."""
+    decoder = json.JSONDecoder()
+    pos = _skip_ws(content, 0)
+    if not content.startswith("[", pos):
+        value = json.loads(content)
+        if isinstance(value, dict):
+            yield value.get("date"), value.get("score")
+        return
+
+    pos = _skip_ws(content, pos + 1)
+    if content.startswith("]", pos):
+        return
+    while True:
+        item, pos = decoder.raw_decode(content, pos)
+        if isinstance(item, dict):
+            yield item.get("date"), item.get("score")
+        pos = _skip_ws(content, pos)
+        if content.startswith(",", pos):
+            pos = _skip_ws(content, pos + 1)
+        elif content.startswith("]", pos):
+            if content[_skip_ws(content, pos + 1):]:
+                raise json.JSONDecodeError("Extra data", content, pos + 1)
+            return
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", content, pos)
+
+
+def _skip_ws(content: str, pos: int) -> int:
+    while pos < len(content) and content[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def _chunked(pairs: Iterable[Tuple[object, object]]) -> Iterator[Tuple[list, list]]:
+    dates: list = []
+    scores: list = []
+    for date_raw, score_raw in pairs:
+        dates.append(date_raw)
+        scores.append(score_raw)
+        if len(dates) >= CHUNK_ROWS:
+            yield dates, scores
+            dates, scores = [], []
+    if dates:
+        yield dates, scores
+
+
+def _to_arrays(dates_raw: list, scores_raw: list) -> ScoreArrays:
+    """Bulk-convert one chunk, falling back to per-value parsing if NumPy rejects it."""
+    if all(isinstance(d, str) and _BULK_DATE.fullmatch(d) for d in dates_raw) and all(s is not None for s in scores_raw):
+        try:
+            with warnings.catch_warnings():
+                # Timezone-aware strings only warn in NumPy; route them through the fallback.
+                warnings.simplefilter("error")
+                return np.array(dates_raw, dtype=DATE_DTYPE), np.asarray(scores_raw, dtype=np.float64)
+        except (ValueError, TypeError, UserWarning, DeprecationWarning):
+            pass
+
+    dates: list[datetime] = []
+    scores: list[float] = []
+    for date_raw, score_raw in zip(dates_raw, scores_raw):
+        point = _normalize_point(date_raw, score_raw)
+        if point:
+            dates.append(point[0])
+            scores.append(point[1])
+    return np.array(dates, dtype=DATE_DTYPE), np.array(scores, dtype=np.float64)
+
+
+def _merge(parts: List[ScoreArrays]) -> ScoreArrays:
+    dates, scores = _concat(parts)
+    order = np.argsort(dates, kind="stable")
+    return dates[order], scores[order]
+
+
+def _concat(parts: List[ScoreArrays]) -> ScoreArrays:
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return _empty()
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def _empty() -> ScoreArrays:
+    return np.array([], dtype=DATE_DTYPE), np.array([], dtype=np.float64)
+
+
+def _normalize_point(date_raw: str | None, score_raw: str | float | int | None) -> Tuple[datetime, float] | None:
+    if not date_raw or score_raw is None:
+        return None
+    try:
+        date = datetime.fromisoformat(str(date_raw))
+        score = float(score_raw)
+    except (ValueError, TypeError):
+        return None
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date, score
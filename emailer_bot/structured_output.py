@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import json
+from typing import Callable, Dict, List
+
+_WHITESPACE = " \t\r\n"
+
+
+class MalformedOutput(ValueError):
+    """The model's structured output broke the JSON syntax or the expected schema."""
+
+
+class StreamingJSONObject:
+    """Incremental parser/validator for one JSON object arriving in text deltas.
+
+    Syntax errors, unknown keys and values of the wrong type are raised from
+    feed() as soon as the offending character or field arrives, so a bad
+    response can be abandoned mid-stream. Completed top-level fields are
+    reported to ``on_partial(name, value)`` as they finish; for array fields
+    each element is reported on its own instead.
+
+    Supports the schema subset used for model output: ``object`` (properties,
+    required, additionalProperties), ``array`` (items), ``string``, ``number``,
+    ``integer`` and ``boolean``.
+    """
+
+    def __init__(self, schema: dict, on_partial: Callable[[str, object], None] | None = None):
+        self.schema = schema
+        self.on_partial = on_partial
+        self.fields: Dict[str, object] = {}
+        self._text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._done = False
+        # Position inside the root object: key, colon, value, in_value or after_value.
+        self._state = "key"
+        self._key: str | None = None
+        self._token_start: int | None = None
+        self._item_start: int | None = None
+
+    def feed(self, delta: str) -> None:
+        self._text += delta
+        text = self._text
+        for i in range(self._pos, len(text)):
+            self._scan(text[i], i)
+        self._pos = len(text)
+
+    def close(self) -> Dict[str, object]:
+        """Finish the stream and return the validated object."""
+        if not self._done:
+            raise MalformedOutput("Output ended before the JSON object was complete")
+        missing = [k for k in self.schema.get("required", []) if k not in self.fields]
+        if missing:
+            raise MalformedOutput(f"Missing required field(s): {', '.join(missing)}")
+        return self.fields
+
+    def _scan(self, c: str, i: int) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                self._string_closed(i)
+            return
+        if c in _WHITESPACE:
+            return
+        if self._done:
+            raise MalformedOutput("Unexpected data after the JSON object")
+        depth = len(self._stack)
+        if depth == 0:
+            if c != "{":
+                raise MalformedOutput("Output is not a JSON object")
+            self._stack.append("{")
+            return
+
+        if depth == 1:
+            self._scan_root(c, i)
+        elif c in "{[":
+            self._start_item(i)
+            self._stack.append(c)
+        elif c in "}]":
+            self._close(c, i)
+        elif c == '"':
+            self._start_item(i)
+            self._in_string = True
+        elif c == ",":
+            self._end_scalar_item(i)
+        else:
+            self._start_item(i)
+
+    def _scan_root(self, c: str, i: int) -> None:
+        state = self._state
+        if state == "key":
+            if c == '"':
+                self._token_start = i
+                self._in_string = True
+            elif c == "}" and not self.fields and self._key is None:
+                self._close(c, i)
+            else:
+                raise MalformedOutput(f"Expected a field name at offset {i}")
+        elif state == "colon":
+            if c != ":":
+                raise MalformedOutput(f"Expected ':' at offset {i}")
+            self._state = "value"
+        elif state == "value":
+            self._token_start = i
+            self._state = "in_value"
+            if c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._stack.append(c)
+            elif c in "}],:":
+                raise MalformedOutput(f"Expected a value at offset {i}")
+        elif state == "in_value":
+            # Only unquoted scalars (numbers, true/false/null) are still open at the root level.
+            if c in ",}":
+                self._complete_field(i)
+                self._after_value(c, i)
+            elif c in "{[]\":":
+                raise MalformedOutput(f"Unexpected {c!r} at offset {i}")
+        else:  # after_value
+            if c not in ",}":
+                raise MalformedOutput(f"Expected ',' or '}}' at offset {i}")
+            self._after_value(c, i)
+
+    def _after_value(self, c: str, i: int) -> None:
+        if c == ",":
+            self._state = "key"
+            self._key = None
+        else:
+            self._close(c, i)
+
+    def _string_closed(self, i: int) -> None:
+        depth = len(self._stack)
+        if depth == 1 and self._state == "key":
+            key = json.loads(self._text[self._token_start : i + 1])
+            properties = self.schema.get("properties", {})
+            if key not in properties and self.schema.get("additionalProperties") is False:
+                raise MalformedOutput(f"Unexpected field {key!r}")
+            if key in self.fields:
+                raise MalformedOutput(f"Duplicate field {key!r}")
+            self._key = key
+            self._state = "colon"
+        elif depth == 1:
+            self._complete_field(i + 1)
+        elif depth == 2 and self._streams_items():
+            self._complete_item(i + 1)
+
+    def _close(self, c: str, i: int) -> None:
+        if len(self._stack) == 2 and self._item_start is not None and self._streams_items():
+            self._complete_item(i)
+        opener = self._stack.pop()
+        if (opener, c) not in (("{", "}"), ("[", "]")):
+            raise MalformedOutput(f"Mismatched {c!r} at offset {i}")
+        depth = len(self._stack)
+        if depth == 0:
+            self._done = True
+        elif depth == 1:
+            self._complete_field(i + 1)
+        elif depth == 2 and self._streams_items():
+            self._complete_item(i + 1)
+
+    def _streams_items(self) -> bool:
+        return self._stack[1] == "[" and self._field_schema().get("type") == "array"
+
+    def _start_item(self, i: int) -> None:
+        if len(self._stack) == 2 and self._item_start is None and self._streams_items():
+            self._item_start = i
+
+    def _end_scalar_item(self, i: int) -> None:
+        # Quoted and nested items complete on their closing character; only bare scalars end at ','.
+        if len(self._stack) == 2 and self._item_start is not None and self._streams_items():
+            self._complete_item(i)
+
+    def _complete_item(self, end: int) -> None:
+        value = _loads(self._text[self._item_start : end])
+        self._item_start = None
+        _check(value, self._field_schema().get("items", {}), f"{self._key}[]")
+        if self.on_partial is not None:
+            self.on_partial(self._key, value)
+
+    def _complete_field(self, end: int) -> None:
+        value = _loads(self._text[self._token_start : end])
+        schema = self._field_schema()
+        _check(value, schema, self._key)
+        self.fields[self._key] = value
+        self._state = "after_value"
+        self._item_start = None
+        if self.on_partial is not None and schema.get("type") != "array":
+            self.on_partial(self._key, value)
+
+    def _field_schema(self) -> dict:
+        return self.schema.get("properties", {}).get(self._key, {})
+
+
+def _loads(raw: str) -> object:
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise MalformedOutput(f"Invalid JSON value {raw[:40]!r}: {e.msg}") from e
+
+
+_TYPES = {
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+
+def _check(value: object, schema: dict, path: str) -> None:
+    expected = schema.get("type")
+    if expected is None:
+        return
+    if not isinstance(value, _TYPES[expected]) or (expected in ("number", "integer") and isinstance(value, bool)):
+        raise MalformedOutput(f"{path} should be {expected}, got {type(value).__name__}")
+    if expected == "array":
+        for item in value:
+            _check(item, schema.get("items", {}), f"{path}[]")
+    elif expected == "object":
+        properties = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                raise MalformedOutput(f"{path}.{key} is missing")
+        for key, item in value.items():
+            if key in properties:
+                _check(item, properties[key], f"{path}.{key}")
+            elif schema.get("additionalProperties") is False:
+                raise MalformedOutput(f"Unexpected field {path}.{key}")
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+_loop: asyncio.AbstractEventLoop | None = None
+_lock = threading.Lock()
+
+
+def run_sync(awaitable: Awaitable[T]) -> T:
+    """Run ``awaitable`` to completion from synchronous code and return its result.
+
+    Every call shares one private event loop on a daemon thread, so the pooled
+    async clients behind the sync wrappers stay on the loop they were first
+    used on, and callers on any thread can use them.
+    """
+    return asyncio.run_coroutine_threadsafe(_await(awaitable), _private_loop()).result()
+
+
+async def _await(awaitable: Awaitable[T]) -> T:
+    return await awaitable
+
+
+def _private_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="sync-runner", daemon=True).start()
+        return _loop
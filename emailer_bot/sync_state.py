@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Generic, List, Type, TypeVar
+
+
+@dataclass
+class FolderState:
+    uidvalidity: int
+    last_uid: int
+    # UIDs at or below last_uid that were fetched but not completed; retried next poll.
+    pending: List[str] = field(default_factory=list)
+    # Failed fetches per pending UID; a UID is dropped after MAX_FETCH_ATTEMPTS.
+    failures: Dict[str, int] = field(default_factory=dict)
+
+
+S = TypeVar("S")
+
+
+class SyncStateStore(Generic[S]):
+    """Per-folder sync state (by default UIDVALIDITY / highest processed UID), persisted as a JSON file."""
+
+    def __init__(self, path: str | Path, state_type: Type[S] = FolderState):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._folders: Dict[str, S] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self._folders = {name: state_type(**state) for name, state in raw.items()}
+
+    def get(self, folder: str) -> S | None:
+        with self._lock:
+            return self._folders.get(folder)
+
+    def put(self, folder: str, state: S) -> None:
+        with self._lock:
+            self._folders[folder] = state
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({name: asdict(s) for name, s in self._folders.items()}, f, indent=2)
+            os.replace(tmp, self.path)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import imaplib
+import logging
+import os
+import smtplib
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Protocol, TypeVar
+
+import msal
+
+from .auth import MicrosoftAuth
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TokenConsumer(Protocol):
+    def update_token(self, token: str) -> None: ...
+
+
+def load_token_cache(path: str | Path) -> msal.SerializableTokenCache:
+    cache = msal.SerializableTokenCache()
+    path = Path(path)
+    if path.exists():
+        cache.deserialize(path.read_text(encoding="utf-8"))
+    return cache
+
+
+def is_auth_failure(exc: BaseException) -> bool:
+    """True for errors that mean the access token was rejected (HTTP 401, IMAP/SMTP AUTH failures)."""
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 401:
+        return True
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(exc, imaplib.IMAP4.error) and not isinstance(exc, imaplib.IMAP4.abort):
+        return "AUTHENTICATE" in str(exc).upper()
+    return False
+
+
+class TokenManager:
+    """Keeps the Microsoft Graph access token fresh from a background thread.
+
+    The MSAL token cache is persisted to ``cache_path``, so a restart reuses a
+    still-valid access token and the cached refresh token instead of blocking
+    on a refresh. Each token is refreshed ``margin_seconds`` before its real
+    expiry and pushed to every consumer under one lock, so they never see two
+    refreshes interleaved. Consumers only store the token; sessions that need
+    to re-authenticate do so on their next use, so the mail loop never waits on
+    token handling.
+    """
+
+    def __init__(
+        self,
+        auth: MicrosoftAuth,
+        cache: msal.SerializableTokenCache,
+        cache_path: str | Path,
+        refresh_token: str | None = None,
+        margin_seconds: float = 300,
+        retry_seconds: float = 60,
+    ):
+        self.auth = auth
+        self.cache = cache
+        self.cache_path = Path(cache_path)
+        self.margin_seconds = margin_seconds
+        self.retry_seconds = retry_seconds
+        self.access_token: str | None = None
+        self.expires_at = 0.0
+        self._refresh_token = refresh_token
+        self._consumers: List[TokenConsumer] = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._generation = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add_consumer(self, consumer: TokenConsumer) -> None:
+        with self._lock:
+            self._consumers.append(consumer)
+            if self.access_token:
+                consumer.update_token(self.access_token)
+
+    def start(self) -> None:
+        """Load or acquire the first token, then keep refreshing it in the background."""
+        self._refresh(force=False)
+        self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def refresh_now(self, timeout: float = 15) -> bool:
+        """Ask the background thread for a new token; True once one was pushed within ``timeout``."""
+        with self._lock:
+            generation = self._generation
+        self._wake.set()
+        with self._changed:
+            return self._changed.wait_for(lambda: self._generation != generation, timeout=timeout)
+
+    def call(self, operation: Callable[[], T]) -> T:
+        """Run ``operation``, retrying it once with a refreshed token if the token was rejected."""
+        try:
+            return operation()
+        except Exception as e:
+            if not is_auth_failure(e) or not self.refresh_now():
+                raise
+            logger.info("Authentication rejected (%s); retrying with a refreshed token", e)
+            return operation()
+
+    async def acall(self, operation: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await operation()
+        except Exception as e:
+            if not is_auth_failure(e) or not await asyncio.to_thread(self.refresh_now):
+                raise
+            logger.info("Authentication rejected (%s); retrying with a refreshed token", e)
+            return await operation()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            delay = max(0.0, self.expires_at - self.margin_seconds - time.time())
+            forced = self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self._refresh(force=forced)
+
+    def _refresh(self, force: bool) -> None:
+        try:
+            result = self._acquire(force)
+        except Exception as e:
+            logger.error("Token refresh failed: %s", e)
+            result = None
+        if not result or not result.get("access_token"):
+            # Keep the current token and try again shortly.
+            self.expires_at = time.time() + self.margin_seconds + self.retry_seconds
+            return
+
+        self._refresh_token = result.get("refresh_token") or self._refresh_token
+        self._save_cache()
+        with self._changed:
+            self.access_token = result["access_token"]
+            self.expires_at = time.time() + float(result.get("expires_in", 3600))
+            for consumer in self._consumers:
+                consumer.update_token(self.access_token)
+            self._generation += 1
+            self._changed.notify_all()
+        logger.info("Access token refreshed; valid for %ds", int(self.expires_at - time.time()))
+
+    def _acquire(self, force: bool) -> dict | None:
+        accounts = self.auth.app.get_accounts()
+        if accounts:
+            result = self.auth.app.acquire_token_silent(self.auth.SCOPES, account=accounts[0], force_refresh=force)
+            if result and result.get("access_token"):
+                return result
+        if self._refresh_token:
+            return self.auth.refresh_access_token(self._refresh_token)
+        return None
+
+    def _save_cache(self) -> None:
+        if not self.cache.has_state_changed:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_path.with_suffix(self.cache_path.suffix + ".tmp")
+        # The cache holds refresh tokens; keep it private to the service account.
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.cache.serialize())
+        os.replace(tmp, self.cache_path)
+        self.cache.has_state_changed = False
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Sequence
+
+from .email_monitor import IncomingEmail
+from .llm_client import LLMResult
+
+# Last completed stage of an alert, in order.
+FETCHED = "fetched"
+SYNTHESIZED = "synthesized"
+RENDERED = "rendered"
+SENT = "sent"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyword TEXT NOT NULL,
+    emails TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    results TEXT,
+    graph_png BLOB,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    failed INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_due ON alerts (stage, failed, next_attempt);
+CREATE TABLE IF NOT EXISTS messages (
+    keyword TEXT NOT NULL,
+    message_key TEXT NOT NULL,
+    alert_id INTEGER NOT NULL,
+    PRIMARY KEY (keyword, message_key)
+);
+"""
+
+
+@dataclass
+class QueuedAlert:
+    """One alert as stored in the queue, with whatever its completed stages produced."""
+
+    id: int
+    keyword: str
+    emails: List[IncomingEmail]
+    stage: str
+    results: List[LLMResult] | None = None
+    graph_png: bytes | None = None
+    # Outputs of the alert already handed to SMTP, so a retry skips them.
+    delivered: int = 0
+    attempts: int = 0
+
+    @property
+    def rendered(self) -> bool:
+        return self.stage == RENDERED
+
+
+class WorkQueue:
+    """Durable record of matched emails and their alert progress, in SQLite (WAL).
+
+    Every (keyword, email) match is recorded once, keyed by Message-ID, so an
+    email fetched again after a restart is not alerted twice. Each alert keeps
+    its LLM results and graph once those stages finish, and a retry resumes
+    after the last completed stage. Failures are retried with exponential
+    backoff capped at ``max_backoff_seconds``; after ``max_attempts`` the alert
+    is parked as failed. The one gap is a crash between SMTP accepting an
+    alert and it being recorded, which sends that alert again.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_attempts: int = 5,
+        backoff_seconds: float = 30,
+        max_backoff_seconds: float = 1800,
+        retention_days: float = 30,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL with NORMAL sync survives process crashes; only an OS crash can lose the last commits.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def enqueue(self, keyword: str, emails: Sequence[IncomingEmail]) -> QueuedAlert | None:
+        """Record an alert for the emails not yet seen for ``keyword``; None if all of them were."""
+        now = time.time()
+        with self._lock, self._conn:
+            known = {
+                key
+                for (key,) in self._conn.execute(
+                    f"SELECT message_key FROM messages WHERE keyword = ? AND message_key IN "
+                    f"({','.join('?' * len(emails))})",
+                    (keyword, *(message_key(email) for email in emails)),
+                )
+            }
+            fresh: List[IncomingEmail] = []
+            for email in emails:
+                key = message_key(email)
+                if key not in known:
+                    known.add(key)
+                    fresh.append(email)
+            if not fresh:
+                return None
+            cursor = self._conn.execute(
+                "INSERT INTO alerts (keyword, emails, stage, next_attempt, updated) VALUES (?, ?, ?, ?, ?)",
+                (keyword, json.dumps([asdict(email) for email in fresh]), FETCHED, now, now),
+            )
+            alert_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO messages (keyword, message_key, alert_id) VALUES (?, ?, ?)",
+                ((keyword, message_key(email), alert_id) for email in fresh),
+            )
+        return QueuedAlert(id=alert_id, keyword=keyword, emails=fresh, stage=FETCHED)
+
+    def due(self, now: float | None = None) -> List[QueuedAlert]:
+        """Unsent alerts whose next attempt is due, oldest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, keyword, emails, stage, results, graph_png, delivered, attempts FROM alerts "
+                "WHERE stage != ? AND failed = 0 AND next_attempt <= ? ORDER BY id",
+                (SENT, now),
+            ).fetchall()
+        return [
+            QueuedAlert(
+                id=alert_id,
+                keyword=keyword,
+                emails=[IncomingEmail(**email) for email in json.loads(emails)],
+                stage=stage,
+                results=[LLMResult(**result) for result in json.loads(results)] if results is not None else None,
+                graph_png=graph_png,
+                delivered=delivered,
+                attempts=attempts,
+            )
+            for alert_id, keyword, emails, stage, results, graph_png, delivered, attempts in rows
+        ]
+
+    def record_synthesized(self, alert_id: int, results: List[LLMResult]) -> None:
+        self._update(
+            alert_id,
+            "stage = ?, results = ?",
+            (SYNTHESIZED, json.dumps([asdict(result) for result in results])),
+        )
+
+    def record_rendered(self, alert_id: int, graph_png: bytes | None) -> None:
+        self._update(alert_id, "stage = ?, graph_png = ?", (RENDERED, graph_png))
+
+    def record_delivered(self, alert_id: int, delivered: int) -> None:
+        self._update(alert_id, "delivered = ?", (delivered,))
+
+    def mark_sent(self, alert_id: int) -> None:
+        # The results and graph are only needed to resume; drop them once the alert is out.
+        self._update(alert_id, "stage = ?, results = NULL, graph_png = NULL, last_error = NULL", (SENT,))
+        self.prune()
+
+    def fail(self, alert_id: int, error: BaseException) -> float | None:
+        """Count a failed attempt; returns the delay before the retry, or None once the alert gave up."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT attempts FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+            if row is None:
+                return None
+            attempts = row[0] + 1
+            delay = min(self.backoff_seconds * 2 ** (attempts - 1), self.max_backoff_seconds)
+            failed = attempts >= self.max_attempts
+            self._conn.execute(
+                "UPDATE alerts SET attempts = ?, next_attempt = ?, failed = ?, last_error = ?, updated = ? "
+                "WHERE id = ?",
+                (attempts, now + delay, int(failed), f"{type(error).__name__}: {error}", now, alert_id),
+            )
+        return None if failed else delay
+
+    def prune(self) -> None:
+        """Forget sent alerts older than ``retention_days``; their emails may then alert again."""
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM messages WHERE alert_id IN (SELECT id FROM alerts WHERE stage = ? AND updated < ?)",
+                (SENT, cutoff),
+            )
+            self._conn.execute("DELETE FROM alerts WHERE stage = ? AND updated < ?", (SENT, cutoff))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _update(self, alert_id: int, assignments: str, params: tuple) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE alerts SET {assignments}, updated = ? WHERE id = ?", (*params, time.time(), alert_id)
+            )
+
+
+def message_key(email: IncomingEmail) -> str:
+    """Message-ID when the email has one, otherwise a hash of its sender, subject and body."""
+    if email.message_id:
+        return email.message_id.strip()
+    digest = hashlib.sha256(f"{email.from_email}\0{email.subject}\0{email.body}".encode("utf-8"))
+    return f"sha256:{digest.hexdigest()}"
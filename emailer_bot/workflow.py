@@ -1,145 +1,286 @@
 from __future__ import annotations
 
-import csv
-import json
-import re
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import datetime
-from pathlib import Path
-from typing import List, Tuple
+from datetime import datetime, timedelta
+from typing import List
 
 
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+import numpy as np
 
+from .config import ChartConfig, ContextConfig
+from .context_index import ContextIndex
+from .downsample import downsample_series
 from .email_monitor import IncomingEmail
-from .llm_client import LLMClient
-from .onedrive_client import OneDriveClient, ResearchFile
+from .history_digest import HistoryDigest
+from .llm_client import AsyncLLMClient, LLMClient, LLMResult, PartialCallback
+from .metrics import Metrics
+from .onedrive_client import AsyncOneDriveClient, OneDriveClient, ResearchFile
+from .render_cache import RenderCache
+from .score_index import ScoreIndex
+from .scores import ScoreArrays, _extract_scored_points, extract_score_arrays  # noqa: F401
+from .sync_runner import run_sync
+
+logger = logging.getLogger(__name__)
+
+# Part of the render cache key, so changing the chart style invalidates old renders.
+GRAPH_STYLE = {"figsize": (8, 4), "marker": "o"}
+
+# Every render in the process runs on this one thread because pyplot is not thread-safe.
+render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
 
 
 @dataclass
 class WorkflowOutput:
     subject: str
     body: str
-    graph_path: Path | None
+    graph_png: bytes | None
+    graph_filename: str = "trend.png"
 
 
 class InvestmentWorkflow:
-    def __init__(self, onedrive: OneDriveClient, llm: LLMClient):
-        self.onedrive = onedrive
-        self.llm = llm
+    """The stages of one keyword's alert: fetch research, synthesize, render the graph, compose.
+
+    fetch() and the synthesis calls await the OneDrive and LLM clients, with
+    context selection moved to a worker thread. render() stays synchronous so
+    AlertPipeline can confine it to the render thread (pyplot is not
+    thread-safe). run() chains every stage for synchronous callers.
+    """
+
+    def __init__(
+        self,
+        onedrive: AsyncOneDriveClient | OneDriveClient | None,
+        llm: AsyncLLMClient | LLMClient | None,
+        score_index: ScoreIndex | None = None,
+        chart: ChartConfig | None = None,
+        render_cache: RenderCache | None = None,
+        context_index: ContextIndex | None = None,
+        context: ContextConfig | None = None,
+        digests: HistoryDigest | None = None,
+        consolidate_batches: bool = False,
+        metrics: Metrics | None = None,
+    ):
+        # The sync wrappers are unwrapped; their async clients run on the shared private loop.
+        self.onedrive = onedrive.client if isinstance(onedrive, OneDriveClient) else onedrive
+        self.llm = llm.client if isinstance(llm, LLMClient) else llm
+        self.score_index = score_index
+        self.chart = chart or ChartConfig()
+        self.render_cache = render_cache
+        self.context_index = context_index
+        self.context = context or ContextConfig()
+        self.digests = digests
+        self.consolidate_batches = consolidate_batches
+        self.metrics = metrics or Metrics()
+        # Serializes digest revisions so concurrent alerts don't summarize the same change twice.
+        self._digest_lock = asyncio.Lock()
 
     def run(self, keyword: str, update_email: IncomingEmail) -> WorkflowOutput:
-        research_files = self.onedrive.fetch_research_files()
-        context = self._build_context(research_files)
+        """Blocking: fetch, synthesize and render for one email, then compose its alert."""
+        return run_sync(self._run(keyword, update_email))
 
-        result = self.llm.synthesize(
-            keyword=keyword,
-            trigger_email=f"Subject: {update_email.subject}\nFrom: {update_email.from_email}\n\n{update_email.body}",
-            history_context=context,
+    async def _run(self, keyword: str, update_email: IncomingEmail) -> WorkflowOutput:
+        research_files = await self.fetch(keyword)
+        result = await self.synthesize(keyword, update_email, research_files)
+        graph_png = await asyncio.get_running_loop().run_in_executor(
+            render_executor, self.render, keyword, research_files
         )
+        return self.compose(keyword, update_email, result, graph_png)
+
+    # The stages below are what run() chains; AlertPipeline calls them separately
+    # so different alerts can be at different stages at the same time.
+
+    async def fetch(self, keyword: str = "") -> List[ResearchFile]:
+        with self.metrics.timed("fetch_research_files", keyword) as m:
+            files = await self.onedrive.fetch_research_files()
+            m.bytes = _content_bytes(files)
+        return files
 
-        graph_path = self._build_graph(research_files, keyword)
+    async def synthesize(
+        self, keyword: str, update_email: IncomingEmail, research_files: List[ResearchFile]
+    ) -> LLMResult:
+        trigger = format_trigger(update_email)
+        # Re-chunking changed files and scoring is CPU work; keep it off the event loop.
+        context = await asyncio.to_thread(self._build_context, research_files, keyword, trigger)
+        digest = await self._history_digest(keyword, research_files)
+        with self.metrics.timed("synthesize", keyword) as m:
+            result = await self.llm.synthesize(
+                keyword=keyword,
+                trigger_email=trigger,
+                history_context=context,
+                history_digest=digest,
+                on_partial=self._early_fields(keyword),
+            )
+            m.bytes = _result_bytes([result])
+        return result
+
+    async def synthesize_batch(
+        self, keyword: str, update_emails: List[IncomingEmail], research_files: List[ResearchFile]
+    ) -> List[LLMResult]:
+        triggers = [format_trigger(email) for email in update_emails]
+        context = await asyncio.to_thread(self._build_context, research_files, keyword, "\n\n".join(triggers))
+        digest = await self._history_digest(keyword, research_files)
+        with self.metrics.timed("synthesize", keyword) as m:
+            results = await self.llm.synthesize_batch(
+                keyword=keyword,
+                trigger_emails=triggers,
+                history_context=context,
+                history_digest=digest,
+                consolidate=self.consolidate_batches,
+                on_partial=self._early_fields(keyword),
+            )
+            m.bytes = _result_bytes(results)
+        return results
+
+    def _early_fields(self, keyword: str) -> PartialCallback:
+        """Log each summary as soon as the model has written it, and time the first streamed field."""
+        started = time.perf_counter()
+        first = True
+
+        def report(name: str, value: object) -> None:
+            nonlocal first
+            if first:
+                first = False
+                self.metrics.observe("synthesize_first_field", keyword, time.perf_counter() - started)
+            if name == "summary":
+                logger.info("Summary for '%s' (alert still streaming): %s", keyword, value)
+            elif name == "results":
+                logger.info("Batch summary for '%s' (alert still streaming): %s", keyword, value.get("summary", ""))
+            elif name == "key_points":
+                logger.debug("Key point for '%s': %s", keyword, value)
+
+        return report
+
+    def render(self, keyword: str, research_files: List[ResearchFile]) -> bytes | None:
+        return self._build_graph(research_files, keyword)
+
+    def compose(
+        self, keyword: str, update_email: IncomingEmail, result: LLMResult, graph_png: bytes | None
+    ) -> WorkflowOutput:
         subject = f"{keyword} update detected: {update_email.subject}"
         body = result.formatted_email
-        return WorkflowOutput(subject=subject, body=body, graph_path=graph_path)
+        return WorkflowOutput(
+            subject=subject,
+            body=body,
+            graph_png=graph_png,
+            graph_filename=f"{keyword}_trend.png",
+        )
 
-    def _build_context(self, files: List[ResearchFile]) -> str:
+    def compose_batch(
+        self,
+        keyword: str,
+        update_emails: List[IncomingEmail],
+        results: List[LLMResult],
+        graph_png: bytes | None,
+    ) -> List[WorkflowOutput]:
+        if len(results) == len(update_emails):
+            return [self.compose(keyword, email, result, graph_png) for email, result in zip(update_emails, results)]
+        # Consolidated: one alert covering every email in the batch.
+        return [
+            WorkflowOutput(
+                subject=f"{keyword}: {len(update_emails)} updates detected",
+                body=results[0].formatted_email,
+                graph_png=graph_png,
+                graph_filename=f"{keyword}_trend.png",
+            )
+        ]
+
+    async def _history_digest(self, keyword: str, files: List[ResearchFile]) -> str:
+        if self.digests is None:
+            return ""
+        async with self._digest_lock:
+            plan = self.digests.plan(keyword, files)
+            if plan.up_to_date:
+                return plan.previous or ""
+            digest = await self.llm.digest_history(keyword, plan.previous, plan.changes)
+            await asyncio.to_thread(self.digests.save, keyword, plan, digest)
+            return digest
+
+    def _build_context(self, files: List[ResearchFile], keyword: str = "", query: str = "") -> str:
+        with self.metrics.timed("build_context", keyword) as m:
+            context = self._select_context(files, keyword, query)
+            m.bytes = len(context.encode("utf-8"))
+        return context
+
+    def _select_context(self, files: List[ResearchFile], keyword: str, query: str) -> str:
+        if self.context_index is not None:
+            budget = self.context.digest_token_budget if self.digests is not None else self.context.token_budget
+            if budget <= 0:
+                return ""
+            return self.context_index.select(keyword, files, f"{keyword}\n{query}", budget)
         chunks: list[str] = []
         for f in files:
             snippet = f.content[:2500]
             chunks.append(f"### File: {f.name}\n{snippet}")
         return "\n\n".join(chunks)
 
-    def _build_graph(self, files: List[ResearchFile], keyword: str) -> Path | None:
-        points = _extract_scored_points(files)
-        if not points:
+    def _build_graph(self, files: List[ResearchFile], keyword: str) -> bytes | None:
+        with self.metrics.timed("build_graph", keyword) as m:
+            png = self._plot(files, keyword)
+            m.bytes = len(png or b"")
+        return png
+
+    def _plot(self, files: List[ResearchFile], keyword: str) -> bytes | None:
+        dates, scores = self._scored_points(files, keyword)
+        if not len(dates):
             return None
+        dates, scores = downsample_series(dates, scores, self.chart.max_points)
 
-        output_dir = Path("artifacts")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output = output_dir / f"{keyword}_trend.png"
+        title = f"{keyword} historical opinion trend"
+        cache_key = None
+        if self.render_cache is not None:
+            cache_key = RenderCache.key(dates, scores, title, GRAPH_STYLE)
+            cached = self.render_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-        dates, scores = zip(*points)
-        fig, ax = plt.subplots(figsize=(8, 4))
+        fig, ax = plt.subplots(figsize=GRAPH_STYLE["figsize"])
         try:
-            ax.plot(dates, scores, marker="o")
-            ax.set_title(f"{keyword} historical opinion trend")
+            ax.plot(dates, scores, marker=GRAPH_STYLE["marker"])
+            ax.set_title(title)
             ax.set_xlabel("Date")
             ax.set_ylabel("Score")
             ax.grid(True, alpha=0.3)
             fig.tight_layout()
-            fig.savefig(output)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png")
         finally:
             plt.close(fig)
 
-        return output
-
-
-def _extract_scored_points(files: List[ResearchFile]) -> List[Tuple[datetime, float]]:
-    points: list[Tuple[datetime, float]] = []
-
-    for file in files:
-        name_lower = file.name.lower()
-        content = file.content
-
-        if name_lower.endswith(".json"):
-            points.extend(_extract_from_json(content))
-        elif name_lower.endswith(".csv"):
-            points.extend(_extract_from_csv(content))
-        else:
-            points.extend(_extract_from_text(content))
-
-    return sorted(points, key=lambda t: t[0])
-
-
-def _extract_from_json(content: str) -> List[Tuple[datetime, float]]:
-    out: list[Tuple[datetime, float]] = []
-    try:
-        value = json.loads(content)
-    except json.JSONDecodeError:
-        return out
-
-    items = value if isinstance(value, list) else [value]
-    for item in items:
-        if not isinstance(item, dict):
-            continue
-        date_raw = item.get("date")
-        score_raw = item.get("score")
-        point = _normalize_point(date_raw, score_raw)
-        if point:
-            out.append(point)
-    return out
-
-
-def _extract_from_csv(content: str) -> List[Tuple[datetime, float]]:
-    out: list[Tuple[datetime, float]] = []
-    reader = csv.DictReader(content.splitlines())
-    for row in reader:
-        point = _normalize_point(row.get("date"), row.get("score"))
-        if point:
-            out.append(point)
-    return out
-
-
-def _extract_from_text(content: str) -> List[Tuple[datetime, float]]:
-    out: list[Tuple[datetime, float]] = []
-    # Matches lines like: 2025-01-08 score: 0.42
-    pattern = re.compile(r"(\d{4}-\d{2}-\d{2}).{0,20}?score[:=]\s*(-?\d+(?:\.\d+)?)", re.IGNORECASE)
-    for date_raw, score_raw in pattern.findall(content):
-        point = _normalize_point(date_raw, score_raw)
-        if point:
-            out.append(point)
-    return out
-
-
-def _normalize_point(date_raw: str | None, score_raw: str | float | int | None) -> Tuple[datetime, float] | None:
-    if not date_raw or score_raw is None:
-        return None
-    try:
-        date = datetime.fromisoformat(str(date_raw))
-        score = float(score_raw)
-    except (ValueError, TypeError):
-        return None
-    return date, score
+        png = buffer.getvalue()
+        if cache_key is not None:
+            self.render_cache.put(cache_key, png)
+        return png
+
+    def _scored_points(self, files: List[ResearchFile], keyword: str) -> ScoreArrays:
+        start = None
+        if self.chart.lookback_days:
+            start = datetime.now() - timedelta(days=self.chart.lookback_days)
+
+        if self.score_index is None:
+            dates, scores = extract_score_arrays(files)
+            if start is not None:
+                keep = dates >= np.datetime64(start, "us")
+                dates, scores = dates[keep], scores[keep]
+            return dates, scores
+
+        self.score_index.update(keyword, files)
+        return self.score_index.series_arrays(keyword, start=start)
+
+
+def _content_bytes(files: List[ResearchFile]) -> int:
+    return sum(len(f.content.encode("utf-8")) for f in files)
+
+
+def _result_bytes(results: List[LLMResult]) -> int:
+    return sum(len(r.formatted_email.encode("utf-8")) for r in results)
+
+
+def format_trigger(update_email: IncomingEmail) -> str:
+    return f"Subject: {update_email.subject}\nFrom: {update_email.from_email}\n\n{update_email.body}"
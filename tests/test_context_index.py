@@ -0,0 +1,34 @@
+from emailer_bot.context_index import ContextIndex, chunk_text
+from emailer_bot.onedrive_client import ResearchFile
+
+
+def test_select_prefers_relevant_chunks_within_budget(tmp_path):
+    filler = "\n".join(f"General market commentary line {i}." for i in range(60))
+    files = [
+        ResearchFile(name="notes.md", content=f"{filler}\nBert margin guidance cut on tariff exposure.", item_id="a"),
+        ResearchFile(name="other.md", content=filler, item_id="b"),
+    ]
+    index = ContextIndex(tmp_path / "context.sqlite3", chunk_tokens=50)
+
+    context = index.select("bert", files, "Bert cuts margin guidance", token_budget=60)
+
+    assert context.startswith("### File: notes.md\n")
+    assert "tariff exposure" in context
+    assert "other.md" not in context
+    assert len(context) // 4 <= 70
+
+
+def test_update_rechunks_only_changed_files_and_persists(tmp_path):
+    path = tmp_path / "context.sqlite3"
+    files = [ResearchFile(name="a.md", content="alpha", item_id="1"), ResearchFile(name="b.md", content="beta")]
+    assert ContextIndex(path).update("bert", files) == 2
+
+    index = ContextIndex(path)
+    files[0] = ResearchFile(name="a.md", content="alpha v2", item_id="1")
+    assert index.update("bert", files) == 1
+    assert index.update("bert", files[1:]) == 0
+    assert "alpha" not in index.select("bert", files[1:], "alpha", token_budget=100)
+
+
+def test_chunk_text_keeps_line_order_and_splits_long_lines():
+    assert chunk_text("a\n" + "x" * 10 + "\nb", chunk_tokens=1) == ["a", "xxxx", "xxxx", "xx\nb"]
@@ -0,0 +1,21 @@
+import numpy as np
+
+from emailer_bot.downsample import downsample_series, lttb_indices
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 100)
+    y[5_000] = 10.0
+
+    keep = lttb_indices(x, y, 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 9_999
+    assert np.all(np.diff(keep) > 0)
+    assert 5_000 in keep
+
+
+def test_downsample_series_is_noop_below_budget():
+    dates = np.array(['2025-01-01', '2025-01-02'], dtype='datetime64[us]')
+    scores = np.array([0.1, 0.2])
+    assert downsample_series(dates, scores, 1000)[0] is dates
@@ -0,0 +1,110 @@
+from emailer_bot.config import IMAPConfig
+from emailer_bot.graph_monitor import GraphEmailMonitor, GraphMailState
+from emailer_bot.sync_state import SyncStateStore
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, delta_pages, bodies=None):
+        self.delta_pages = list(delta_pages)
+        self.bodies = bodies or {}
+        self.posts = []
+        self.fetched = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        if "/delta" in url:
+            return FakeResponse(self.delta_pages.pop(0))
+        message_id = url.rsplit("/", 1)[-1]
+        self.fetched.append(message_id)
+        return FakeResponse({
+            "subject": f"update {message_id}",
+            "from": {"emailAddress": {"address": "a@b.com"}},
+            "body": {"content": self.bodies.get(message_id, "body")},
+        })
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.posts.append(json)
+        return FakeResponse({"responses": [{"id": r["id"], "status": 200} for r in json["requests"]]})
+
+    def close(self):
+        pass
+
+
+def test_delta_sync_persists_link_and_batches_read_flags(tmp_path):
+    store = SyncStateStore(tmp_path / "graph.json", GraphMailState)
+    monitor = GraphEmailMonitor(IMAPConfig(host='x', port=993, username='u', password='t'), sync_state=store)
+    monitor.session = FakeSession([
+        {
+            "value": [
+                {"id": "m1", "isRead": False, "receivedDateTime": "2025-01-01T00:00:00Z", "subject": "bert"},
+                {"id": "m2", "isRead": True, "receivedDateTime": "2025-01-02T00:00:00Z", "subject": "old"},
+            ],
+            "@odata.deltaLink": "https://graph/delta?token=1",
+        },
+        {
+            "value": [
+                {"id": "m1", "isRead": True, "receivedDateTime": "2025-01-01T00:00:00Z"},
+                {"id": "m3", "isRead": True, "receivedDateTime": "2025-01-03T00:00:00Z"},
+            ],
+            "@odata.deltaLink": "https://graph/delta?token=2",
+        },
+    ])
+
+    assert [m.uid for m in monitor.fetch_unseen()] == ["m1"]
+    monitor.complete(["m1"])
+    assert monitor.session.posts[0]["requests"][0]["url"] == "/me/messages/m1"
+    assert store.get("INBOX").delta_link == "https://graph/delta?token=1"
+
+    # m3 was read elsewhere but is newer than the watermark, so it still counts as new.
+    assert [m.uid for m in monitor.fetch_unseen()] == ["m3"]
+
+
+def test_ties_and_keywords_past_the_preview_are_not_lost():
+    monitor = GraphEmailMonitor(IMAPConfig(host='x', port=993, username='u', password='t', prefilter="search"))
+    long_preview = "x " * 130
+    monitor.session = FakeSession(
+        [
+            {
+                "value": [{"id": "m1", "isRead": False, "receivedDateTime": "2025-01-01T00:00:00Z", "subject": "bert"}],
+                "@odata.deltaLink": "https://graph/delta?token=1",
+            },
+            {
+                "value": [
+                    # Same timestamp as m1 but not scanned before.
+                    {"id": "m2", "isRead": True, "receivedDateTime": "2025-01-01T00:00:00Z", "subject": "bert"},
+                    {"id": "m3", "isRead": False, "receivedDateTime": "2025-01-02T00:00:00Z", "subject": "q",
+                     "bodyPreview": long_preview},
+                    {"id": "m4", "isRead": False, "receivedDateTime": "2025-01-02T00:00:00Z", "subject": "q",
+                     "bodyPreview": long_preview},
+                    {"id": "m5", "isRead": False, "receivedDateTime": "2025-01-02T00:00:00Z", "subject": "q",
+                     "bodyPreview": "short and unrelated"},
+                ],
+                "@odata.deltaLink": "https://graph/delta?token=2",
+            },
+            {
+                "value": [{"id": "m2", "isRead": True, "receivedDateTime": "2025-01-01T00:00:00Z", "subject": "bert"}],
+                "@odata.deltaLink": "https://graph/delta?token=3",
+            },
+        ],
+        bodies={"m3": long_preview + "and then BERT", "m4": long_preview + "nothing"},
+    )
+
+    assert [m.uid for m in monitor.fetch_unseen(["bert"])] == ["m1"]
+    monitor.complete(["m1"])
+    assert [m.uid for m in monitor.fetch_unseen(["bert"])] == ["m2", "m3"]
+    # m5's short preview is its whole body, so it is never downloaded.
+    assert "m5" not in monitor.session.fetched
+    monitor.complete(["m2", "m3"])
+    # A scanned message that changes again is not new.
+    assert monitor.fetch_unseen(["bert"]) == []
@@ -0,0 +1,62 @@
+import asyncio
+
+from emailer_bot.history_digest import DigestState, HistoryDigest
+from emailer_bot.llm_client import LLMResult
+from emailer_bot.onedrive_client import ResearchFile
+from emailer_bot.sync_state import SyncStateStore
+from emailer_bot.workflow import InvestmentWorkflow
+
+
+class FakeLLM:
+    def __init__(self):
+        self.digest_calls = []
+        self.synth_calls = []
+
+    async def digest_history(self, keyword, previous_digest, changes):
+        self.digest_calls.append((previous_digest, changes))
+        return f"digest {len(self.digest_calls)}"
+
+    async def synthesize(self, on_partial=None, **kwargs):
+        self.synth_calls.append(kwargs)
+        if on_partial is not None:
+            on_partial("summary", "s")
+        return LLMResult("s", "e", [])
+
+
+def test_digest_is_patched_only_when_research_changes(tmp_path):
+    store = SyncStateStore(tmp_path / "digest.json", DigestState)
+    llm = FakeLLM()
+    flow = InvestmentWorkflow(onedrive=None, llm=llm, digests=HistoryDigest(store))
+    email = type("Email", (), {"subject": "s", "from_email": "f", "body": "b"})()
+    files = [ResearchFile("a.md", "alpha", item_id="1"), ResearchFile("b.md", "beta", item_id="2")]
+
+    asyncio.run(flow.synthesize("bert", email, files))
+    asyncio.run(flow.synthesize("bert", email, files))
+    assert len(llm.digest_calls) == 1
+    assert llm.digest_calls[0][0] is None
+
+    # A fresh store instance sees the persisted digest; only the edit and removal are sent.
+    flow.digests = HistoryDigest(SyncStateStore(tmp_path / "digest.json", DigestState))
+    asyncio.run(flow.synthesize("bert", email, [ResearchFile("a.md", "alpha v2", item_id="1")]))
+    previous, changes = llm.digest_calls[1]
+    assert previous == "digest 1"
+    assert "alpha v2" in changes and "### Removed files\nb.md" in changes
+    assert llm.synth_calls[-1]["history_digest"] == "digest 2"
+
+
+def test_run_chains_the_stages_for_sync_callers(caplog):
+    class FakeOneDrive:
+        async def fetch_research_files(self):
+            return [ResearchFile("a.md", "alpha", item_id="1")]
+
+    llm = FakeLLM()
+    flow = InvestmentWorkflow(onedrive=FakeOneDrive(), llm=llm)
+    email = type("Email", (), {"subject": "Q3", "from_email": "f", "body": "b"})()
+
+    with caplog.at_level("INFO", logger="emailer_bot.workflow"):
+        output = flow.run("bert", email)
+    assert output.subject == "bert update detected: Q3" and output.body == "e"
+    assert "alpha" in llm.synth_calls[0]["history_context"]
+    # The summary is surfaced while the alert is still streaming, and its arrival is timed.
+    assert "Summary for 'bert' (alert still streaming): s" in caplog.text
+    assert flow.metrics.summary()["synthesize_first_field"]["bert"]["count"] == 1
@@ -0,0 +1,175 @@
+import imaplib
+
+from emailer_bot import email_monitor
+from emailer_bot.config import IMAPConfig
+from emailer_bot.email_monitor import EmailMonitor
+
+
+class FakeIMAP:
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.calls = []
+        self.timeout = timeout
+        FakeIMAP.instances.append(self)
+
+    def login(self, user, password):
+        self.calls.append(("login",))
+
+    def authenticate(self, mechanism, callback):
+        self.calls.append(("authenticate", callback(b"")))
+
+    def select(self, folder):
+        self.calls.append(("select", folder))
+
+    def noop(self):
+        return "OK", [b""]
+
+    def uid(self, command, *args):
+        self.calls.append((command, *args))
+        if command == "search":
+            return "OK", [b""]
+        return "OK", [None]
+
+    def logout(self):
+        self.calls.append(("logout",))
+
+    def shutdown(self):
+        pass
+
+
+def _monitor(monkeypatch, **overrides):
+    FakeIMAP.instances = []
+    monkeypatch.setattr(email_monitor.imaplib, "IMAP4_SSL", FakeIMAP)
+    return EmailMonitor(IMAPConfig(host='x', port=993, username='u', password='p', **overrides))
+
+
+def test_session_is_reused_and_mark_as_read_is_batched(monkeypatch):
+    monitor = _monitor(monkeypatch)
+    monitor.fetch_unseen()
+    monitor.mark_as_read(["3", "5", "8"])
+
+    assert len(FakeIMAP.instances) == 1
+    assert FakeIMAP.instances[0].timeout == 60
+    assert ("store", "3,5,8", "+FLAGS", "\\Seen") in FakeIMAP.instances[0].calls
+
+
+def test_token_rotation_reauthenticates(monkeypatch):
+    monitor = _monitor(monkeypatch, auth_method="oauth")
+    monitor.fetch_unseen()
+    monitor.update_token("rotated")
+    monitor.fetch_unseen()
+
+    assert len(FakeIMAP.instances) == 2
+    assert ("logout",) in FakeIMAP.instances[0].calls
+    assert "rotated" in FakeIMAP.instances[1].calls[0][1]
+
+
+def test_lost_session_reconnects(monkeypatch):
+    monitor = _monitor(monkeypatch)
+    monitor.fetch_unseen()
+
+    def broken(*args):
+        raise imaplib.IMAP4.abort("socket closed")
+
+    FakeIMAP.instances[0].uid = broken
+    monitor.fetch_unseen()
+    assert len(FakeIMAP.instances) == 2
+
+
+def test_idle_wakes_on_exists():
+    import socket
+    import threading
+
+    from emailer_bot.email_monitor import _idle
+
+    ours, server = socket.socketpair()
+
+    class IdleClient:
+        sock = ours
+
+        def _new_tag(self):
+            return b"A1"
+
+        def send(self, data):
+            ours.sendall(data)
+
+    def serve():
+        buf = b""
+        while b"IDLE\r\n" not in buf:
+            buf += server.recv(1024)
+        server.sendall(b"+ idling\r\n* 4 EXISTS\r\n")
+        while b"DONE\r\n" not in buf:
+            buf += server.recv(1024)
+        server.sendall(b"A1 OK IDLE terminated\r\n")
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        assert _idle(IdleClient(), timeout=5, stop_event=None)
+    finally:
+        thread.join()
+        ours.close()
+        server.close()
+
+
+def test_watermark_fetches_only_new_uids_and_keeps_failures_pending(monkeypatch, tmp_path):
+    from emailer_bot.sync_state import FolderState, SyncStateStore
+
+    class WatermarkIMAP(FakeIMAP):
+        def status(self, folder, names):
+            return "OK", [b"INBOX (UIDVALIDITY 7 UIDNEXT 13)"]
+
+        def uid(self, command, *args):
+            self.calls.append((command, *args))
+            if command == "search":
+                return "OK", [b"11 12"]
+            if command == "fetch":
+                return "OK", [(b"1 (BODY[] {10}", b"Subject: s\r\n\r\nx")]
+            return "OK", [None]
+
+    monkeypatch.setattr(email_monitor.imaplib, "IMAP4_SSL", WatermarkIMAP)
+    store = SyncStateStore(tmp_path / "sync.json")
+    store.put("INBOX", FolderState(uidvalidity=7, last_uid=10))
+    monitor = EmailMonitor(
+        IMAPConfig(host='x', port=993, username='u', password='p', mark_seen=False),
+        sync_state=store,
+    )
+
+    mails = monitor.fetch_unseen()
+    assert [m.uid for m in mails] == ["11", "12"]
+    assert ("search", None, "UID", "11:12") in monitor._client.calls
+
+    monitor.complete(["11"])
+    reloaded = SyncStateStore(tmp_path / "sync.json").get("INBOX")
+    assert reloaded == FolderState(uidvalidity=7, last_uid=12, pending=["12"])
+    assert not any(c[0] == "store" for c in monitor._client.calls)
+
+
+def test_expunged_and_unfetchable_pending_uids_are_dropped(monkeypatch, tmp_path):
+    from emailer_bot.sync_state import FolderState, SyncStateStore
+
+    class PendingIMAP(FakeIMAP):
+        def status(self, folder, names):
+            return "OK", [b"INBOX (UIDVALIDITY 7 UIDNEXT 11)"]
+
+        def uid(self, command, *args):
+            self.calls.append((command, *args))
+            if command == "search":
+                # UID 4 was expunged; 5 still exists but its body never comes back.
+                return "OK", [b"5"]
+            return "OK", [None]
+
+    monkeypatch.setattr(email_monitor.imaplib, "IMAP4_SSL", PendingIMAP)
+    store = SyncStateStore(tmp_path / "sync.json")
+    store.put("INBOX", FolderState(uidvalidity=7, last_uid=10, pending=["4", "5"]))
+    monitor = EmailMonitor(IMAPConfig(host='x', port=993, username='u', password='p'), sync_state=store)
+
+    for attempt in range(1, email_monitor.MAX_FETCH_ATTEMPTS):
+        assert monitor.fetch_unseen() == []
+        monitor.complete([])
+        assert store.get("INBOX") == FolderState(uidvalidity=7, last_uid=10, pending=["5"], failures={"5": attempt})
+
+    monitor.fetch_unseen()
+    monitor.complete([])
+    assert store.get("INBOX") == FolderState(uidvalidity=7, last_uid=10)
@@ -12,3 +12,32 @@ def test_keyword_does_not_match_substring():
     monitor = EmailMonitor(IMAPConfig(host='x', port=993, username='u', password='p'))
     mail = IncomingEmail(uid='2', subject='albert status', from_email='a@b.com', body='')
     assert not monitor.has_keyword(mail, 'bert')
+
+
+def test_keyword_matcher_reports_every_hit_in_config_order():
+    from emailer_bot.email_monitor import KeywordMatcher
+
+    matcher = KeywordMatcher(['ernie', 'bert', 'Bert Capital', 'oscar'])
+    mail = IncomingEmail(uid='3', subject='BERT CAPITAL weekly', from_email='a@b.com', body='ernie too, not albert')
+    assert matcher.matches(mail) == ['ernie', 'bert', 'Bert Capital']
+
+
+def test_load_config_builds_keyword_routes(tmp_path):
+    from emailer_bot.config import load_config
+
+    path = tmp_path / 'config.yaml'
+    path.write_text(
+        "investment_keyword: bert\n"
+        "imap: {host: h, port: 993, username: u, password: p}\n"
+        "onedrive: {access_token: t, drive_id: d, folder_path: Research/Bert}\n"
+        "openai: {api_key: k, model: m}\n"
+        "smtp: {host: h, port: 587, username: u, password: p, from_email: f@x.com}\n"
+        "recipients: [{name: A, email: a@x.com}]\n"
+        "keywords:\n"
+        "  - {keyword: ernie, folder_path: Research/Ernie, recipients: [{name: C, email: c@x.com}]}\n"
+    )
+    config = load_config(path)
+    assert [(k.keyword, k.folder_path, k.recipients[0].email) for k in config.keywords] == [
+        ('bert', 'Research/Bert', 'a@x.com'),
+        ('ernie', 'Research/Ernie', 'c@x.com'),
+    ]
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from emailer_bot.llm_cache import LLMCache, normalize_trigger
+from emailer_bot.llm_client import AsyncLLMClient, LLMResult, LLMUsage
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+    async def close(self):
+        pass
+
+
+class FakeResponses:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        text = '{"summary": "s", "key_points": ["k"], "formatted_email": "e"}'
+        return FakeStream([
+            SimpleNamespace(type="response.output_text.delta", delta=text),
+            SimpleNamespace(type="response.completed", response=SimpleNamespace(usage=None)),
+        ])
+
+
+def make_client(cache):
+    client = AsyncLLMClient.__new__(AsyncLLMClient)
+    client.model = "m"
+    client.cache = cache
+    client.max_retries = 0
+    client.usage = LLMUsage()
+    client.client = SimpleNamespace(responses=FakeResponses())
+    return client
+
+
+def test_resent_update_with_same_context_is_served_from_cache(tmp_path):
+    cache = LLMCache(tmp_path / "llm.sqlite3", ttl_seconds=3600, max_entries=10)
+    client = make_client(cache)
+
+    first = asyncio.run(client.synthesize("bert", "Subject: Bert Q3\nFrom: a@x\n\nScore up", "ctx"))
+    again = asyncio.run(client.synthesize("bert", "Subject: Fwd: RE: Bert Q3\nFrom: a@x\n\n> Score  up", "ctx"))
+    changed = asyncio.run(client.synthesize("bert", "Subject: Bert Q3\nFrom: a@x\n\nScore up", "new ctx"))
+
+    assert again == first == LLMResult("s", "e", ["k"])
+    assert client.client.responses.calls == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert changed == first
+
+
+def test_entries_expire_and_evict_least_recently_used(tmp_path):
+    cache = LLMCache(tmp_path / "llm.sqlite3", ttl_seconds=3600, max_entries=2)
+    result = LLMResult("s", "e", [])
+    for key in ("a", "b"):
+        cache.put(key, result)
+    cache.get("a")
+    cache.put("c", result)
+    assert cache.get("b") is None
+    assert cache.get("a") == result
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.get("c") is None
+
+
+def test_normalize_trigger_ignores_reply_prefixes_and_spacing():
+    assert normalize_trigger("Subject: Fw: Bert\n\nLine  one\n> two") == normalize_trigger("Subject: Bert\nline one\ntwo")
+
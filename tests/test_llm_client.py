@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from emailer_bot.llm_client import LLMResult, _to_batch_results, build_batch_prompt
+from emailer_bot.structured_output import MalformedOutput
+
+
+def test_batch_result_must_cover_every_update():
+    item = {"summary": "s", "formatted_email": "e", "key_points": []}
+    assert len(_to_batch_results({"results": [item, item]}, 2, consolidate=False)) == 2
+    assert _to_batch_results(item, 3, consolidate=True) == [LLMResult("s", "e", [])]
+    with pytest.raises(MalformedOutput):
+        _to_batch_results({"results": [item]}, 2, consolidate=False)
+
+
+def test_batch_prompt_numbers_updates_after_the_shared_context():
+    prompt = build_batch_prompt("bert", ["first", "second"], "ctx", "digest")
+    assert prompt.index("digest") < prompt.index("ctx") < prompt.index("--- UPDATE 1 ---\nfirst")
+    assert "--- UPDATE 2 ---\nsecond" in prompt
+
+
+def test_malformed_stream_is_abandoned_early_and_retried(caplog):
+    import asyncio
+    from types import SimpleNamespace
+
+    from emailer_bot.llm_client import AsyncLLMClient, LLMUsage
+
+    good = '{"summary": "s", "key_points": ["k"], "formatted_email": "e"}'
+    usage = SimpleNamespace(input_tokens=120, output_tokens=30, input_tokens_details=SimpleNamespace(cached_tokens=100))
+    consumed = []
+
+    class Stream:
+        def __init__(self, deltas):
+            self.deltas = deltas
+            self.closed = False
+
+        async def __aiter__(self):
+            for delta in self.deltas:
+                consumed.append(delta)
+                yield SimpleNamespace(type="response.output_text.delta", delta=delta)
+            yield SimpleNamespace(type="response.completed", response=SimpleNamespace(usage=usage))
+
+        async def close(self):
+            self.closed = True
+
+    streams = [Stream(['{"summary": 42, ', '"never": "read"}']), Stream([good])]
+    client = AsyncLLMClient.__new__(AsyncLLMClient)
+    client.model = "m"
+    client.cache = None
+    client.max_retries = 1
+    client.usage = LLMUsage()
+
+    async def create(**kwargs):
+        return streams.pop(0)
+
+    client.client = SimpleNamespace(responses=SimpleNamespace(create=create))
+
+    partial = []
+    with caplog.at_level("INFO", logger="emailer_bot.llm_client"):
+        result = asyncio.run(client.synthesize("bert", "t", "c", on_partial=lambda name, _: partial.append(name)))
+
+    assert result == LLMResult("s", "e", ["k"])
+    assert '"never": "read"}' not in consumed
+    # The bad summary was rejected before it was reported; the retry's fields arrive in generation order.
+    assert partial == ["summary", "key_points", "formatted_email"]
+    assert "(first field n/a)" not in caplog.text and "first field " in caplog.text
+    usage_totals = client.usage
+    assert (usage_totals.calls, usage_totals.retries, usage_totals.input_tokens, usage_totals.cached_tokens) == (
+        1, 1, 120, 100
+    )
+
+
+def test_batch_with_too_few_results_is_retried():
+    import asyncio
+    from types import SimpleNamespace
+
+    from emailer_bot.llm_client import AsyncLLMClient, LLMUsage
+
+    item = {"summary": "s", "key_points": [], "formatted_email": "e"}
+    answers = [json.dumps({"results": [item]}), json.dumps({"results": [item, item]})]
+
+    class Stream:
+        def __init__(self, text):
+            self.text = text
+
+        async def __aiter__(self):
+            yield SimpleNamespace(type="response.output_text.delta", delta=self.text)
+
+        async def close(self):
+            pass
+
+    async def create(**kwargs):
+        return Stream(answers.pop(0))
+
+    client = AsyncLLMClient.__new__(AsyncLLMClient)
+    client.model = "m"
+    client.cache = None
+    client.max_retries = 1
+    client.usage = LLMUsage()
+    client.client = SimpleNamespace(responses=SimpleNamespace(create=create))
+
+    results = asyncio.run(client.synthesize_batch("bert", ["first", "second"], "ctx"))
+    assert results == [LLMResult("s", "e", [])] * 2
+    assert (client.usage.calls, client.usage.retries) == (1, 1)
@@ -0,0 +1,64 @@
+import socket
+import urllib.request
+
+import pytest
+
+from emailer_bot.metrics import Metrics, MetricsExporter
+
+
+def test_timed_records_latency_bytes_and_errors():
+    metrics = Metrics()
+    with metrics.timed('synthesize', 'bert') as m:
+        m.bytes = 120
+    with pytest.raises(RuntimeError):
+        with metrics.timed('synthesize', 'bert'):
+            raise RuntimeError('llm down')
+    metrics.observe('send', 'bert', 3.0, nbytes=10)
+
+    summary = metrics.summary()
+    assert summary['synthesize']['bert']['count'] == 2
+    assert summary['synthesize']['bert']['errors'] == 1
+    assert summary['synthesize']['bert']['bytes'] == 120
+    assert summary['send']['bert']['p50_s'] == 5.0
+
+
+def test_summary_reports_activity_since_snapshot():
+    metrics = Metrics()
+    metrics.observe('fetch_unseen', '', 0.2)
+    before = metrics.snapshot()
+    metrics.observe('build_graph', 'bert', 0.02, nbytes=2048)
+
+    summary = metrics.summary(before)
+    assert list(summary) == ['build_graph']
+    assert summary['build_graph']['bert']['bytes'] == 2048
+    assert 'fetch_unseen' not in summary
+
+
+def test_prometheus_text_is_cumulative():
+    metrics = Metrics()
+    metrics.observe('synthesize', 'bert', 0.3)
+    metrics.observe('synthesize', 'bert', 200.0, error=True)
+    text = metrics.render_prometheus()
+
+    assert 'emailer_stage_seconds_bucket{stage="synthesize",keyword="bert",le="0.25"} 0' in text
+    assert 'emailer_stage_seconds_bucket{stage="synthesize",keyword="bert",le="0.5"} 1' in text
+    assert 'emailer_stage_seconds_bucket{stage="synthesize",keyword="bert",le="+Inf"} 2' in text
+    assert 'emailer_stage_seconds_count{stage="synthesize",keyword="bert"} 2' in text
+    assert 'emailer_stage_errors_total{stage="synthesize",keyword="bert"} 1' in text
+
+
+def test_exporter_serves_metrics_on_localhost():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    metrics = Metrics()
+    metrics.observe('send', 'bert', 0.1, nbytes=5)
+    exporter = MetricsExporter(metrics, port=port)
+    exporter.start()
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+            body = response.read().decode()
+            assert response.headers['Content-Type'].startswith('text/plain')
+    finally:
+        exporter.stop()
+    assert 'emailer_stage_bytes_total{stage="send",keyword="bert"} 5' in body
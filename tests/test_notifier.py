@@ -0,0 +1,104 @@
+import smtplib
+
+import pytest
+
+from emailer_bot.config import Recipient, SMTPConfig
+from emailer_bot.notifier import DeliveryError, Notifier
+
+
+class FakeSMTP:
+    instances = []
+    # Envelopes for these addresses always lose the connection.
+    unreachable = set()
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.noops = 0
+        self.drop_next = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def noop(self):
+        self.noops += 1
+        return 250, b"OK"
+
+    def send_message(self, msg, to_addrs):
+        if self.drop_next:
+            self.drop_next = False
+            raise smtplib.SMTPServerDisconnected("gone")
+        if FakeSMTP.unreachable.intersection(to_addrs):
+            raise smtplib.SMTPServerDisconnected("gone")
+        refused = {a: (550, b"no such user") for a in to_addrs if a.startswith("bad")}
+        if len(refused) == len(to_addrs):
+            raise smtplib.SMTPRecipientsRefused(refused)
+        self.sent.append((msg["To"], list(to_addrs)))
+        return refused
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _config(**kwargs):
+    return SMTPConfig(host="h", port=587, username="u", password="p", from_email="bot@x", **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def fake_smtp(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.unreachable = set()
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+
+
+def test_session_is_reused_and_reconnects_after_drop():
+    notifier = Notifier(_config(keepalive_seconds=0))
+    people = [Recipient("A", "a@x")]
+    notifier.send(people, "one", "body")
+    FakeSMTP.instances[0].drop_next = True
+    notifier.send(people, "two", "body")
+    notifier.send(people, "three", "body")
+
+    assert len(FakeSMTP.instances) == 2
+    assert len(FakeSMTP.instances[0].sent) == 1 and FakeSMTP.instances[0].noops == 1
+    assert len(FakeSMTP.instances[1].sent) == 2
+
+
+def test_recipients_are_chunked_and_refusals_reported():
+    notifier = Notifier(_config(max_recipients_per_message=2, hide_recipients=True))
+    people = [Recipient(n, f"{n}@x") for n in ("a", "bad1", "bad2", "bad3", "c")]
+
+    report = notifier.send(people, "s", "body")
+
+    sent = FakeSMTP.instances[0].sent
+    assert [to_addrs for _, to_addrs in sent] == [["a@x", "bad1@x"], ["c@x"]]
+    assert all(to == "bot@x" for to, _ in sent)
+    assert report.delivered == ["a@x", "c@x"]
+    assert sorted(report.refused) == ["bad1@x", "bad2@x", "bad3@x"]
+    assert report.refused["bad2@x"] == "550 no such user"
+
+    with pytest.raises(DeliveryError):
+        notifier.send([Recipient("b", "bad@x")], "s", "body")
+
+
+def test_lost_session_after_an_accepted_envelope_reports_the_rest():
+    notifier = Notifier(_config(max_recipients_per_message=1))
+    people = [Recipient(n, f"{n}@x") for n in ("a", "b", "c")]
+    FakeSMTP.unreachable = {"b@x"}
+
+    report = notifier.send(people, "s", "body")
+
+    # Raising here would make the caller retry and send a@x the alert twice.
+    assert report.delivered == ["a@x"]
+    assert sorted(report.refused) == ["b@x", "c@x"]
+    assert report.refused["c@x"] == "not sent, SMTPServerDisconnected: gone"
+    assert [to for smtp in FakeSMTP.instances for _, to in smtp.sent] == [["a@x"]]
+
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        notifier.send([Recipient("b", "b@x"), Recipient("a", "a@x")], "s", "body")
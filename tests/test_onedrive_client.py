@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+
+from emailer_bot.config import OneDriveConfig
+from emailer_bot.onedrive_client import AsyncOneDriveClient
+
+
+def fetch(config, handler):
+    async def run():
+        client = AsyncOneDriveClient(config)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await client.fetch_research_files()
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_concurrent_downloads_keep_order_and_skip_failures():
+    listing = {
+        "value": [
+            {"name": f"f{i}.txt", "file": {}, "@microsoft.graph.downloadUrl": f"https://dl/{i}"}
+            for i in range(5)
+        ]
+    }
+
+    async def handler(request):
+        if "children" in request.url.path:
+            return httpx.Response(200, json=listing)
+        index = int(request.url.path.rsplit("/", 1)[-1])
+        if index == 1:
+            return httpx.Response(500)
+        if index == 2:
+            raise httpx.ReadTimeout("read timed out", request=request)
+        await asyncio.sleep(0.01 * (5 - index))
+        return httpx.Response(200, text=f"body {index}")
+
+    files = fetch(
+        OneDriveConfig(access_token="t", drive_id="d", folder_path="R", cache_max_mb=0, download_concurrency=5),
+        handler,
+    )
+    assert [f.name for f in files] == ["f0.txt", "f3.txt", "f4.txt"]
+    assert [f.content for f in files] == ["body 0", "body 3", "body 4"]
+
+
+def test_listing_follows_pages_filters_before_cap_and_truncates():
+    pages = {
+        "first": {
+            "value": [
+                {"name": "deck.pptx", "file": {}, "@microsoft.graph.downloadUrl": "https://dl/deck"},
+                {"name": "sub", "folder": {}},
+                {"name": "old.csv", "file": {}, "lastModifiedDateTime": "2024-01-01T00:00:00Z",
+                 "@microsoft.graph.downloadUrl": "https://dl/old"},
+            ],
+            "@odata.nextLink": "https://graph/next",
+        },
+        "next": {
+            "value": [
+                {"name": "new.csv", "file": {}, "lastModifiedDateTime": "2025-01-01T00:00:00Z",
+                 "@microsoft.graph.downloadUrl": "https://dl/new"},
+            ],
+        },
+    }
+    seen_params = []
+
+    def handler(request):
+        seen_params.append(dict(request.url.params))
+        if "children" in request.url.path:
+            return httpx.Response(200, json=pages["first"])
+        if str(request.url) == "https://graph/next":
+            return httpx.Response(200, json=pages["next"])
+        return httpx.Response(200, text="x" * 100)
+
+    files = fetch(
+        OneDriveConfig(access_token="t", drive_id="d", folder_path="R", max_files=1, cache_max_mb=0, max_file_bytes=10),
+        handler,
+    )
+    assert [f.name for f in files] == ["new.csv"]
+    assert files[0].content == "x" * 10
+    assert seen_params[0]["$orderby"] == "lastModifiedDateTime desc"
+
+
+def test_sync_wrapper_fetches_on_the_private_loop():
+    from emailer_bot.onedrive_client import OneDriveClient
+
+    listing = {"value": [{"name": "a.md", "file": {}, "@microsoft.graph.downloadUrl": "https://dl/a"}]}
+
+    def handler(request):
+        if "children" in request.url.path:
+            return httpx.Response(200, json=listing)
+        return httpx.Response(200, text="alpha")
+
+    client = OneDriveClient(OneDriveConfig(access_token="t", drive_id="d", folder_path="R", cache_max_mb=0))
+    client.client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        # Twice, so the pooled client is reused on the same loop.
+        for _ in range(2):
+            assert [(f.name, f.content) for f in client.fetch_research_files()] == [("a.md", "alpha")]
+    finally:
+        client.close()
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+from emailer_bot.email_monitor import IncomingEmail
+from emailer_bot.pipeline import AlertPipeline, Cancelled, group_matches
+from emailer_bot.workflow import WorkflowOutput
+
+
+class FakeWorkflow:
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+
+    async def fetch(self, keyword=''):
+        return []
+
+    async def synthesize(self, keyword, email, files):
+        # Earlier emails take longer, so completion order is the reverse of submission order.
+        await asyncio.sleep(0.05 * (5 - int(email.uid)))
+        if email.uid in self.fail_on:
+            raise RuntimeError('llm failed')
+        return email.uid
+
+    def render(self, keyword, files):
+        return None
+
+    def compose(self, keyword, email, result, graph_png):
+        return WorkflowOutput(subject=result, body='', graph_png=None)
+
+
+def _email(uid):
+    return IncomingEmail(uid=str(uid), subject='', from_email='', body='')
+
+
+def _collect(sent):
+    async def send(keyword, output):
+        sent.append(output.subject)
+
+    return send
+
+
+def test_pipeline_overlaps_work_but_sends_in_order_per_keyword():
+    sent = []
+
+    async def run():
+        pipeline = AlertPipeline({'bert': FakeWorkflow(fail_on={'2'})}, _collect(sent), workers=5)
+        jobs = [await pipeline.submit('bert', _email(uid)) for uid in range(5)]
+        await pipeline.wait(jobs)
+        await pipeline.shutdown()
+        return jobs
+
+    start = time.monotonic()
+    jobs = asyncio.run(run())
+    elapsed = time.monotonic() - start
+
+    assert sent == ['0', '1', '3', '4']
+    assert [job.ok for job in jobs] == [True, True, False, True, True]
+    assert elapsed < 0.5  # serial processing would take 0.75s
+
+
+def test_pipeline_cancels_queued_jobs_on_stop():
+    stop = threading.Event()
+    stop.set()
+
+    async def run():
+        pipeline = AlertPipeline({'bert': FakeWorkflow()}, _collect([]), stop_event=stop)
+        job = await pipeline.submit('bert', _email(1))
+        await pipeline.wait([job])
+        await pipeline.shutdown()
+        return job
+
+    job = asyncio.run(run())
+    assert isinstance(job.error, Cancelled)
+
+
+class BatchWorkflow(FakeWorkflow):
+    def __init__(self):
+        super().__init__()
+        self.fetches = 0
+
+    async def fetch(self, keyword=''):
+        self.fetches += 1
+        return []
+
+    async def synthesize_batch(self, keyword, emails, files):
+        return [email.uid for email in emails]
+
+    def compose_batch(self, keyword, emails, results, graph_png):
+        return [WorkflowOutput(subject='+'.join(results), body='', graph_png=None)]
+
+
+def test_batches_share_one_fetch_and_alert_per_group():
+    emails = [_email(uid) for uid in range(5)]
+    groups = group_matches([('bert', e) for e in emails] + [('ernie', emails[1])], max_emails=3)
+    assert [(k, [e.uid for e in batch]) for k, batch in groups] == [
+        ('bert', ['0', '1', '2']),
+        ('bert', ['3', '4']),
+        ('ernie', ['1']),
+    ]
+
+    sent = []
+    workflow = BatchWorkflow()
+
+    async def run():
+        pipeline = AlertPipeline({'bert': workflow}, _collect(sent))
+        jobs = [await pipeline.submit(k, batch) for k, batch in groups if k == 'bert']
+        await pipeline.wait(jobs)
+        await pipeline.shutdown()
+        return jobs
+
+    jobs = asyncio.run(run())
+
+    assert sent == ['0+1+2', '3+4']
+    assert workflow.fetches == 2
+    assert all(job.ok for job in jobs)
@@ -0,0 +1,72 @@
+from emailer_bot import email_monitor
+from emailer_bot.config import IMAPConfig
+from emailer_bot.email_monitor import EmailMonitor, _text_criteria
+
+RAW = b"Subject: bert weekly\r\nFrom: a@b.com\r\n\r\nbody"
+
+
+class PrefilterIMAP:
+    def __init__(self, host, port, timeout=None):
+        self.fetched = []
+        self.searches = []
+
+    def login(self, user, password):
+        pass
+
+    def select(self, folder):
+        pass
+
+    def uid(self, command, *args):
+        if command == "search":
+            self.searches.append(args[1:])
+            return "OK", [b"1 2" if args[1:] == ("UNSEEN",) else b"1"]
+        uid_set, query = args
+        self.fetched.append((uid_set, query))
+        if "BODY.PEEK[HEADER]" in query:
+            return "OK", [
+                (b"1 (UID 1 BODY[HEADER] {20}", b"Subject: BERT news\r\n\r\n"),
+                (b" BODY[TEXT]<0> {4}", b"text"),
+                b")",
+                (b"2 (UID 2 BODY[HEADER] {20}", b"Subject: albert\r\n\r\n"),
+                (b" BODY[TEXT]<0> {9}", b"unrelated"),
+                b")",
+            ]
+        return "OK", [(b"1 (BODY[] {40}", RAW), b")"]
+
+
+def _monitor(monkeypatch, prefilter):
+    monkeypatch.setattr(email_monitor.imaplib, "IMAP4_SSL", PrefilterIMAP)
+    monitor = EmailMonitor(IMAPConfig(host='x', port=993, username='u', password='p', prefilter=prefilter))
+    return monitor
+
+
+def test_text_criteria_ors_keywords():
+    assert _text_criteria(["a", "b", "c"]) == ["OR", "TEXT", '"a"', "OR", "TEXT", '"b"', "TEXT", '"c"']
+
+
+def test_search_prefilter_downloads_only_candidates(monkeypatch):
+    monitor = _monitor(monkeypatch, "search")
+    mails = monitor.fetch_unseen(keywords=["bert"])
+    assert [m.uid for m in mails] == ["1"]
+    assert monitor._client.searches == [("UNSEEN", "TEXT", '"bert"')]
+
+
+def test_partial_prefilter_skips_non_matching_previews(monkeypatch):
+    monitor = _monitor(monkeypatch, "partial")
+    mails = monitor.fetch_unseen(keywords=["bert"])
+    assert [m.uid for m in mails] == ["1"]
+    assert [f for f in monitor._client.fetched if f[1] == "(BODY.PEEK[])"] == [("1", "(BODY.PEEK[])")]
+
+
+def test_preview_with_undecodable_subject_is_a_candidate():
+    pattern = email_monitor._keyword_pattern(["bert"])
+    for subject in (b"=?x-unknown?q?bert?=", b"=?utf-8?q?=FF=FE?="):
+        preview = (b"Subject: " + subject + b"\r\n\r\n", b"")
+        assert email_monitor._preview_matches(preview, pattern)
+
+
+def test_preview_matches_across_quoted_printable_soft_break():
+    pattern = email_monitor._keyword_pattern(["bert"])
+    headers = b"Subject: weekly\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n"
+    assert email_monitor._preview_matches((headers, b"notes on BE=\r\nRT today"), pattern)
+    assert not email_monitor._preview_matches((headers, b"notes on albert"), pattern)
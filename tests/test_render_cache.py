@@ -0,0 +1,26 @@
+from emailer_bot import workflow
+from emailer_bot.onedrive_client import ResearchFile
+from emailer_bot.render_cache import RenderCache
+from emailer_bot.workflow import InvestmentWorkflow
+
+
+def test_unchanged_series_reuses_cached_png(tmp_path, monkeypatch):
+    flow = InvestmentWorkflow(onedrive=None, llm=None, render_cache=RenderCache(tmp_path, max_files=1))
+    files = [ResearchFile(name='history.csv', content='date,score\n2025-01-01,0.1\n2025-01-02,0.2')]
+
+    png = flow._build_graph(files, 'bert')
+    assert png.startswith(b'\x89PNG')
+
+    def no_render(*args, **kwargs):
+        raise AssertionError('matplotlib should not run on a cache hit')
+
+    monkeypatch.setattr(workflow.plt, 'subplots', no_render)
+    assert flow._build_graph(files, 'bert') == png
+
+
+def test_render_cache_evicts_oldest(tmp_path):
+    cache = RenderCache(tmp_path, max_files=1)
+    cache.put('a', b'one')
+    cache.put('b', b'two')
+    assert cache.get('a') is None
+    assert cache.get('b') == b'two'
@@ -0,0 +1,100 @@
+import asyncio
+
+import httpx
+
+from emailer_bot.config import OneDriveConfig
+from emailer_bot.onedrive_client import AsyncOneDriveClient
+from emailer_bot.research_cache import ResearchCache
+
+
+def test_cache_validates_tag_and_evicts_least_recently_used(tmp_path):
+    cache = ResearchCache(tmp_path, max_bytes=10)
+    cache.put("a", "c1", "aaaaaa")
+    assert cache.get("a", "c1") == "aaaaaa"
+    assert cache.get("a", "c2") is None
+
+    cache.put("b", "c1", "bbbbbb")
+    assert cache.get("a", "c1") is None
+    assert cache.get("b", "c1") == "bbbbbb"
+    assert len(list((tmp_path / "blobs").iterdir())) == 1
+
+
+def test_delta_sync_downloads_only_changed_files(tmp_path):
+    downloads = []
+    delta_pages = [
+        {
+            "value": [
+                {"id": "root", "folder": {}},
+                {"id": "f1", "name": "a.csv", "file": {}, "cTag": "1", "parentReference": {"id": "root"}},
+                {"id": "f2", "name": "b.txt", "file": {}, "cTag": "1", "parentReference": {"id": "root"}},
+            ],
+            "@odata.deltaLink": "https://graph/delta-2",
+        },
+        {
+            "value": [{"id": "f2", "name": "b.txt", "file": {}, "cTag": "2", "parentReference": {"id": "root"}}],
+            "@odata.deltaLink": "https://graph/delta-3",
+        },
+    ]
+
+    def handler(request):
+        path = request.url.path
+        if path.endswith("/content"):
+            downloads.append(path.split("/")[-2])
+            return httpx.Response(200, text=f"content of {path.split('/')[-2]}")
+        if "delta" in path:
+            return httpx.Response(200, json=delta_pages.pop(0))
+        return httpx.Response(200, json={"id": "root"})
+
+    async def run():
+        client = AsyncOneDriveClient(
+            OneDriveConfig(access_token="t", drive_id="d", folder_path="Research"),
+            cache=ResearchCache(tmp_path, max_bytes=1024),
+        )
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return [await client.fetch_research_files() for _ in range(2)]
+        finally:
+            await client.aclose()
+
+    files = asyncio.run(run())
+    assert sorted(f.name for f in files[0]) == ["a.csv", "b.txt"]
+    assert sorted(f.content for f in files[1]) == ["content of f1", "content of f2"]
+    assert sorted(downloads) == ["f1", "f2", "f2"]
+
+
+def test_concurrent_fetches_share_one_folder_sync(tmp_path):
+    requests = []
+    delta = {
+        "value": [
+            {"id": "f1", "name": "a.csv", "file": {}, "cTag": "1", "parentReference": {"id": "root"}},
+            {"id": "f2", "name": "b.txt", "file": {}, "cTag": "1", "parentReference": {"id": "root"}},
+            {"id": "f3", "name": "c.txt", "deleted": {}, "parentReference": {"id": "root"}},
+        ],
+        "@odata.deltaLink": "https://graph/delta-2",
+    }
+
+    async def handler(request):
+        path = request.url.path
+        requests.append(path)
+        await asyncio.sleep(0.01)
+        if path.endswith("/content"):
+            return httpx.Response(200, text=f"content of {path.split('/')[-2]}")
+        if "delta" in path:
+            return httpx.Response(200, json=delta)
+        return httpx.Response(200, json={"id": "root"})
+
+    cache = ResearchCache(tmp_path, max_bytes=1024)
+
+    async def run():
+        client = AsyncOneDriveClient(OneDriveConfig(access_token="t", drive_id="d", folder_path="Research"), cache=cache)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await asyncio.gather(*(client.fetch_research_files() for _ in range(4)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    assert all(sorted(f.content for f in files) == ["content of f1", "content of f2"] for files in results)
+    # One folder lookup, one delta page and one download per file, however many callers.
+    assert len(requests) == 4
+    assert sorted(cache.listing()) == ["f1", "f2"] and cache.delta_link == "https://graph/delta-2"
@@ -12,3 +12,52 @@ def test_extract_scored_points_from_mixed_files():
     points = _extract_scored_points(files)
     assert len(points) == 3
     assert [round(p[1], 1) for p in points] == [0.4, 0.6, 0.8]
+
+
+def test_score_index_reextracts_only_changed_files(tmp_path):
+    from datetime import datetime
+
+    from emailer_bot.score_index import ScoreIndex
+
+    index = ScoreIndex(tmp_path / 'scores.sqlite3')
+    files = [
+        ResearchFile(name='history.csv', content='date,score\n2025-01-02,0.6', item_id='a'),
+        ResearchFile(name='notes.txt', content='2025-01-01 score: 0.4', item_id='b'),
+    ]
+    assert index.update('bert', files) == 2
+    assert index.update('bert', files) == 0
+
+    files[0] = ResearchFile(name='history.csv', content='date,score\n2025-01-02,0.7\n2025-01-03,0.9', item_id='a')
+    assert index.update('bert', files) == 1
+    assert [p[1] for p in index.series('bert')] == [0.4, 0.7, 0.9]
+    assert [p[1] for p in index.series('bert', start=datetime(2025, 1, 3))] == [0.9]
+
+    assert index.update('bert', files[:1]) == 0
+    assert [p[1] for p in index.series('bert')] == [0.7, 0.9]
+
+
+def test_extract_score_arrays_handles_bad_rows_and_timezones():
+    from emailer_bot.scores import extract_score_arrays
+
+    files = [
+        ResearchFile(name='history.csv', content='score,date\n0.1,2025-01-05\nbad,2025-01-06\n0.3,\n0.2,2025-01-04T00:00:00+02:00'),
+        ResearchFile(name='signal.json', content=' [ {"date": "2025-01-03", "score": "0.5"}, 7, {"date": null, "score": 1} ] '),
+        ResearchFile(name='broken.json', content='[{"date": "2025-01-01", "score": 1},'),
+    ]
+
+    dates, scores = extract_score_arrays(files)
+    assert dates.dtype.kind == 'M' and scores.dtype.kind == 'f'
+    assert [str(d)[:16] for d in dates] == ['2025-01-03T00:00', '2025-01-03T22:00', '2025-01-05T00:00']
+    assert scores.tolist() == [0.5, 0.2, 0.1]
+
+
+def test_partial_and_special_dates_are_rejected_in_any_chunk(monkeypatch):
+    from emailer_bot import scores
+
+    rows = ['2025', '2025-02', 'NaT', 'today', '20250103', '2025-01-04 12:00', '2025-01-05']
+    content = 'date,score\n' + ''.join(f'{d},1\n' for d in rows)
+    expected = ['2025-01-03T00:00', '2025-01-04T12:00', '2025-01-05T00:00']
+    for chunk_rows in (1, 2, len(rows)):
+        monkeypatch.setattr(scores, 'CHUNK_ROWS', chunk_rows)
+        dates, _ = scores.extract_score_arrays([ResearchFile(name='history.csv', content=content)])
+        assert [str(d)[:16] for d in dates] == expected
@@ -0,0 +1,48 @@
+import pytest
+
+from emailer_bot.llm_client import SYNTHESIS_SCHEMA
+from emailer_bot.structured_output import MalformedOutput, StreamingJSONObject
+
+
+def feed_in_pieces(parser, text, size=3):
+    for start in range(0, len(text), size):
+        parser.feed(text[start : start + size])
+
+
+def test_fields_and_array_items_are_reported_as_they_complete():
+    seen = []
+    parser = StreamingJSONObject(SYNTHESIS_SCHEMA, on_partial=lambda name, value: seen.append((name, value)))
+    feed_in_pieces(parser, '{"summary": "Q3 \\"beat\\"", "key_points": ["a", "b, c"]')
+    assert seen == [("summary", 'Q3 "beat"'), ("key_points", "a"), ("key_points", "b, c")]
+
+    feed_in_pieces(parser, ', "formatted_email": "Overview"}\n')
+    assert parser.close() == {"summary": 'Q3 "beat"', "key_points": ["a", "b, c"], "formatted_email": "Overview"}
+
+
+@pytest.mark.parametrize(
+    "prefix",
+    [
+        "Sure! Here is the JSON",
+        '{"summary": 5',
+        '{"summary": "s", "bogus"',
+        '{"summary": "s", "key_points": ["a", 3]',
+        '{"summary": "s" "key_points"',
+        '{"summary": "s"]',
+    ],
+)
+def test_errors_are_raised_before_the_stream_ends(prefix):
+    parser = StreamingJSONObject(SYNTHESIS_SCHEMA)
+    with pytest.raises(MalformedOutput):
+        feed_in_pieces(parser, prefix + ",")
+
+
+def test_truncated_or_incomplete_output_fails_on_close():
+    parser = StreamingJSONObject(SYNTHESIS_SCHEMA)
+    parser.feed('{"summary": "s", "key_points": []}')
+    with pytest.raises(MalformedOutput, match="formatted_email"):
+        parser.close()
+
+    parser = StreamingJSONObject(SYNTHESIS_SCHEMA)
+    parser.feed('{"summary": "s"')
+    with pytest.raises(MalformedOutput):
+        parser.close()
@@ -0,0 +1,159 @@
+import json
+import smtplib
+import stat
+
+import msal
+import pytest
+import requests
+
+from emailer_bot.token_manager import TokenManager, is_auth_failure, load_token_cache
+
+
+class FakeApp:
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = 0
+
+    def get_accounts(self):
+        return [{"home_account_id": "me"}] if self.calls else []
+
+    def acquire_token_silent(self, scopes, account, force_refresh=False):
+        self.calls += 1
+        self.cache.has_state_changed = True
+        return {"access_token": f"token-{self.calls}", "expires_in": 3600}
+
+
+class FakeAuth:
+    SCOPES = ["Mail.Read"]
+
+    def __init__(self, cache):
+        self.app = FakeApp(cache)
+
+    def refresh_access_token(self, refresh_token):
+        self.app.calls += 1
+        self.app.cache.has_state_changed = True
+        return {"access_token": f"token-{self.app.calls}", "refresh_token": "rt-2", "expires_in": 3600}
+
+
+class Consumer:
+    def __init__(self):
+        self.tokens = []
+
+    def update_token(self, token):
+        self.tokens.append(token)
+
+
+def _unauthorized():
+    response = requests.Response()
+    response.status_code = 401
+    return requests.HTTPError("401", response=response)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    cache_path = tmp_path / "msal_token_cache.json"
+    cache = load_token_cache(cache_path)
+    tokens = TokenManager(FakeAuth(cache), cache, cache_path, refresh_token="rt-1")
+    yield tokens
+    tokens.stop()
+
+
+def test_start_pushes_token_and_persists_cache(manager):
+    consumer = Consumer()
+    manager.add_consumer(consumer)
+    manager.start()
+
+    assert consumer.tokens == ["token-1"]
+    assert manager.expires_at > 0
+    assert manager.cache_path.exists()
+    assert stat.S_IMODE(manager.cache_path.stat().st_mode) == 0o600
+    json.loads(manager.cache_path.read_text())
+
+    late = Consumer()
+    manager.add_consumer(late)
+    assert late.tokens == ["token-1"]
+
+
+def test_refresh_now_updates_consumers(manager):
+    consumer = Consumer()
+    manager.add_consumer(consumer)
+    manager.start()
+
+    assert manager.refresh_now(timeout=5)
+    assert consumer.tokens == ["token-1", "token-2"]
+
+
+def test_call_retries_once_after_auth_failure(manager):
+    manager.start()
+    attempts = []
+
+    def operation():
+        attempts.append(manager.access_token)
+        if len(attempts) == 1:
+            raise _unauthorized()
+        return "ok"
+
+    assert manager.call(operation) == "ok"
+    assert attempts == ["token-1", "token-2"]
+
+
+def test_call_does_not_retry_other_errors(manager):
+    manager.start()
+    with pytest.raises(ValueError):
+        manager.call(lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert manager.access_token == "token-1"
+
+
+def test_load_token_cache_round_trips(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = msal.SerializableTokenCache()
+    path.write_text(cache.serialize())
+    assert isinstance(load_token_cache(path), msal.SerializableTokenCache)
+    assert isinstance(load_token_cache(tmp_path / "missing.json"), msal.SerializableTokenCache)
+
+
+def test_is_auth_failure():
+    assert is_auth_failure(_unauthorized())
+    assert is_auth_failure(smtplib.SMTPAuthenticationError(535, b"bad token"))
+    assert not is_auth_failure(OSError("reset"))
+
+
+def test_expired_smtp_token_is_refreshed_and_send_retried(manager, monkeypatch):
+    from emailer_bot.config import Recipient, SMTPConfig
+    from emailer_bot.notifier import Notifier
+
+    logins = []
+
+    class FakeSMTP:
+        def __init__(self, host, port, timeout=None):
+            self.sent = []
+
+        def starttls(self):
+            pass
+
+        def auth(self, mechanism, authobject):
+            token = authobject(None).split("Bearer ")[1].strip("\x01")
+            logins.append(token)
+            if token == "token-1":
+                raise smtplib.SMTPAuthenticationError(535, b"5.7.3 token expired")
+
+        def send_message(self, msg, to_addrs):
+            return {}
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    notifier = Notifier(
+        SMTPConfig(host="h", port=587, username="u", password="", from_email="bot@x", auth_method="oauth",
+                   max_recipients_per_message=1)
+    )
+    manager.add_consumer(notifier)
+    manager.start()
+
+    people = [Recipient(n, f"{n}@x") for n in ("a", "b", "c")]
+    report = manager.call(lambda: notifier.send(people, "s", "body"))
+
+    assert report.delivered == ["a@x", "b@x", "c@x"]
+    # One rejected login for the whole alert, then one session with the refreshed token.
+    assert logins == ["token-1", "token-2"]
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+from emailer_bot.email_monitor import IncomingEmail
+from emailer_bot.llm_client import LLMResult
+from emailer_bot.pipeline import AlertPipeline
+from emailer_bot.work_queue import RENDERED, SYNTHESIZED, WorkQueue, message_key
+from emailer_bot.workflow import WorkflowOutput
+
+
+def _email(uid, message_id=None):
+    return IncomingEmail(uid=str(uid), subject=f's{uid}', from_email='a@b', body='', message_id=message_id or f'<{uid}@x>')
+
+
+def _result(text):
+    return LLMResult(summary=text, formatted_email=text, key_points=[])
+
+
+class CountingWorkflow:
+    def __init__(self):
+        self.calls = {'fetch': 0, 'synthesize': 0, 'render': 0}
+
+    async def fetch(self, keyword=''):
+        self.calls['fetch'] += 1
+        return []
+
+    async def synthesize(self, keyword, email, files):
+        self.calls['synthesize'] += 1
+        return _result(email.subject)
+
+    def render(self, keyword, files):
+        self.calls['render'] += 1
+        return b'png'
+
+    def compose(self, keyword, email, result, graph_png):
+        return WorkflowOutput(subject=result.summary, body='', graph_png=graph_png)
+
+
+def _resume(queue, alert, send):
+    async def run():
+        pipeline = AlertPipeline({'bert': workflow}, send, work_queue=queue)
+        job = await pipeline.resume(alert)
+        await pipeline.wait([job])
+        await pipeline.shutdown()
+        return job
+
+    workflow = CountingWorkflow()
+    return workflow, asyncio.run(run())
+
+
+def test_enqueue_skips_known_messages_across_restarts(tmp_path):
+    queue = WorkQueue(tmp_path / 'q.sqlite3')
+    assert queue.enqueue('bert', [_email(1), _email(2)]) is not None
+    queue.close()
+
+    queue = WorkQueue(tmp_path / 'q.sqlite3')
+    assert queue.enqueue('bert', [_email(1)]) is None
+    # Same message under a new UID is still the same message; other keywords track it separately.
+    assert queue.enqueue('bert', [_email(7, message_id='<2@x>')]) is None
+    assert queue.enqueue('ernie', [_email(1)]) is not None
+    alert = queue.enqueue('bert', [_email(1), _email(3)])
+    assert [e.uid for e in alert.emails] == ['3']
+    assert [a.keyword for a in queue.due()] == ['bert', 'ernie', 'bert']
+
+
+def test_message_key_falls_back_to_content_hash():
+    a = IncomingEmail(uid='1', subject='s', from_email='f', body='b')
+    b = IncomingEmail(uid='2', subject='s', from_email='f', body='b')
+    assert message_key(a) == message_key(b)
+    assert message_key(a).startswith('sha256:')
+
+
+def test_stages_are_persisted_and_backoff_is_bounded(tmp_path):
+    queue = WorkQueue(tmp_path / 'q.sqlite3', max_attempts=3, backoff_seconds=10, max_backoff_seconds=15)
+    alert = queue.enqueue('bert', [_email(1)])
+    queue.record_synthesized(alert.id, [_result('r')])
+    queue.record_rendered(alert.id, b'png')
+    queue.close()
+
+    queue = WorkQueue(tmp_path / 'q.sqlite3', max_attempts=3, backoff_seconds=10, max_backoff_seconds=15)
+    (stored,) = queue.due()
+    assert stored.stage == RENDERED and stored.graph_png == b'png'
+    assert stored.results == [_result('r')]
+    assert stored.emails == [_email(1)]
+
+    assert queue.fail(alert.id, RuntimeError('smtp down')) == 10
+    assert queue.due() == []
+    assert len(queue.due(now=time.time() + 10)) == 1
+    assert queue.fail(alert.id, RuntimeError('smtp down')) == 15
+    assert queue.fail(alert.id, RuntimeError('smtp down')) is None
+    assert queue.due(now=time.time() + 3600) == []
+
+
+def test_pipeline_resumes_after_last_completed_stage(tmp_path):
+    queue = WorkQueue(tmp_path / 'q.sqlite3')
+    alert = queue.enqueue('bert', [_email(1)])
+    queue.record_synthesized(alert.id, [_result('stored')])
+
+    sent = []
+
+    async def send(keyword, output):
+        sent.append(output.subject)
+
+    (resumed,) = queue.due()
+    assert resumed.stage == SYNTHESIZED
+    workflow, job = _resume(queue, resumed, send)
+
+    assert job.ok and sent == ['stored']
+    assert workflow.calls == {'fetch': 1, 'synthesize': 0, 'render': 1}
+    assert queue.due() == []
+
+
+def test_pipeline_records_failures_for_retry(tmp_path):
+    queue = WorkQueue(tmp_path / 'q.sqlite3', backoff_seconds=60)
+    queue.enqueue('bert', [_email(1)])
+
+    async def send(keyword, output):
+        raise OSError('smtp down')
+
+    _, job = _resume(queue, queue.due()[0], send)
+
+    assert not job.ok
+    assert queue.due() == []
+    (retry,) = queue.due(now=time.time() + 60)
+    # The LLM result and graph survive the failed send.
+    assert retry.stage == RENDERED and retry.attempts == 1
+    assert retry.results == [_result('s1')]